@@ -386,7 +386,7 @@ class CoreManager(Singleton):
         # Resource commands
         def cmd_load_resource(value):
             resource_name, resource_type_name = value
-            self.resource_manager.load_resource(resource_name, resource_type_name)
+            self.resource_manager.load_resource_async(resource_name, resource_type_name)
         self.commands[COMMAND.LOAD_RESOURCE.value] = cmd_load_resource
 
         def cmd_action_resource(value):
@@ -827,11 +827,7 @@ class CoreManager(Singleton):
             # selected object transform info
             selected_object = self.scene_manager.get_selected_object()
             if selected_object:
-                btn_left, btn_middle, btn_right = self.game_backend.get_mouse_pressed()
-                if InputMode.NONE == self.game_backend.get_input_mode():
-                    if btn_left:
-                        self.scene_manager.update_select_object_id()
-                elif InputMode.EDIT_OBJECT_TRANSFORM == self.game_backend.get_input_mode():
+                if InputMode.EDIT_OBJECT_TRANSFORM == self.game_backend.get_input_mode():
                     self.scene_manager.edit_selected_object_transform()
 
                 self.font_manager.log("Selected Object : %s" % selected_object.name)
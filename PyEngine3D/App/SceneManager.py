@@ -11,6 +11,7 @@ from PyEngine3D.Common.Constants import *
 from PyEngine3D.Render import CollisionActor, StaticActor, SkeletonActor, AxisGizmo
 from PyEngine3D.Render import Camera, MainLight, PointLight, LightProbe
 from PyEngine3D.Render import gather_render_infos, always_pass, view_frustum_culling_geometry, shadow_culling
+from PyEngine3D.Render import RenderInfoCache, view_frustum_culling_geometries, shadow_culling_geometries
 from PyEngine3D.Render import Atmosphere, Ocean, Terrain
 from PyEngine3D.Render import Effect
 from PyEngine3D.Render import Spline3D
@@ -65,6 +66,19 @@ class SceneManager(Singleton):
         # render group
         self.point_light_count = 0
 
+        self.collision_render_info_cache = RenderInfoCache()
+        self.static_render_info_cache = RenderInfoCache()
+        self.skeleton_render_info_cache = RenderInfoCache()
+
+        # spatial index over the actor and point light bounds
+        self.actor_octree = LooseOctree(min_size=32.0)
+        self.point_light_octree = LooseOctree(min_size=32.0)
+        self.frustum_actors = []
+        self.shadow_actors = []
+
+        # the actor transforms are updated at once
+        self.transform_pool = TransformPool()
+
         self.static_solid_render_infos = []
         self.static_translucent_render_infos = []
         self.static_shadow_render_infos = []
@@ -115,6 +129,13 @@ class SceneManager(Singleton):
         self.objectIDMap = {}
         self.objectIDEntry = list(range(2 ** 16))
 
+        self.collision_render_info_cache.clear()
+        self.static_render_info_cache.clear()
+        self.skeleton_render_info_cache.clear()
+        self.actor_octree.clear()
+        self.point_light_octree.clear()
+        self.transform_pool.clear()
+
         self.static_solid_render_infos = []
         self.static_translucent_render_infos = []
         self.static_shadow_render_infos = []
@@ -264,6 +285,15 @@ class SceneManager(Singleton):
             return self.splines
         return None
 
+    def get_render_info_cache(self, object_type):
+        if CollisionActor == object_type:
+            return self.collision_render_info_cache
+        elif StaticActor == object_type:
+            return self.static_render_info_cache
+        elif SkeletonActor == object_type:
+            return self.skeleton_render_info_cache
+        return None
+
     def generate_object_id(self):
         object_id = self.objectIDEntry[self.objectIDCounter]
         self.objectIDCounter += 1
@@ -282,6 +312,14 @@ class SceneManager(Singleton):
                 object_list.append(obj)
             elif object_type is Effect:
                 self.effect_manager.add_effect(obj)
+            render_info_cache = self.get_render_info_cache(object_type)
+            if render_info_cache is not None:
+                render_info_cache.add_actor(obj)
+                self.actor_octree.insert(obj, obj.bound_box.bound_min, obj.bound_box.bound_max)
+                if RenderOption.BATCH_TRANSFORM:
+                    self.transform_pool.attach(obj.transform, obj)
+            elif object_type is PointLight:
+                self.point_light_octree.insert(obj, *obj.get_light_bound())
             if hasattr(obj, 'set_object_id'):
                 object_id = self.generate_object_id()
                 obj.set_object_id(object_id)
@@ -299,6 +337,13 @@ class SceneManager(Singleton):
                 object_list.remove(obj)
             elif object_type is Effect:
                 self.effect_manager.delete_effect(obj)
+            render_info_cache = self.get_render_info_cache(object_type)
+            if render_info_cache is not None:
+                render_info_cache.remove_actor(obj)
+                self.actor_octree.remove(obj)
+                self.transform_pool.detach(obj.transform)
+            elif object_type is PointLight:
+                self.point_light_octree.remove(obj)
 
             self.objectMap.pop(obj.name)
 
@@ -507,6 +552,12 @@ class SceneManager(Singleton):
         self.skeleton_actors = []
         self.splines = []
         self.objectMap = {}
+        self.collision_render_info_cache.clear()
+        self.static_render_info_cache.clear()
+        self.skeleton_render_info_cache.clear()
+        self.actor_octree.clear()
+        self.point_light_octree.clear()
+        self.transform_pool.clear()
 
     def clear_actors(self):
         for obj_name in list(self.objectMap.keys()):
@@ -700,17 +751,24 @@ class SceneManager(Singleton):
                         spline_point.control_point[...] = spline_control_point_gizmo_pos - spline_point_gizmo_pos
                 self.selected_object.spline_data.resampling()
 
-    def update_select_object_id(self):
+    def get_mouse_screen_ratio(self):
         windows_size = self.core_manager.get_window_size()
         mouse_pos = self.core_manager.get_mouse_pos()
-        x = math.floor(min(1.0, (mouse_pos[0] / windows_size[0])) * (RenderTargets.OBJECT_ID.width - 1))
-        y = math.floor(min(1.0, (mouse_pos[1] / windows_size[1])) * (RenderTargets.OBJECT_ID.height - 1))
-        object_ids = RenderTargets.OBJECT_ID.get_image_data()
-        object_id = math.floor(object_ids[y][x] + 0.5)
-        return object_id
+        return mouse_pos[0] / windows_size[0], mouse_pos[1] / windows_size[1]
+
+    def update_select_object_id(self):
+        # the selection is applied when the async readback of the object id pass is finished.
+        for object_id in self.renderer.get_object_id_results():
+            self.select_object_id(object_id)
 
     def intersect_select_object(self):
-        object_id = self.update_select_object_id()
+        screen_x_ratio, screen_y_ratio = self.get_mouse_screen_ratio()
+        if RenderOption.CPU_PICKING or self.core_manager.is_basic_mode:
+            self.select_object_id(self.pick_object_id(screen_x_ratio, screen_y_ratio))
+        else:
+            self.renderer.request_object_id(screen_x_ratio, screen_y_ratio)
+
+    def select_object_id(self, object_id):
         if 0 < object_id:
             if object_id < AxisGizmo.ID_COUNT:
                 self.selected_axis_gizmo_id = object_id
@@ -723,6 +781,106 @@ class SceneManager(Singleton):
         else:
             self.set_selected_object("")
 
+    def intersect_actor(self, actor, origin, direction, max_distance=np.inf):
+        # returns (distance, geometry index) of the closest triangle, the skeletal mesh is tested in the bind pose.
+        closest = (max_distance, -1)
+        if not actor.has_mesh:
+            return closest
+
+        if actor.is_instancing():
+            matrices = np.dot(actor.instance_matrix[:actor.get_instance_render_count()], actor.transform.matrix)
+        else:
+            matrices = [actor.transform.matrix]
+
+        for matrix in matrices:
+            try:
+                inverse_matrix = np.linalg.inv(matrix)
+            except np.linalg.LinAlgError:
+                continue
+            # the distance along the local direction is same as the world distance
+            local_origin = np.dot(Float4(*origin, 1.0), inverse_matrix)[:3]
+            local_direction = np.dot(Float4(*direction, 0.0), inverse_matrix)[:3]
+            for i, geometry in enumerate(actor.get_geometries()):
+                triangle_bvh = geometry.get_triangle_bvh()
+                if triangle_bvh is not None:
+                    distance, triangle_index = triangle_bvh.intersect(local_origin, local_direction, closest[0])
+                    if 0 <= triangle_index:
+                        closest = (distance, i)
+        return closest
+
+    def intersect_spline(self, spline, origin, direction, max_distance=np.inf):
+        # the spline is picked within the half width of the line drawn in the object id pass.
+        positions = spline.spline_data.resampling_positions if spline.spline_data is not None else []
+        if len(positions) < 2:
+            return max_distance
+
+        positions = np.dot(np.hstack([positions, np.ones((len(positions), 1))]), spline.transform.matrix)[:, :3]
+        screen_height = max(1.0, float(self.core_manager.get_window_size()[1]))
+        half_width = (spline.width + 10.0) * math.tan(math.radians(self.main_camera.fov) * 0.5) / screen_height
+
+        # closest points between the ray and the segments
+        p0 = positions[:-1]
+        segments = positions[1:] - p0
+        w = origin - p0
+        a = np.maximum(np.sum(segments * segments, axis=1), 1e-12)
+        b = np.dot(segments, direction)
+        segment_dot_w = np.sum(segments * w, axis=1)
+        direction_dot_w = np.dot(w, direction)
+        denominator = a - b * b
+        s = np.divide(segment_dot_w - b * direction_dot_w, denominator, out=np.zeros_like(a), where=(1e-12 < denominator))
+        s = np.clip(s, 0.0, 1.0)
+        t = s * b - direction_dot_w
+        # the closest point is behind the origin of the ray
+        s = np.where(t < 0.0, np.clip(segment_dot_w / a, 0.0, 1.0), s)
+        t = np.maximum(t, 0.0)
+        distances = np.linalg.norm(w + t[:, np.newaxis] * direction - s[:, np.newaxis] * segments, axis=1)
+        hit = (distances <= half_width) & (t <= max_distance)
+        return float(np.min(t[hit])) if np.any(hit) else max_distance
+
+    def pick_object_id(self, screen_x_ratio, screen_y_ratio):
+        # Cpu version of the object id pass, the ray of the mouse is tested with the actor bounds and then the triangles.
+        origin, direction = self.main_camera.get_ray(screen_x_ratio, screen_y_ratio)
+
+        # the axis gizmo is drawn over the scene
+        if self.selected_object is not None and hasattr(self.selected_object, 'transform'):
+            distance, geometry_index = self.intersect_actor(self.axis_gizmo, origin, direction)
+            if 0 <= geometry_index:
+                return self.axis_gizmo.get_object_id(geometry_index)
+
+        closest_distance = np.inf
+        object_id = 0
+        for bound_distance, actor in self.actor_octree.query_ray(origin, direction):
+            if closest_distance < bound_distance:
+                break
+            if not actor.visible:
+                continue
+            if type(actor) is CollisionActor:
+                if not RenderOption.RENDER_COLLISION:
+                    continue
+            elif actor.is_skeletal_actor():
+                if not RenderOption.RENDER_SKELETON_ACTOR:
+                    continue
+            elif not RenderOption.RENDER_STATIC_ACTOR:
+                continue
+            distance, geometry_index = self.intersect_actor(actor, origin, direction, closest_distance)
+            if 0 <= geometry_index:
+                closest_distance = distance
+                object_id = actor.get_object_id()
+
+        for spline in self.splines:
+            distance = self.intersect_spline(spline, origin, direction, closest_distance)
+            if distance < closest_distance:
+                closest_distance = distance
+                object_id = spline.get_object_id()
+
+        for gizmo_object_id, gizmo_object in self.spline_gizmo_object_map.items():
+            if gizmo_object.visible:
+                distance, geometry_index = self.intersect_actor(gizmo_object, origin, direction, closest_distance)
+                if 0 <= geometry_index:
+                    closest_distance = distance
+                    object_id = gizmo_object_id
+        return object_id
+
     def set_object_focus(self, object_name):
         obj = self.get_object(object_name)
         if obj and obj != self.main_camera:
@@ -737,31 +895,58 @@ class SceneManager(Singleton):
         self.static_translucent_render_infos = []
         self.static_shadow_render_infos = []
 
-        if RenderOption.RENDER_COLLISION:
-            gather_render_infos(culling_func=view_frustum_culling_geometry,
-                                camera=self.main_camera,
-                                light=self.main_light,
-                                actor_list=self.collision_actors,
-                                solid_render_infos=self.static_solid_render_infos,
-                                translucent_render_infos=self.static_translucent_render_infos)
-
-        if RenderOption.RENDER_STATIC_ACTOR:
-            gather_render_infos(culling_func=view_frustum_culling_geometry,
-                                camera=self.main_camera,
-                                light=self.main_light,
-                                actor_list=self.static_actors,
-                                solid_render_infos=self.static_solid_render_infos,
-                                translucent_render_infos=self.static_translucent_render_infos)
-
-            gather_render_infos(culling_func=shadow_culling,
-                                camera=self.main_camera,
-                                light=self.main_light,
-                                actor_list=self.static_actors,
-                                solid_render_infos=self.static_shadow_render_infos,
-                                translucent_render_infos=None)
-
-        self.static_solid_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
-        self.static_translucent_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
+        if RenderOption.BATCH_CULLING:
+            # retained render infos are already in draw order, so no sorting is needed.
+            if RenderOption.RENDER_COLLISION:
+                self.collision_render_info_cache.update()
+                self.collision_render_info_cache.gather_render_infos(culling_func=view_frustum_culling_geometries,
+                                                                     camera=self.main_camera,
+                                                                     light=self.main_light,
+                                                                     solid_render_infos=self.static_solid_render_infos,
+                                                                     translucent_render_infos=self.static_translucent_render_infos,
+                                                                     actors=self.frustum_actors)
+
+            if RenderOption.RENDER_STATIC_ACTOR:
+                self.static_render_info_cache.update()
+                self.static_render_info_cache.gather_render_infos(culling_func=view_frustum_culling_geometries,
+                                                                  camera=self.main_camera,
+                                                                  light=self.main_light,
+                                                                  solid_render_infos=self.static_solid_render_infos,
+                                                                  translucent_render_infos=self.static_translucent_render_infos,
+                                                                  actors=self.frustum_actors)
+
+                self.static_render_info_cache.gather_render_infos(culling_func=shadow_culling_geometries,
+                                                                  camera=self.main_camera,
+                                                                  light=self.main_light,
+                                                                  solid_render_infos=self.static_shadow_render_infos,
+                                                                  translucent_render_infos=None,
+                                                                  actors=self.shadow_actors)
+        else:
+            if RenderOption.RENDER_COLLISION:
+                gather_render_infos(culling_func=view_frustum_culling_geometry,
+                                    camera=self.main_camera,
+                                    light=self.main_light,
+                                    actor_list=self.collision_actors,
+                                    solid_render_infos=self.static_solid_render_infos,
+                                    translucent_render_infos=self.static_translucent_render_infos)
+
+            if RenderOption.RENDER_STATIC_ACTOR:
+                gather_render_infos(culling_func=view_frustum_culling_geometry,
+                                    camera=self.main_camera,
+                                    light=self.main_light,
+                                    actor_list=self.static_actors,
+                                    solid_render_infos=self.static_solid_render_infos,
+                                    translucent_render_infos=self.static_translucent_render_infos)
+
+                gather_render_infos(culling_func=shadow_culling,
+                                    camera=self.main_camera,
+                                    light=self.main_light,
+                                    actor_list=self.static_actors,
+                                    solid_render_infos=self.static_shadow_render_infos,
+                                    translucent_render_infos=None)
+
+            self.static_solid_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
+            self.static_translucent_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
 
     def update_skeleton_render_info(self):
         self.skeleton_solid_render_infos = []
@@ -769,29 +954,56 @@ class SceneManager(Singleton):
         self.skeleton_shadow_render_infos = []
 
         if RenderOption.RENDER_SKELETON_ACTOR:
-            gather_render_infos(culling_func=view_frustum_culling_geometry,
-                                camera=self.main_camera,
-                                light=self.main_light,
-                                actor_list=self.skeleton_actors,
-                                solid_render_infos=self.skeleton_solid_render_infos,
-                                translucent_render_infos=self.skeleton_translucent_render_infos)
-
-            gather_render_infos(culling_func=shadow_culling,
-                                camera=self.main_camera,
-                                light=self.main_light,
-                                actor_list=self.skeleton_actors,
-                                solid_render_infos=self.skeleton_shadow_render_infos,
-                                translucent_render_infos=None)
-
-            self.skeleton_solid_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
-            self.skeleton_translucent_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
+            if RenderOption.BATCH_CULLING:
+                self.skeleton_render_info_cache.update()
+                self.skeleton_render_info_cache.gather_render_infos(culling_func=view_frustum_culling_geometries,
+                                                                    camera=self.main_camera,
+                                                                    light=self.main_light,
+                                                                    solid_render_infos=self.skeleton_solid_render_infos,
+                                                                    translucent_render_infos=self.skeleton_translucent_render_infos,
+                                                                    actors=self.frustum_actors)
+
+                self.skeleton_render_info_cache.gather_render_infos(culling_func=shadow_culling_geometries,
+                                                                    camera=self.main_camera,
+                                                                    light=self.main_light,
+                                                                    solid_render_infos=self.skeleton_shadow_render_infos,
+                                                                    translucent_render_infos=None,
+                                                                    actors=self.shadow_actors)
+            else:
+                gather_render_infos(culling_func=view_frustum_culling_geometry,
+                                    camera=self.main_camera,
+                                    light=self.main_light,
+                                    actor_list=self.skeleton_actors,
+                                    solid_render_infos=self.skeleton_solid_render_infos,
+                                    translucent_render_infos=self.skeleton_translucent_render_infos)
+
+                gather_render_infos(culling_func=shadow_culling,
+                                    camera=self.main_camera,
+                                    light=self.main_light,
+                                    actor_list=self.skeleton_actors,
+                                    solid_render_infos=self.skeleton_shadow_render_infos,
+                                    translucent_render_infos=None)
+
+                self.skeleton_solid_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
+                self.skeleton_translucent_render_infos.sort(key=lambda x: (id(x.geometry), id(x.material)))
+
+    def update_texture_streaming(self):
+        render_infos = self.static_solid_render_infos + self.static_translucent_render_infos + \
+                       self.skeleton_solid_render_infos + self.skeleton_translucent_render_infos
+        screen_height = self.core_manager.get_window_size()[1]
+        self.renderer.texture_streaming_manager.update(self.main_camera, render_infos, screen_height)
 
     def update_light_render_infos(self):
         self.point_light_count = 0
         self.renderer.uniform_point_light_data.fill(0.0)
 
-        for point_light in self.point_lights:
-            to_light = point_light.transform.pos - self.main_camera.transform.pos
+        camera_pos = self.main_camera.transform.pos
+        point_lights = self.point_light_octree.query_frustum(camera_pos, self.main_camera.frustum_vectors)
+        # the nearest lights are used first when there are more lights than MAX_POINT_LIGHTS.
+        point_lights.sort(key=lambda x: length(x.transform.pos - camera_pos))
+
+        for point_light in point_lights:
+            to_light = point_light.transform.pos - camera_pos
             for i in range(4):
                 d = np.dot(self.main_camera.frustum_vectors[i], to_light)
                 if point_light.light_radius < d:
@@ -808,9 +1020,28 @@ class SceneManager(Singleton):
             if MAX_POINT_LIGHTS <= self.point_light_count:
                 break
 
+    def update_actors(self, dt):
+        if RenderOption.BATCH_TRANSFORM:
+            # the static actors are updated only when they are moved, the skeleton actors are animated every frame.
+            for actor in self.transform_pool.get_updated_owners():
+                if not actor.is_skeletal_actor():
+                    actor.update(dt)
+        else:
+            for actor in self.collision_actors:
+                actor.update(dt)
+            for actor in self.static_actors:
+                actor.update(dt)
+        for actor in self.skeleton_actors:
+            actor.update(dt)
+
+        for render_info_cache in (self.collision_render_info_cache, self.static_render_info_cache, self.skeleton_render_info_cache):
+            for actor in render_info_cache.pop_bound_box_updated_actors():
+                self.actor_octree.update(actor, actor.bound_box.bound_min, actor.bound_box.bound_max)
+
     def update_scene(self, dt):
         if not self.core_manager.is_basic_mode:
             self.renderer.postprocess.update()
+            self.update_select_object_id()
 
         for camera in self.cameras:
             camera.update()
@@ -824,15 +1055,13 @@ class SceneManager(Singleton):
 
         for light in self.point_lights:
             light.update()
+            if light.bound_box_updated:
+                light.bound_box_updated = False
+                self.point_light_octree.update(light, *light.get_light_bound())
 
-        for collision_actor in self.collision_actors:
-            collision_actor.update(dt)
-
-        for static_actor in self.static_actors:
-            static_actor.update(dt)
-
-        for skeleton_actor in self.skeleton_actors:
-            skeleton_actor.update(dt)
+        self.transform_pool.update_transforms()
+        self.update_actors(dt)
+        self.transform_pool.clear_pending()
 
         for spline in self.splines:
             spline.update(dt)
@@ -847,10 +1076,16 @@ class SceneManager(Singleton):
             self.effect_manager.update(dt)
 
         # culling
+        if RenderOption.BATCH_CULLING:
+            self.frustum_actors = self.actor_octree.query_frustum(self.main_camera.transform.pos, self.main_camera.frustum_vectors)
+            self.shadow_actors = self.actor_octree.query_aabb(self.main_light.shadow_bound_min, self.main_light.shadow_bound_max)
         self.update_static_render_info()
         self.update_skeleton_render_info()
         self.update_light_render_infos()
 
+        if not self.core_manager.is_basic_mode:
+            self.update_texture_streaming()
+
         if self.selected_object is not None and hasattr(self.selected_object, 'transform'):
             # update spline gizmo objects
             spline_point_gizmo_object = self.spline_gizmo_object_map.get(self.selected_spline_point_gizmo_id)
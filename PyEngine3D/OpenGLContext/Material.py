@@ -26,8 +26,9 @@ class Material:
         self.material_datas = material_datas
 
         shader_codes = material_datas.get('shader_codes')
-        binary_format = material_datas.get('binary_format')
-        binary_data = material_datas.get('binary_data')
+        # the program binary depends on the driver, so it is not saved with the material datas.
+        binary_format = material_datas.pop('binary_format', None)
+        binary_data = material_datas.pop('binary_data', None)
         uniforms = material_datas.get('uniforms', [])
         uniform_datas = material_datas.get('uniform_datas', {})
 
@@ -39,6 +40,7 @@ class Material:
         self.name = material_name
         self.shader_name = material_datas.get('shader_name', '')
         self.program = -1
+        self.is_loaded_from_binary = False
         self.uniform_buffers = dict()  # OrderedDict()  # Declaration order is important.
         self.Attributes = Attributes()
 
@@ -48,8 +50,10 @@ class Material:
             if binary_format is not None and binary_data is not None:
                 self.compile_from_binary(binary_format, binary_data)
                 self.valid = self.check_validate() and self.check_linked()
+                self.is_loaded_from_binary = self.valid
                 if not self.valid:
                     logger.error("%s material has been failed to compile from binary" % self.name)
+                    glDeleteProgram(self.program)
 
             self.compile_message = ""
 
@@ -118,7 +122,7 @@ class Material:
         binary_data = pickle.loads(binary_data)
         self.program = glCreateProgram()
         glProgramParameteri(self.program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
-        glProgramBinary(self.program, binary_format.value, binary_data, len(binary_data))
+        glProgramBinary(self.program, getattr(binary_format, 'value', binary_format), binary_data, len(binary_data))
 
     def compile_from_source(self, shader_codes: dict):
         shaders = []
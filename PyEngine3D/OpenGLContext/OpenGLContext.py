@@ -65,6 +65,7 @@ class OpenGLContext:
         if type(version_string) == bytes:
             version_string = version_string.decode("utf-8")
         logger.info("%s : %s" % (GL_VERSION.name, version_string))
+        OpenGLContext.GL_VERSION = version_string
 
         infos = [GL_MAX_VERTEX_ATTRIBS, GL_MAX_VERTEX_TEXTURE_IMAGE_UNITS, GL_MAX_VERTEX_UNIFORM_COMPONENTS,
                  GL_MAX_VERTEX_UNIFORM_BLOCKS, GL_MAX_GEOMETRY_UNIFORM_BLOCKS, GL_MAX_FRAGMENT_UNIFORM_BLOCKS,
@@ -98,6 +99,13 @@ class OpenGLContext:
 
         logger.info("=" * 30)
     @staticmethod
+    def get_driver_string():
+        # the program binaries are only compatible with the same driver.
+        return "%s|%s|%s" % (getattr(OpenGLContext, 'GL_VENDOR', ''),
+                             getattr(OpenGLContext, 'GL_RENDERER', ''),
+                             getattr(OpenGLContext, 'GL_VERSION', ''))
+
+    @staticmethod
     def check_gl_version():
         if OpenGLContext.require_gl_major_version < OpenGLContext.gl_major_version:
             return True
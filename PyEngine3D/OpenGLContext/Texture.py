@@ -9,6 +9,7 @@ import math
 import numpy as np
 
 from OpenGL.GL import *
+from OpenGL.GL.EXT.texture_compression_s3tc import GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
 
 from PyEngine3D.Common import logger
 from PyEngine3D.Utilities import Singleton, GetClassName, Attributes, Profiler
@@ -41,6 +42,11 @@ def get_numpy_dtype(data_type):
     return np.uint8
 
 
+def is_compressed_format(internal_format):
+    return internal_format in (GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT,
+                               GL_COMPRESSED_RED_RGTC1, GL_COMPRESSED_RG_RGTC2)
+
+
 def get_internal_format(str_image_mode):
     if str_image_mode == "RGBA":
         return GL_RGBA8
@@ -121,6 +127,8 @@ class Texture:
         self.buffer = -1
         self.sampler_handle = -1
         self.attribute = Attributes()
+        # StreamingTexture of TextureStreamingManager, the gl texture has only the resident mip levels.
+        self.streaming = None
 
         self.create_texture(**texture_data)
 
@@ -193,6 +201,9 @@ class Texture:
         logger.info("Delete %s : %s" % (GetClassName(self), self.name))
         glDeleteTextures([self.buffer, ])
         self.buffer = -1
+        if self.streaming is not None:
+            self.streaming.manager.unregister(self.streaming)
+            self.streaming = None
 
     def get_texture_info(self):
         return dict(
@@ -213,6 +224,10 @@ class Texture:
         )
 
     def get_save_data(self):
+        if self.streaming is not None:
+            # the full mip levels instead of the resident levels
+            return self.streaming.get_save_data()
+
         save_data = self.get_texture_info()
         data = self.get_image_data()
         if data is not None:
@@ -274,6 +289,11 @@ class Texture:
         glDeleteFramebuffers(1, [fb, ])
         return data
 
+    def get_image_data_async(self, level=0, callback=None):
+        # returns the future of the image data, it doesn't wait for the gpu. the data is flat same as get_image_data.
+        from .TextureReadback import TextureReadbackQueue
+        return TextureReadbackQueue.instance().request(self, level=level, callback=callback, flat=True)
+
     def get_mipmap_count(self):
         factor = max(max(self.width, self.height), self.depth)
         return math.floor(math.log2(factor)) + 1
@@ -297,6 +317,9 @@ class Texture:
 
         glBindTexture(self.target, self.buffer)
 
+        if self.streaming is not None:
+            self.streaming.on_bind()
+
         if wrap is not None:
             self.texure_wrap(wrap)
 
@@ -353,10 +376,19 @@ class Texture2D(Texture):
         Texture.create_texture(self, **texture_data)
 
         data = texture_data.get('data')
+        # the cooked mip levels from 1, they are uploaded instead of glGenerateMipmap.
+        mipmap_datas = texture_data.get('mipmap_datas') or []
+        if not self.enable_mipmap or data is None:
+            mipmap_datas = []
+        levels = [data] + list(mipmap_datas)
 
         self.buffer = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, self.buffer)
 
+        if mipmap_datas:
+            # the rows of the small mip levels are not aligned to 4 bytes
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
         if self.use_glTexStorage:
             glTexStorage2D(GL_TEXTURE_2D,
                            self.get_mipmap_count(),
@@ -364,27 +396,49 @@ class Texture2D(Texture):
                            self.width, self.height)
 
             if data is not None:
-                glTexSubImage2D(GL_TEXTURE_2D,
-                                0,
-                                0, 0,
-                                self.width, self.height,
-                                self.texture_format,
-                                self.data_type,
-                                data)
+                for level, level_data in enumerate(levels):
+                    width, height = self.get_mipmap_size(level)
+                    if is_compressed_format(self.internal_format):
+                        glCompressedTexSubImage2D(GL_TEXTURE_2D, level, 0, 0, width, height,
+                                                  self.internal_format, level_data.nbytes, level_data)
+                    else:
+                        glTexSubImage2D(GL_TEXTURE_2D,
+                                        level,
+                                        0, 0,
+                                        width, height,
+                                        self.texture_format,
+                                        self.data_type,
+                                        level_data)
+        elif is_compressed_format(self.internal_format):
+            for level, level_data in enumerate(levels):
+                width, height = self.get_mipmap_size(level)
+                glCompressedTexImage2D(GL_TEXTURE_2D, level, self.internal_format, width, height, 0,
+                                       level_data.nbytes, level_data)
         else:
-            glTexImage2D(GL_TEXTURE_2D,
-                         0,
-                         self.internal_format,
-                         self.width,
-                         self.height,
-                         0,
-                         self.texture_format,
-                         self.data_type,
-                         data)
-
-        if self.enable_mipmap:
+            for level, level_data in enumerate(levels):
+                width, height = self.get_mipmap_size(level)
+                glTexImage2D(GL_TEXTURE_2D,
+                             level,
+                             self.internal_format,
+                             width,
+                             height,
+                             0,
+                             self.texture_format,
+                             self.data_type,
+                             level_data)
+
+        if mipmap_datas:
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(mipmap_datas))
+        elif self.enable_mipmap:
             glGenerateMipmap(GL_TEXTURE_2D)
 
+        # the single channel textures are sampled as the grayscale, the two channel normal maps have blue of one.
+        if GL_COMPRESSED_RED_RGTC1 == self.internal_format:
+            glTexParameteriv(GL_TEXTURE_2D, GL_TEXTURE_SWIZZLE_RGBA, [GL_RED, GL_RED, GL_RED, GL_ONE])
+        elif GL_COMPRESSED_RG_RGTC2 == self.internal_format:
+            glTexParameteriv(GL_TEXTURE_2D, GL_TEXTURE_SWIZZLE_RGBA, [GL_RED, GL_GREEN, GL_ONE, GL_ONE])
+
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, self.wrap_s or self.wrap)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, self.wrap_t or self.wrap)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, self.min_filter)
@@ -0,0 +1,217 @@
+import traceback
+from ctypes import c_void_p, string_at
+
+import numpy as np
+from OpenGL.GL import *
+
+from PyEngine3D.Common import logger
+from PyEngine3D.Utilities import Singleton, GetClassName
+from .OpenGLContext import OpenGLContext
+from .Texture import get_numpy_dtype
+
+
+def get_channel_count(texture_format):
+    if texture_format in (GL_RGBA, GL_BGRA, GL_RGBA_INTEGER, GL_BGRA_INTEGER):
+        return 4
+    elif texture_format in (GL_RGB, GL_BGR, GL_RGB_INTEGER, GL_BGR_INTEGER):
+        return 3
+    elif texture_format in (GL_RG, GL_RG_INTEGER):
+        return 2
+    return 1
+
+
+class ReadbackFuture:
+    def __init__(self, readback_queue, name):
+        self.readback_queue = readback_queue
+        self.name = name
+        self.data = None
+        self.finished = False
+        self.callbacks = []
+
+    def done(self):
+        return self.finished
+
+    def result(self):
+        # blocks until the read is finished, it is same as the synchronous readback.
+        if not self.finished:
+            self.readback_queue.wait(self)
+        return self.data
+
+    def add_done_callback(self, callback):
+        if self.finished:
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    def set_result(self, data):
+        self.data = data
+        self.finished = True
+        for callback in self.callbacks:
+            try:
+                callback(self)
+            except:
+                logger.error(traceback.format_exc())
+        self.callbacks = []
+
+
+class ReadbackRequest:
+    def __init__(self, future, staging_buffer, data_size, dtype, shape):
+        self.future = future
+        self.staging_buffer = staging_buffer
+        self.data_size = data_size
+        self.dtype = dtype
+        self.shape = shape
+        self.fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+
+
+# Asynchronous readback of the textures.
+# The pixels are read into the pooled pixel pack buffers and a fence is inserted after the reads, so the request
+# doesn't wait for the gpu. update() is called on every frame, and it resolves the futures of the finished reads,
+# usually a frame or two after the request.
+class TextureReadbackQueue(Singleton):
+    min_staging_buffer_size = 256
+    max_pool_size = 64 * 1024 * 1024  # bytes of the free staging buffers
+
+    def __init__(self):
+        self.framebuffer = None
+        self.free_staging_buffers = {}  # { buffer size : [buffer, ...] }
+        self.pool_size = 0
+        self.requests = []
+
+    def initialize(self):
+        logger.info("Initialize " + GetClassName(self))
+        self.framebuffer = glGenFramebuffers(1)
+
+    def clear(self):
+        for request in self.requests:
+            glDeleteSync(request.fence)
+            glDeleteBuffers(1, [request.staging_buffer[0], ])
+            request.future.set_result(None)
+        self.requests = []
+        for buffers in self.free_staging_buffers.values():
+            glDeleteBuffers(len(buffers), buffers)
+        self.free_staging_buffers = {}
+        self.pool_size = 0
+        if self.framebuffer is not None:
+            glDeleteFramebuffers(1, [self.framebuffer, ])
+            self.framebuffer = None
+
+    def get_staging_buffer(self, data_size):
+        # the size is rounded up to the power of two to reuse the buffers
+        buffer_size = self.min_staging_buffer_size
+        while buffer_size < data_size:
+            buffer_size *= 2
+
+        buffers = self.free_staging_buffers.get(buffer_size)
+        if buffers:
+            self.pool_size -= buffer_size
+            return buffers.pop(), buffer_size
+
+        buffer = glGenBuffers(1)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+        glBufferData(GL_PIXEL_PACK_BUFFER, buffer_size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return buffer, buffer_size
+
+    def release_staging_buffer(self, staging_buffer):
+        buffer, buffer_size = staging_buffer
+        if self.max_pool_size < self.pool_size + buffer_size:
+            glDeleteBuffers(1, [buffer, ])
+        else:
+            self.free_staging_buffers.setdefault(buffer_size, []).append(buffer)
+            self.pool_size += buffer_size
+
+    def request(self, texture, level=0, x=0, y=0, width=None, height=None, layer=None, callback=None, flat=False):
+        # Returns the future of the numpy array, the shape is (height, width, channels) for the 2d texture and
+        # (layers, height, width, channels) for the texture array and the 3d texture. All layers are read if layer is None.
+        # The array is flat if flat is True, same as Texture.get_image_data.
+        future = ReadbackFuture(self, texture.name)
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        if texture.target not in (GL_TEXTURE_2D, GL_TEXTURE_2D_ARRAY, GL_TEXTURE_3D):
+            logger.error('%s is not supported to read back.' % texture.name)
+            future.set_result(None)
+            return future
+
+        if self.framebuffer is None:
+            self.initialize()
+
+        level = max(0, min(level, texture.get_mipmap_count() - 1))
+        level_width, level_height = texture.get_mipmap_size(level)
+        x = min(max(0, int(x)), level_width - 1)
+        y = min(max(0, int(y)), level_height - 1)
+        width = level_width - x if width is None else min(int(width), level_width - x)
+        height = level_height - y if height is None else min(int(height), level_height - y)
+
+        if GL_TEXTURE_2D == texture.target:
+            layers = [0]
+        elif layer is not None:
+            layers = [int(layer)]
+        elif GL_TEXTURE_3D == texture.target:
+            layers = list(range(max(1, texture.depth >> level)))
+        else:
+            layers = list(range(texture.depth))
+
+        dtype = get_numpy_dtype(texture.data_type)
+        channel_count = get_channel_count(texture.texture_format)
+        layer_size = width * height * channel_count * np.dtype(dtype).itemsize
+        data_size = layer_size * len(layers)
+        staging_buffer = self.get_staging_buffer(data_size)
+
+        if texture.texture_format in (GL_DEPTH_COMPONENT, GL_DEPTH_STENCIL):
+            attachment = OpenGLContext.get_depth_attachment(texture.internal_format)
+        else:
+            attachment = GL_COLOR_ATTACHMENT0
+
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, staging_buffer[0])
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        for i, layer_index in enumerate(layers):
+            if GL_TEXTURE_2D == texture.target:
+                glFramebufferTexture2D(GL_READ_FRAMEBUFFER, attachment, GL_TEXTURE_2D, texture.buffer, level)
+            elif GL_TEXTURE_3D == texture.target:
+                glFramebufferTexture3D(GL_READ_FRAMEBUFFER, attachment, GL_TEXTURE_3D, texture.buffer, level, layer_index)
+            else:
+                glFramebufferTextureLayer(GL_READ_FRAMEBUFFER, attachment, texture.buffer, level, layer_index)
+            glReadBuffer(GL_COLOR_ATTACHMENT0 if GL_COLOR_ATTACHMENT0 == attachment else GL_NONE)
+            glReadPixels(x, y, width, height, texture.texture_format, texture.data_type, c_void_p(i * layer_size))
+        glFramebufferTexture2D(GL_READ_FRAMEBUFFER, attachment, GL_TEXTURE_2D, 0, 0)
+        glPixelStorei(GL_PACK_ALIGNMENT, 4)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+
+        if flat:
+            shape = (-1, )
+        elif GL_TEXTURE_2D == texture.target:
+            shape = (height, width, channel_count)
+        else:
+            shape = (len(layers), height, width, channel_count)
+        self.requests.append(ReadbackRequest(future, staging_buffer, data_size, dtype, shape))
+        return future
+
+    def resolve(self, request):
+        glDeleteSync(request.fence)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, request.staging_buffer[0])
+        data_ptr = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, request.data_size, GL_MAP_READ_BIT)
+        data = np.frombuffer(string_at(data_ptr, request.data_size), dtype=request.dtype).reshape(request.shape)
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.release_staging_buffer(request.staging_buffer)
+        request.future.set_result(data)
+
+    def update(self):
+        # the fences are signaled in the request order
+        while self.requests:
+            status = glClientWaitSync(self.requests[0].fence, 0, 0)
+            if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            self.resolve(self.requests.pop(0))
+
+    def wait(self, future):
+        while self.requests and not future.done():
+            request = self.requests.pop(0)
+            # 1 second timeout, it is repeated until the read is finished.
+            while glClientWaitSync(request.fence, GL_SYNC_FLUSH_COMMANDS_BIT, 1000000000) in (GL_TIMEOUT_EXPIRED, ):
+                pass
+            self.resolve(request)
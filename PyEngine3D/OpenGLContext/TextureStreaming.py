@@ -0,0 +1,233 @@
+import math
+
+import numpy as np
+from OpenGL.GL import *
+
+from PyEngine3D.Common import logger
+from PyEngine3D.Utilities import Singleton, GetClassName
+from .Texture import Texture2D
+
+
+class StreamingTexture:
+    def __init__(self, manager, texture_datas):
+        self.manager = manager
+        self.texture = None
+        self.texture_info = {key: value for key, value in texture_datas.items() if key not in ('data', 'mipmap_datas')}
+        # all mip levels from 0, the cooked textures are memory mapped so the unused levels are not read.
+        self.mipmap_datas = [texture_datas['data']] + list(texture_datas['mipmap_datas'])
+        self.width = int(texture_datas['width'])
+        self.height = int(texture_datas['height'])
+        # bytes from the level to the smallest level
+        level_sizes = [mipmap_data.nbytes for mipmap_data in self.mipmap_datas]
+        self.resident_sizes = list(np.cumsum(level_sizes[::-1])[::-1])
+        self.base_level = self.get_level_for_screen_size(manager.initial_max_size)
+        self.resident_level = len(self.mipmap_datas)
+        self.resident_size = 0
+        self.desired_level = self.base_level
+        self.requested_frame = -1
+        self.bound_frame = -1
+        self.last_used_frame = manager.frame_index
+
+    def get_level_for_screen_size(self, screen_size):
+        # the smallest level which is not smaller than the screen size
+        if math.isinf(screen_size):
+            return 0
+        max_size = max(self.width, self.height)
+        level = int(math.floor(math.log2(max_size / max(1.0, screen_size))))
+        return min(max(0, level), len(self.mipmap_datas) - 1)
+
+    def get_texture_datas(self, level):
+        return dict(self.texture_info,
+                    width=max(1, self.width >> level),
+                    height=max(1, self.height >> level),
+                    data=self.mipmap_datas[level],
+                    mipmap_datas=self.mipmap_datas[level + 1:])
+
+    def get_save_data(self):
+        return dict(self.texture_info, data=self.mipmap_datas[0], mipmap_datas=self.mipmap_datas[1:])
+
+    def get_target_level(self, frame_index):
+        # None means that the texture isn't used, so its high levels can be evicted.
+        if self.requested_frame == frame_index:
+            return self.desired_level
+        elif frame_index - 1 <= self.bound_frame:
+            # bound by the others than the render infos, e.g. the effects and the post processes.
+            return 0
+        return None
+
+    def on_bind(self):
+        frame_index = self.manager.frame_index
+        self.last_used_frame = frame_index
+        if self.requested_frame != frame_index:
+            self.bound_frame = frame_index
+
+
+# Texture streaming of the cooked 2d textures.
+# The texture is created with the low mip levels only, and the levels are raised for the textures of the visible
+# render infos by their size on the screen. The high levels of the least recently used textures are evicted when
+# the streamed textures are over the vram budget. The texture object is kept and its gl texture is recreated
+# with the resident levels, so the material instances and Resource.get_data keep working as they are.
+class TextureStreamingManager(Singleton):
+    vram_budget = 512 * 1024 * 1024  # bytes of the resident levels of the streamed textures
+    max_upload_size_per_frame = 16 * 1024 * 1024
+    initial_max_size = 64  # the first upload is from the level of about this size
+    mip_bias = 0  # the positive bias raises the resolution
+
+    def __init__(self):
+        self.streaming_textures = []
+        self.resident_size = 0
+        self.frame_index = 0
+
+    def clear(self):
+        for streaming_texture in self.streaming_textures:
+            streaming_texture.texture.streaming = None
+        self.streaming_textures = []
+        self.resident_size = 0
+
+    def is_streamable(self, texture_datas):
+        texture_type = texture_datas.get('texture_type', Texture2D)
+        if texture_type not in (Texture2D, Texture2D.__name__) or not texture_datas.get('mipmap_datas'):
+            return False
+        return self.initial_max_size < max(texture_datas.get('width', 0), texture_datas.get('height', 0))
+
+    def create_texture(self, name, texture_datas):
+        streaming_texture = StreamingTexture(self, dict(texture_datas, texture_type=Texture2D))
+        level = streaming_texture.base_level
+        texture = Texture2D(name=name, **streaming_texture.get_texture_datas(level))
+        texture.streaming = streaming_texture
+        streaming_texture.texture = texture
+        self.streaming_textures.append(streaming_texture)
+        self.update_resident_size(streaming_texture, level)
+        return texture
+
+    def unregister(self, streaming_texture):
+        if streaming_texture in self.streaming_textures:
+            self.streaming_textures.remove(streaming_texture)
+            self.resident_size -= streaming_texture.resident_size
+            streaming_texture.resident_size = 0
+
+    def set_resident_level(self, streaming_texture, level):
+        texture = streaming_texture.texture
+        old_buffer = texture.buffer
+        # the new gl texture is created before deleting the old one, Texture.create_texture doesn't delete it.
+        texture.buffer = -1
+        texture.create_texture(**streaming_texture.get_texture_datas(level))
+        if old_buffer != -1:
+            glDeleteTextures([old_buffer, ])
+        self.update_resident_size(streaming_texture, level)
+
+    def update_resident_size(self, streaming_texture, level):
+        resident_size = streaming_texture.resident_sizes[level]
+        self.resident_size += resident_size - streaming_texture.resident_size
+        streaming_texture.resident_size = resident_size
+        streaming_texture.resident_level = level
+
+    def make_resident(self, texture, level=0):
+        # uploads the levels at once regardless of the budget, e.g. to read the full image.
+        streaming_texture = getattr(texture, 'streaming', None)
+        if streaming_texture is not None and level < streaming_texture.resident_level:
+            streaming_texture.last_used_frame = self.frame_index
+            self.set_resident_level(streaming_texture, level)
+
+    def request(self, streaming_texture, level):
+        if streaming_texture.requested_frame != self.frame_index:
+            streaming_texture.requested_frame = self.frame_index
+            streaming_texture.desired_level = level
+        else:
+            streaming_texture.desired_level = min(level, streaming_texture.desired_level)
+        streaming_texture.last_used_frame = self.frame_index
+
+    def request_render_infos(self, camera, render_infos, screen_height):
+        # the textures of the material instance are requested by the biggest geometry on the screen.
+        pixels_per_unit = screen_height * 0.5 / math.tan(math.radians(camera.fov) * 0.5)
+        camera_pos = camera.transform.pos
+        screen_sizes = {}
+        for render_info in render_infos:
+            material_instance = render_info.material_instance
+            if material_instance is None:
+                continue
+            bound_box = render_info.actor.get_geometry_bound_box(render_info.geometry.index)
+            distance = np.linalg.norm(bound_box.bound_center - camera_pos)
+            if distance <= bound_box.radius:
+                screen_size = math.inf
+            else:
+                screen_size = bound_box.radius * 2.0 * pixels_per_unit / distance
+            if screen_sizes.get(material_instance, 0.0) < screen_size:
+                screen_sizes[material_instance] = screen_size
+
+        for material_instance, screen_size in screen_sizes.items():
+            screen_size *= 2.0 ** self.mip_bias
+            for uniform_buffer, uniform_data in material_instance.linked_uniform_map.values():
+                streaming_texture = getattr(uniform_data, 'streaming', None)
+                if streaming_texture is not None:
+                    self.request(streaming_texture, streaming_texture.get_level_for_screen_size(screen_size))
+
+    def make_room(self, size, streaming_texture=None):
+        # evicts the high levels until the size fits in the budget, the unused textures are evicted first in lru order
+        # and then the textures which have more levels than they need.
+        if self.resident_size + size <= self.vram_budget:
+            return True
+
+        frame_index = self.frame_index
+        candidates = []
+        for other in self.streaming_textures:
+            if other is streaming_texture:
+                continue
+            target_level = other.get_target_level(frame_index)
+            if target_level is None:
+                target_level = other.base_level
+            if other.resident_level < target_level:
+                candidates.append((frame_index == other.last_used_frame, other.last_used_frame, target_level, other))
+        candidates.sort(key=lambda x: x[:2])
+
+        for is_used, last_used_frame, target_level, other in candidates:
+            logger.debug("%s evicts the levels of %s" % (GetClassName(self), other.texture.name))
+            self.set_resident_level(other, target_level)
+            if self.resident_size + size <= self.vram_budget:
+                return True
+        return False
+
+    def update(self, camera, render_infos, screen_height):
+        self.frame_index += 1
+        if not self.streaming_textures:
+            return
+
+        if render_infos and camera is not None:
+            self.request_render_infos(camera, render_infos, max(1, screen_height))
+
+        frame_index = self.frame_index
+        uploads = []
+        for streaming_texture in self.streaming_textures:
+            target_level = streaming_texture.get_target_level(frame_index)
+            if target_level is not None and target_level < streaming_texture.resident_level:
+                uploads.append((target_level, streaming_texture))
+        # the textures which are far from their target levels first
+        uploads.sort(key=lambda x: x[0] - x[1].resident_level)
+
+        upload_size = self.max_upload_size_per_frame
+        for target_level, streaming_texture in uploads:
+            # one level at least, and more levels in the upload size of the frame
+            level = streaming_texture.resident_level - 1
+            while target_level < level and \
+                    streaming_texture.resident_sizes[level - 1] - streaming_texture.resident_size <= upload_size:
+                level -= 1
+
+            size = streaming_texture.resident_sizes[level] - streaming_texture.resident_size
+            if upload_size < size and upload_size < self.max_upload_size_per_frame:
+                break
+
+            # the lower level which fits in the budget, nothing is uploaded if no level fits.
+            while not self.make_room(size, streaming_texture):
+                level += 1
+                if streaming_texture.resident_level <= level:
+                    break
+                size = streaming_texture.resident_sizes[level] - streaming_texture.resident_size
+            if streaming_texture.resident_level <= level:
+                continue
+            self.set_resident_level(streaming_texture, level)
+            upload_size -= size
+            if upload_size <= 0:
+                break
+
+        # the budget may be reduced
+        self.make_room(0)
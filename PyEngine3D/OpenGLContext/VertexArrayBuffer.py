@@ -7,7 +7,7 @@ from OpenGL.GL import *
 
 from PyEngine3D.Common import logger
 from PyEngine3D.Common.Constants import *
-from PyEngine3D.Utilities import compute_tangent
+from PyEngine3D.Utilities import compute_tangent, TANGENT_MODE_AREA_WEIGHTED
 from .OpenGLContext import OpenGLContext
 
 
@@ -61,7 +61,11 @@ def CreateVertexArrayBuffer(geometry_data):
 
     if len(tangents) == 0:
         is_triangle_mode = (GL_TRIANGLES == mode)
-        tangents = compute_tangent(is_triangle_mode, positions, texcoords, normals, indices)
+        tangent_mode = geometry_data.get('tangent_mode', TANGENT_MODE_AREA_WEIGHTED)
+        tangents = compute_tangent(is_triangle_mode, positions, texcoords, normals, indices, tangent_mode)
+        # the geometry data keeps the tangents, so they are saved in the mesh resource.
+        geometry_data['tangents'] = tangents
+        geometry_data['tangent_mode'] = tangent_mode
 
     if 0 < len(bone_indicies) and 0 < len(bone_weights):
         vertex_array_buffer = VertexArrayBuffer(geometry_name,
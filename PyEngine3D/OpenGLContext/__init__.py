@@ -4,6 +4,8 @@ from .RenderBuffer import RenderBuffer
 from .Shader import Shader, ShaderCompileOption, ShaderCompileMessage, default_compile_option
 from .Shader import parsing_macros, parsing_uniforms, parsing_material_components
 from .Texture import CreateTexture, Texture2D, Texture2DArray, Texture3D, Texture2DMultiSample, TextureCube
+from .TextureReadback import ReadbackFuture, TextureReadbackQueue
+from .TextureStreaming import TextureStreamingManager
 from .UniformBlock import UniformBlock
 from .UniformBuffer import CreateUniformBuffer, CreateUniformDataFromString, \
                             UniformArray, UniformInt, UniformFloat, \
@@ -5,6 +5,8 @@ import numpy as np
 from PyEngine3D.Utilities import *
 from PyEngine3D.App import CoreManager
 from .Mesh import BoundBox
+from .AnimationBlender import AnimationBlender
+from .RenderInfo import RenderInfoCache
 
 
 class StaticActor:
@@ -13,7 +15,7 @@ class StaticActor:
         self.selected = False
         self.model = None
         self.has_mesh = False
-        self.visible = object_data.get('visible', True)
+        self._visible = object_data.get('visible', True)
         self.object_id = object_data.get('object_id', 0)
         self.object_color = object_data.get('object_color', Float3(1.0, 1.0, 1.0))
 
@@ -45,6 +47,16 @@ class StaticActor:
 
         self.attributes = Attributes()
 
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, visible):
+        if self._visible != visible:
+            self._visible = visible
+            RenderInfoCache.set_actor_visible(self)
+
     def delete(self):
         pass
 
@@ -82,6 +94,7 @@ class StaticActor:
             for i, geometry in enumerate(self.model.mesh.geometries):
                 self.geometry_bound_boxes.append(BoundBox())
                 self.geometry_bound_boxes[i].clone(geometry.bound_box)
+        RenderInfoCache.invalidate(self)
 
     def get_save_data(self):
         save_data = dict(
@@ -235,6 +248,7 @@ class StaticActor:
                 self.bound_box.update_with_matrix(self.model.mesh.bound_box, self.transform.matrix)
                 for i, geometry in enumerate(self.model.mesh.geometries):
                     self.geometry_bound_boxes[i].update_with_matrix(geometry.bound_box, self.transform.matrix)
+        RenderInfoCache.set_actor_bound_box_updated(self)
 
     def update(self, dt):
         if self.transform.update_transform():
@@ -251,10 +265,9 @@ class SkeletonActor(StaticActor):
     def __init__(self, name, **object_data):
         StaticActor.__init__(self, name, **object_data)
 
-        self.last_animation_frame = 0.0
+        self.animation_blender = AnimationBlender()
         self.animation_loop = True
         self.animation_blend_time = 0.5
-        self.animation_elapsed_time = 0.0
         self.animation_speed = 1.0
         self.animation_frame = 0.0
         self.animation_play_time = 0.0
@@ -262,7 +275,6 @@ class SkeletonActor(StaticActor):
         self.is_animation_end = False
         self.animation_buffers = []
         self.prev_animation_buffers = []
-        self.blend_animation_buffers = []
         self.animation_count = 0
         self.animation_mesh = None
 
@@ -273,12 +285,11 @@ class SkeletonActor(StaticActor):
                     # just initialize
                     self.prev_animation_buffers.append(animation_buffer.copy())
                     self.animation_buffers.append(animation_buffer.copy())
-                    self.blend_animation_buffers.append(animation_buffer.copy())
                 else:
                     self.prev_animation_buffers.append(None)
                     self.animation_buffers.append(None)
-                    self.blend_animation_buffers.append(None)
             self.animation_mesh = self.model.mesh
+            self.animation_blender.get_base_layer().play(self.animation_mesh, blend_time=0.0)
 
     def is_skeletal_actor(self):
         return True
@@ -290,13 +301,14 @@ class SkeletonActor(StaticActor):
             self.animation_loop = loop
             self.animation_blend_time = blend_time
             self.animation_end_time = end_time
-            if reset:
-                self.animation_elapsed_time = 0.0
-                self.animation_play_time = start_time
-                self.animation_frame = 0.0
-                self.is_animation_end = False
-            # swap
-            self.animation_buffers, self.blend_animation_buffers = self.blend_animation_buffers, self.animation_buffers
+            base_layer = self.animation_blender.get_base_layer()
+            main_state = base_layer.get_main_state()
+            if not reset and main_state is not None:
+                start_time = main_state.play_time
+            state = base_layer.play(mesh, speed, loop, start_time, end_time, blend_time)
+            if not reset and main_state is not None:
+                state.frame = main_state.frame
+                state.is_end = main_state.is_end
 
     def get_prev_animation_buffer(self, index):
         return self.prev_animation_buffers[index]
@@ -308,46 +320,16 @@ class SkeletonActor(StaticActor):
         StaticActor.update(self, dt)
 
         # update animation
-        animation_end = self.is_animation_end
-        blend_ratio = 1.0
-        update_animation_frame = True
-        for i, animation in enumerate(self.animation_mesh.animations):
-            if animation is not None:
-                # update animation frame only first animation
-                if update_animation_frame:
-                    update_animation_frame = False
-                    frame_count = animation.frame_count
-                    if frame_count > 1:
-                        self.animation_play_time += dt * self.animation_speed
-
-                        animation_end_time = animation.animation_length
-
-                        if self.animation_end_time is not None and self.animation_end_time < animation_end_time:
-                            animation_end_time = self.animation_end_time
-
-                        if self.animation_loop:
-                            if animation_end_time < self.animation_play_time:
-                                self.animation_play_time = math.fmod(self.animation_play_time, animation_end_time)
-                        else:
-                            self.animation_play_time = min(animation_end_time, self.animation_play_time)
-                            if animation_end_time == self.animation_play_time:
-                                animation_end = True
-                        self.animation_frame = animation.get_time_to_frame(self.animation_frame, self.animation_play_time)
-                    else:
-                        self.animation_frame = 0.0
-                    if self.animation_elapsed_time < self.animation_blend_time:
-                        blend_ratio = self.animation_elapsed_time / self.animation_blend_time
-                    self.animation_elapsed_time += dt
-
-                # update animation buffers
-                self.prev_animation_buffers[i][...] = self.animation_buffers[i]
-
-                if self.last_animation_frame != self.animation_frame:
-                    self.last_animation_frame = self.animation_frame
-                    animation_buffer = animation.get_animation_transforms(self.animation_frame)
-
-                    if blend_ratio < 1.0:
-                        self.animation_buffers[i][...] = self.blend_animation_buffers[i] * (1.0 - blend_ratio) + animation_buffer * blend_ratio
-                    else:
-                        self.animation_buffers[i][...] = animation_buffer
-        self.is_animation_end = animation_end
+        self.animation_blender.update(dt)
+        main_state = self.animation_blender.get_base_layer().get_main_state()
+        if main_state is not None:
+            self.animation_frame = main_state.frame
+            self.animation_play_time = main_state.play_time
+            self.is_animation_end = main_state.is_end
+
+        for i, animation_buffer in enumerate(self.animation_buffers):
+            if animation_buffer is not None:
+                # swap buffers instead of copying, the current buffer is overwritten by the blended pose.
+                self.prev_animation_buffers[i], self.animation_buffers[i] = animation_buffer, self.prev_animation_buffers[i]
+                if not self.animation_blender.evaluate(i, self.animation_buffers[i]):
+                    self.animation_buffers[i][...] = animation_buffer
@@ -1,9 +1,73 @@
 import copy
+from collections import OrderedDict
+import math
 
 from PyEngine3D.Common import logger
 from PyEngine3D.Utilities import *
 
 
+# Skinning matrices shared by all the SkeletonActors, keyed by the animation and the quantized frame.
+# The frame is rounded to frame_quantum, so the actors playing nearby frames of the same clip share a pose.
+class AnimationPoseCache(Singleton):
+    def __init__(self):
+        self.frame_quantum = 0.1
+        self.memory_budget = 32 * 1024 * 1024
+        # pre-bake the whole clip into a pose table when the animation is loaded
+        self.bake_on_load = False
+        self.poses = OrderedDict()
+        self.memory_size = 0
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def set_config(self, frame_quantum=None, memory_budget=None, bake_on_load=None):
+        if frame_quantum is not None and frame_quantum != self.frame_quantum:
+            self.frame_quantum = frame_quantum
+            self.clear()
+        if memory_budget is not None:
+            self.memory_budget = memory_budget
+            self.evict()
+        if bake_on_load is not None:
+            self.bake_on_load = bake_on_load
+
+    def clear(self):
+        self.poses = OrderedDict()
+        self.memory_size = 0
+
+    def evict(self):
+        # least recently used first
+        while self.memory_budget < self.memory_size and self.poses:
+            key, pose = self.poses.popitem(last=False)
+            self.memory_size -= pose.nbytes
+
+    def get_pose(self, animation, frame):
+        if 0.0 < self.frame_quantum:
+            key_frame = int(round(frame / self.frame_quantum))
+            frame = key_frame * self.frame_quantum
+        else:
+            key_frame = frame
+
+        if animation.baked_poses is not None and animation.baked_frame_quantum == self.frame_quantum and \
+                0 <= key_frame < len(animation.baked_poses):
+            self.hit_count += 1
+            return animation.baked_poses[key_frame]
+
+        key = (animation, key_frame)
+        pose = self.poses.get(key)
+        if pose is not None:
+            self.hit_count += 1
+            self.poses.move_to_end(key)
+            return pose
+
+        self.miss_count += 1
+        pose = animation.get_pose_transforms(*animation.sample_pose(frame))
+        # shared by the actors, so never modify it.
+        pose.flags.writeable = False
+        self.poses[key] = pose
+        self.memory_size += pose.nbytes
+        self.evict()
+        return pose
+
+
 class Animation:
     def __init__(self, name, index, skeleton, animation_data):
         self.name = name
@@ -28,8 +92,51 @@ class Animation:
 
         self.last_frame = 0.0
 
+        # keyframes of all bones, (frames, bones, 4) and (frames, bones, 3). a node has its own key count.
+        bone_count = len(self.nodes)
+        frame_count = max([1, ] + [node.frame_count for node in self.nodes])
+        self.key_counts = np.array([max(1, node.frame_count) for node in self.nodes], dtype=np.int32)
+        self.rotations = np.zeros((frame_count, bone_count, 4), dtype=np.float32)
+        self.rotations[..., 0] = 1.0
+        self.locations = np.zeros((frame_count, bone_count, 3), dtype=np.float32)
+        self.scales = np.ones((frame_count, bone_count, 3), dtype=np.float32)
+        # the node without keys keeps the identity transform
+        self.inv_bind_matrices = np.array([MATRIX4_IDENTITY for node in self.nodes], dtype=np.float32).reshape(bone_count, 4, 4)
+        for i, node in enumerate(self.nodes):
+            if 0 < node.frame_count:
+                self.rotations[:node.frame_count, i] = node.rotations
+                self.locations[:node.frame_count, i] = node.locations
+                self.scales[:node.frame_count, i] = node.scales
+                if not node.precompute_inv_bind_matrix:
+                    self.inv_bind_matrices[i] = node.bone.inv_bind_matrix
+
+        # (bone indices, parent indices) of each depth for the level by level hierarchy composition.
+        self.bone_levels = []
+        if self.root_node is not None and not self.root_node.precompute_parent_matrix:
+            levels = []
+
+            def gather_bone_levels(bone):
+                if bone.index < bone_count:
+                    while len(levels) <= bone.depth:
+                        levels.append(([], []))
+                    levels[bone.depth][0].append(bone.index)
+                    levels[bone.depth][1].append(bone.parent.index if bone.parent is not None else -1)
+                    for child in bone.children:
+                        gather_bone_levels(child)
+
+            for bone in self.skeleton.hierachy:
+                gather_bone_levels(bone)
+            self.bone_levels = [(np.array(bone_indices, dtype=np.int32), np.array(parent_indices, dtype=np.int32)) for bone_indices, parent_indices in levels if bone_indices]
+
+        self.baked_poses = None
+        self.baked_frame_quantum = 0.0
+
+        pose_cache = AnimationPoseCache.instance()
+        if pose_cache.bake_on_load and 0.0 < pose_cache.frame_quantum:
+            self.bake_poses(pose_cache.frame_quantum)
+
         # just update animation transforms
-        self.animation_transforms = np.array([Matrix4() for i in range(len(self.nodes))], dtype=np.float32)
+        self.animation_transforms = None
         self.get_animation_transforms(0.0)
 
     def get_time_to_frame(self, current_frame, current_time):
@@ -51,30 +158,53 @@ class Animation:
             return float(frame) + ratio
         return 0.0
 
-    def get_animation_transforms(self, frame=0.0):
-        if self.last_frame == frame:
-            return self.animation_transforms
+    def sample_pose(self, frame=0.0):
+        # local rotations, locations and scales of all bones at the frame, same interpolation as AnimationNode.get_transform
+        rate = frame - int(frame)
+        frames = int(frame) % self.key_counts
+        next_frames = (frames + 1) % self.key_counts
+        bone_indices = np.arange(len(self.key_counts))
+        rotations = slerp_quaternions(self.rotations[frames, bone_indices], self.rotations[next_frames, bone_indices], rate)
+        locations = lerp(self.locations[frames, bone_indices], self.locations[next_frames, bone_indices], rate)
+        scales = lerp(self.scales[frames, bone_indices], self.scales[next_frames, bone_indices], rate)
+        return rotations, locations, scales
+
+    def get_pose_transforms(self, rotations, locations, scales, out=None):
+        # local pose to the skinning matrices
+        local_transforms = quaternions_to_matrices(rotations)
+        local_transforms[:, 0:3, 0:3] *= scales[:, :, np.newaxis]
+        local_transforms[:, 3, 0:3] = locations
+        local_transforms = np.matmul(self.inv_bind_matrices, local_transforms)
+
+        if out is None:
+            out = np.empty_like(local_transforms)
+
+        if self.bone_levels:
+            # bones not in the hierarchy stay identity
+            out[...] = MATRIX4_IDENTITY
+            for bone_indices, parent_indices in self.bone_levels:
+                if parent_indices[0] < 0:
+                    out[bone_indices] = local_transforms[bone_indices]
+                else:
+                    out[bone_indices] = np.matmul(local_transforms[bone_indices], out[parent_indices])
         else:
-            self.last_frame = frame
+            out[...] = local_transforms
+        return out
+
+    def bake_poses(self, frame_quantum):
+        # pose table of the whole clip, (frames / frame_quantum, bones, 4, 4)
+        bake_frame_count = int(math.ceil(max(0, self.frame_count - 1) / frame_quantum)) + 1
+        self.baked_poses = np.empty((bake_frame_count, len(self.nodes), 4, 4), dtype=np.float32)
+        for i in range(bake_frame_count):
+            self.get_pose_transforms(*self.sample_pose(i * frame_quantum), out=self.baked_poses[i])
+        self.baked_poses.flags.writeable = False
+        self.baked_frame_quantum = frame_quantum
 
-            if self.root_node.precompute_parent_matrix:
-                for i, node in enumerate(self.nodes):
-                    self.animation_transforms[i][...] = node.get_transform(frame)
-            else:
-                def animation(parent_bone, parent_matrix):
-                    for bone in parent_bone.children:
-                        node = self.nodes[bone.index]
-                        node.get_transform(frame)
-                        transform = self.animation_transforms[bone.index]
-                        transform[...] = np.dot(node.transform, parent_matrix)
-                        animation(bone, transform)
-
-                for bone in self.skeleton.hierachy:
-                    node = self.nodes[bone.index]
-                    transform = self.animation_transforms[bone.index]
-                    transform[...] = node.get_transform(frame)
-                    animation(bone, transform)
-            return self.animation_transforms
+    def get_animation_transforms(self, frame=0.0):
+        if self.last_frame != frame or self.animation_transforms is None:
+            self.last_frame = frame
+            self.animation_transforms = AnimationPoseCache.instance().get_pose(self, frame)
+        return self.animation_transforms
 
 
 class AnimationNode:
@@ -0,0 +1,250 @@
+import math
+
+import numpy as np
+
+from PyEngine3D.Utilities import *
+from .Animation import AnimationPoseCache
+
+
+class AnimationState:
+    def __init__(self, mesh, speed=1.0, loop=True, start_time=0.0, end_time=None, weight=1.0):
+        self.mesh = mesh
+        self.speed = speed
+        self.loop = loop
+        self.end_time = end_time
+        self.play_time = start_time
+        self.frame = 0.0
+        self.is_end = False
+        self.weight = weight
+        self.target_weight = weight
+        self.fade_speed = 0.0
+
+    def get_animation(self, index=0):
+        return self.mesh.get_animation(index) if self.mesh is not None else None
+
+    def get_first_animation(self):
+        if self.mesh is not None:
+            for animation in self.mesh.animations:
+                if animation is not None:
+                    return animation
+        return None
+
+    def fade_to(self, target_weight, fade_time=0.0):
+        self.target_weight = target_weight
+        if fade_time <= 0.0:
+            self.weight = target_weight
+            self.fade_speed = 0.0
+        else:
+            self.fade_speed = abs(target_weight - self.weight) / fade_time
+
+    def update(self, dt):
+        if self.weight != self.target_weight:
+            if 0.0 < self.fade_speed:
+                delta = self.fade_speed * dt
+                if self.weight < self.target_weight:
+                    self.weight = min(self.target_weight, self.weight + delta)
+                else:
+                    self.weight = max(self.target_weight, self.weight - delta)
+            else:
+                self.weight = self.target_weight
+
+        # the play time follows the first animation of the mesh
+        animation = self.get_first_animation()
+        if animation is None:
+            return
+
+        if 1 < animation.frame_count:
+            self.play_time += dt * self.speed
+
+            animation_end_time = animation.animation_length
+            if self.end_time is not None and self.end_time < animation_end_time:
+                animation_end_time = self.end_time
+
+            if self.loop:
+                if animation_end_time < self.play_time:
+                    self.play_time = math.fmod(self.play_time, animation_end_time)
+            else:
+                self.play_time = min(animation_end_time, self.play_time)
+                if animation_end_time == self.play_time:
+                    self.is_end = True
+            self.frame = animation.get_time_to_frame(self.frame, self.play_time)
+        else:
+            self.frame = 0.0
+
+
+# Any number of weighted animation states, blended in the local rotation, location and scale space.
+# bone_mask is the per bone weight of the layer over the layers below, None means all the bones.
+class AnimationLayer:
+    def __init__(self, name='', weight=1.0, bone_mask=None):
+        self.name = name
+        self.weight = weight
+        self.bone_mask = None
+        self.states = []
+        self.set_bone_mask(bone_mask)
+
+    def set_bone_mask(self, bone_mask):
+        self.bone_mask = np.array(bone_mask, dtype=np.float32) if bone_mask is not None else None
+
+    def clear(self):
+        self.states = []
+
+    def get_main_state(self):
+        # the latest state which is not fading out
+        for state in reversed(self.states):
+            if 0.0 < state.target_weight:
+                return state
+        return self.states[-1] if self.states else None
+
+    def play(self, mesh, speed=1.0, loop=True, start_time=0.0, end_time=None, blend_time=0.5, weight=1.0):
+        # cross fade from the playing states
+        for state in self.states:
+            state.fade_to(0.0, blend_time)
+        state = AnimationState(mesh, speed, loop, start_time, end_time, weight=weight if not self.states else 0.0)
+        state.fade_to(weight, blend_time if self.states else 0.0)
+        self.states.append(state)
+        return state
+
+    def add_state(self, mesh, speed=1.0, loop=True, start_time=0.0, end_time=None, weight=1.0):
+        # blend with the playing states, e.g. the locomotion blend of walk and run by their weights.
+        state = AnimationState(mesh, speed, loop, start_time, end_time, weight=weight)
+        self.states.append(state)
+        return state
+
+    def remove_state(self, state):
+        if state in self.states:
+            self.states.remove(state)
+
+    def update(self, dt):
+        for state in self.states:
+            state.update(dt)
+        # release the faded out states, but keep the last one.
+        if 1 < len(self.states):
+            self.states = [state for state in self.states if 0.0 < state.weight or 0.0 < state.target_weight] or self.states[-1:]
+
+    def sample_pose(self, animation_index):
+        # returns (rotations, locations, scales, total weight) or None
+        rotations = locations = scales = None
+        total_weight = 0.0
+        for state in self.states:
+            animation = state.get_animation(animation_index)
+            if animation is None or state.weight <= 0.0:
+                continue
+            state_rotations, state_locations, state_scales = animation.sample_pose(state.frame)
+            if rotations is None:
+                rotations = state_rotations * state.weight
+                locations = state_locations * state.weight
+                scales = state_scales * state.weight
+            else:
+                # keep the quaternions in the same hemisphere of the first state
+                signs = np.where(np.sum(rotations * state_rotations, axis=1) < 0.0, -state.weight, state.weight)
+                rotations += state_rotations * signs[:, np.newaxis]
+                locations += state_locations * state.weight
+                scales += state_scales * state.weight
+            total_weight += state.weight
+
+        if rotations is None:
+            return None
+
+        rotations /= np.maximum(np.linalg.norm(rotations, axis=1), 1e-8)[:, np.newaxis]
+        locations /= total_weight
+        scales /= total_weight
+        return rotations, locations, scales, total_weight
+
+
+class AnimationBlender:
+    def __init__(self):
+        self.layers = [AnimationLayer('base'), ]
+
+    def get_base_layer(self):
+        return self.layers[0]
+
+    def get_layer(self, name):
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        return None
+
+    def add_layer(self, name, weight=1.0, bone_mask=None):
+        layer = AnimationLayer(name, weight, bone_mask)
+        self.layers.append(layer)
+        return layer
+
+    def remove_layer(self, name):
+        layer = self.get_layer(name)
+        if layer is not None and layer is not self.layers[0]:
+            self.layers.remove(layer)
+
+    def update(self, dt):
+        for layer in self.layers:
+            layer.update(dt)
+
+    def is_single_pose(self, animation_index):
+        # just one full weighted state, the pose can be taken from the shared pose cache.
+        layer = self.layers[0]
+        if 1 != len(layer.states) or layer.states[0].weight < 1.0:
+            return False
+        for upper_layer in self.layers[1:]:
+            if 0.0 < upper_layer.weight and any(state.get_animation(animation_index) is not None and 0.0 < state.weight for state in upper_layer.states):
+                return False
+        return True
+
+    def evaluate(self, animation_index, out):
+        # writes the skinning matrices of the animation index into out, returns False if there is nothing to play.
+        base_layer = self.layers[0]
+        if self.is_single_pose(animation_index):
+            state = base_layer.states[0]
+            animation = state.get_animation(animation_index)
+            if animation is None:
+                return False
+            out[...] = AnimationPoseCache.instance().get_pose(animation, state.frame)
+            return True
+
+        pose = base_layer.sample_pose(animation_index)
+        animation = None
+        for state in base_layer.states:
+            animation = state.get_animation(animation_index) or animation
+
+        for layer in self.layers[1:]:
+            layer_pose = layer.sample_pose(animation_index)
+            if layer_pose is None or layer.weight <= 0.0:
+                continue
+            if animation is None:
+                animation = next(state.get_animation(animation_index) for state in layer.states if state.get_animation(animation_index) is not None)
+            if pose is None:
+                pose = layer_pose
+                continue
+            rotations, locations, scales, total_weight = pose
+            layer_rotations, layer_locations, layer_scales, layer_total_weight = layer_pose
+            weights = np.full(len(rotations), layer.weight * min(1.0, layer_total_weight), dtype=np.float32)
+            if layer.bone_mask is not None:
+                bone_mask = layer.bone_mask[:len(weights)]
+                if len(bone_mask) < len(weights):
+                    # the bones out of the mask are blended fully.
+                    bone_mask = np.pad(bone_mask, (0, len(weights) - len(bone_mask)), constant_values=1.0)
+                weights *= bone_mask
+            rotations = slerp_quaternions(rotations, layer_rotations, weights)
+            locations = lerp(locations, layer_locations, weights[:, np.newaxis])
+            scales = lerp(scales, layer_scales, weights[:, np.newaxis])
+            pose = (rotations, locations, scales, total_weight)
+
+        if pose is None or animation is None:
+            return False
+
+        # compose the skinning palette once
+        animation.get_pose_transforms(*pose[:3], out=out)
+        return True
+
+    @staticmethod
+    def create_bone_mask(skeleton, bone_names, weight=1.0, include_children=True):
+        bone_mask = np.zeros(len(skeleton.bones), dtype=np.float32)
+
+        def set_weight(bone):
+            bone_mask[bone.index] = weight
+            if include_children:
+                for child in bone.children:
+                    set_weight(child)
+
+        for bone in skeleton.bones:
+            if bone is not None and bone.name in bone_names:
+                set_weight(bone)
+        return bone_mask
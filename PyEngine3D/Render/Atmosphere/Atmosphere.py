@@ -1,3 +1,4 @@
+import os
 import time
 import math
 
@@ -6,6 +7,7 @@ from OpenGL.GL.shaders import *
 from OpenGL.GL.shaders import glDeleteShader
 
 import numpy as np
+import traceback
 
 from PyEngine3D.Common import logger
 from PyEngine3D.App import CoreManager
@@ -13,6 +15,7 @@ from PyEngine3D.Render import ScreenQuad
 from PyEngine3D.Utilities import Attributes
 from .Constants import *
 from .Model import *
+from .LUTCache import AtmosphereLUTCache
 
 
 class Luminance:
@@ -22,6 +25,10 @@ class Luminance:
 
 
 class Atmosphere:
+    # the attributes which need the other precomputed textures
+    model_attribute_names = ('use_constant_solar_spectrum', 'use_ozone', 'ground_albedo', 'mie_phase_function_g',
+                             'num_scattering_orders')
+
     def __init__(self, **object_data):
         self.name = object_data.get('name', 'atmosphere')
         self.attributes = Attributes()
@@ -39,6 +46,10 @@ class Atmosphere:
         self.sun_zenith_angle_radians = 1.3
         self.sun_azimuth_angle_radians = 2.9
         self.sun_direction = Float3()
+        self.ground_albedo = kGroundAlbedo
+        self.mie_phase_function_g = kMiePhaseFunctionG
+        self.num_scattering_orders = 4
+        self.progressive_precompute = True
 
         self.white_point = Float3()
         self.earth_center = Float3(0.0, -kBottomRadius / kLengthUnitInMeters, 0.0)
@@ -67,6 +78,11 @@ class Atmosphere:
         self.noise_tiling = 0.0003
 
         self.model = None
+        self.model_key = None
+        self.lut_cache = AtmosphereLUTCache()
+        self.precompute_model = None
+        self.precompute_model_key = None
+        self.precompute_steps = None
         self.atmosphere_material_instance = None
 
         self.transmittance_texture = None
@@ -94,6 +110,8 @@ class Atmosphere:
     def set_attribute(self, attribute_name, attribute_value, item_info_history, attribute_index):
         if hasattr(self, attribute_name):
             setattr(self, attribute_name, attribute_value)
+            if attribute_name in self.model_attribute_names and self.quad is not None:
+                self.update_model(progressive=self.progressive_precompute)
 
     def load_data(self, object_data):
         for key, value in object_data.items():
@@ -117,6 +135,12 @@ class Atmosphere:
             noise_contrast=self.noise_contrast,
             noise_coverage=self.noise_coverage,
             sun_size=self.sun_size,
+            use_constant_solar_spectrum=self.use_constant_solar_spectrum,
+            use_ozone=self.use_ozone,
+            ground_albedo=self.ground_albedo,
+            mie_phase_function_g=self.mie_phase_function_g,
+            num_scattering_orders=self.num_scattering_orders,
+            progressive_precompute=self.progressive_precompute,
         )
         return save_data
 
@@ -133,6 +157,25 @@ class Atmosphere:
             }
         )
 
+        self.lut_cache.initialize(os.path.join(resource_manager.project_path, 'Caches', 'Atmosphere'))
+
+        # the saved textures are used until the textures of the current parameters are loaded or precomputed.
+        self.transmittance_texture = resource_manager.get_texture('precomputed_atmosphere.transmittance', default_texture=False)
+        self.scattering_texture = resource_manager.get_texture('precomputed_atmosphere.scattering', default_texture=False)
+        self.irradiance_texture = resource_manager.get_texture('precomputed_atmosphere.irradiance', default_texture=False)
+        has_saved_textures = None not in (self.transmittance_texture, self.scattering_texture, self.irradiance_texture)
+
+        if not self.use_combined_textures:
+            self.optional_single_mie_scattering_texture = resource_manager.get_texture(
+                'precomputed_atmosphere.optional_single_mie_scattering', default_texture=False)
+            has_saved_textures = has_saved_textures and self.optional_single_mie_scattering_texture is not None
+
+        self.update_model(progressive=self.progressive_precompute and has_saved_textures)
+
+        self.cloud_texture = resource_manager.get_texture('precomputed_atmosphere.cloud_3d')
+        self.noise_texture = resource_manager.get_texture('precomputed_atmosphere.noise_3d')
+
+    def create_model(self):
         # precompute constants
         max_sun_zenith_angle = 120.0 / 180.0 * kPi
 
@@ -165,56 +208,112 @@ class Atmosphere:
                 absorption_extinction.append(kMaxOzoneNumberDensity * kOzoneCrossSection[int((i - kLambdaMin) / 10)])
             else:
                 absorption_extinction.append(0.0)
-            ground_albedo.append(kGroundAlbedo)
+            ground_albedo.append(self.ground_albedo)
 
         rayleigh_density = [rayleigh_layer, ]
         mie_density = [mie_layer, ]
 
+        return Model(wavelengths,
+                     solar_irradiance,
+                     kSunAngularRadius,
+                     kBottomRadius,
+                     kTopRadius,
+                     rayleigh_density,
+                     rayleigh_scattering,
+                     mie_density,
+                     mie_scattering,
+                     mie_extinction,
+                     self.mie_phase_function_g,
+                     ozone_density,
+                     absorption_extinction,
+                     ground_albedo,
+                     max_sun_zenith_angle,
+                     kLengthUnitInMeters,
+                     self.num_precomputed_wavelengths,
+                     Luminance.PRECOMPUTED == self.luminance_type,
+                     self.use_combined_textures)
+
+    def update_model(self, progressive=True):
+        # the textures are loaded from the cache, or precomputed on the next frames if progressive.
+        model = self.create_model()
+        model_key = model.get_cache_key(self.num_scattering_orders)
+        if model_key == self.model_key or (self.precompute_model is not None and model_key == self.precompute_model_key):
+            return
+        self.cancel_precompute()
+
         if Luminance.PRECOMPUTED == self.luminance_type:
             self.kSky[...] = [MAX_LUMINOUS_EFFICACY, MAX_LUMINOUS_EFFICACY, MAX_LUMINOUS_EFFICACY]
         else:
-            self.kSky[...] = ComputeSpectralRadianceToLuminanceFactors(wavelengths, solar_irradiance, -3)
-        self.kSun[...] = ComputeSpectralRadianceToLuminanceFactors(wavelengths, solar_irradiance, 0)
-
-        # generate precomputed textures
-        if not resource_manager.texture_loader.hasResource('precomputed_atmosphere.transmittance') or \
-                not resource_manager.texture_loader.hasResource('precomputed_atmosphere.scattering') or \
-                not resource_manager.texture_loader.hasResource('precomputed_atmosphere.irradiance') or \
-                not resource_manager.texture_loader.hasResource(
-                    'precomputed_atmosphere.optional_single_mie_scattering') and not self.use_combined_textures:
-            model = Model(wavelengths,
-                          solar_irradiance,
-                          kSunAngularRadius,
-                          kBottomRadius,
-                          kTopRadius,
-                          rayleigh_density,
-                          rayleigh_scattering,
-                          mie_density,
-                          mie_scattering,
-                          mie_extinction,
-                          kMiePhaseFunctionG,
-                          ozone_density,
-                          absorption_extinction,
-                          ground_albedo,
-                          max_sun_zenith_angle,
-                          kLengthUnitInMeters,
-                          self.num_precomputed_wavelengths,
-                          Luminance.PRECOMPUTED == self.luminance_type,
-                          self.use_combined_textures)
-            model.generate()
-
-        self.transmittance_texture = resource_manager.get_texture('precomputed_atmosphere.transmittance')
-        self.scattering_texture = resource_manager.get_texture('precomputed_atmosphere.scattering')
-        self.irradiance_texture = resource_manager.get_texture('precomputed_atmosphere.irradiance')
-
-        if not self.use_combined_textures:
-            self.optional_single_mie_scattering_texture = resource_manager.get_texture(
-                'precomputed_atmosphere.optional_single_mie_scattering')
-
-        self.cloud_texture = resource_manager.get_texture('precomputed_atmosphere.cloud_3d')
-        self.noise_texture = resource_manager.get_texture('precomputed_atmosphere.noise_3d')
+            self.kSky[...] = ComputeSpectralRadianceToLuminanceFactors(model.wavelengths, model.solar_irradiance, -3)
+        self.kSun[...] = ComputeSpectralRadianceToLuminanceFactors(model.wavelengths, model.solar_irradiance, 0)
+
+        lut_datas = self.lut_cache.load_variant(model_key)
+        if lut_datas is not None:
+            try:
+                model.create_lut_textures(lut_datas)
+                self.apply_model(model, model_key)
+                return
+            except BaseException:
+                logger.error(traceback.format_exc())
+                model.delete_lut_textures()
+            finally:
+                lut_datas.close()
+
+        logger.info("Precompute atmosphere : %s" % model_key)
+        self.precompute_model = model
+        self.precompute_model_key = model_key
+        self.precompute_steps = model.generate_progressive(self.num_scattering_orders)
+        if not progressive:
+            self.update_precompute(step_count=-1)
+
+    def is_precomputing(self):
+        return self.precompute_steps is not None
+
+    def update_precompute(self, step_count=1):
+        # step_count < 0 runs all the remaining steps
+        while self.precompute_steps is not None and 0 != step_count:
+            step_count -= 1
+            try:
+                is_done = next(self.precompute_steps, None) is None
+            except BaseException:
+                logger.error(traceback.format_exc())
+                self.cancel_precompute()
+                return
+
+            if is_done:
+                model = self.precompute_model
+                model_key = self.precompute_model_key
+                self.precompute_model = None
+                self.precompute_model_key = None
+                self.precompute_steps = None
+                model.get_lut_datas_async(lambda lut_datas: self.lut_cache.save_variant(model_key, lut_datas))
+                self.apply_model(model, model_key)
+
+    def cancel_precompute(self):
+        if self.precompute_model is not None:
+            self.precompute_steps.close()
+            self.precompute_model.delete_intermediate_textures()
+            self.precompute_model.delete_lut_textures()
+            self.precompute_model = None
+            self.precompute_model_key = None
+            self.precompute_steps = None
+
+    def apply_model(self, model, model_key):
+        # the saved textures of the resources are not deleted
+        if self.model is not None:
+            self.model.delete_lut_textures()
+        self.model = model
+        self.model_key = model_key
+        model.update_atmosphere_predefine()
+
+        self.transmittance_texture = model.transmittance_texture
+        self.scattering_texture = model.scattering_texture
+        self.irradiance_texture = model.irradiance_texture
+        self.optional_single_mie_scattering_texture = model.optional_single_mie_scattering_texture
 
     def update(self, main_light):
+        self.update_precompute()
+
         if not self.is_render_atmosphere:
             return
 
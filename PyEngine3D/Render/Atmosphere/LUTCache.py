@@ -0,0 +1,58 @@
+import os
+import traceback
+
+import numpy as np
+
+from PyEngine3D.Common import logger
+from PyEngine3D.Utilities import check_directory_and_mkdir
+
+
+# On-disk cache of the precomputed atmosphere textures, one variant per the hash of the model parameters.
+#   file : <cache_path>/<key>.npz, { lut name : image data }
+# The arrays of the npz file are read only when they are accessed, and the least recently used variants are removed.
+class AtmosphereLUTCache:
+    def __init__(self, max_variant_count=8):
+        self.cache_path = ''
+        self.max_variant_count = max_variant_count
+
+    def initialize(self, cache_path):
+        self.cache_path = cache_path
+        check_directory_and_mkdir(self.cache_path)
+
+    def get_cache_filepath(self, key):
+        return os.path.join(self.cache_path, key + '.npz')
+
+    def has_variant(self, key):
+        return os.path.exists(self.get_cache_filepath(key))
+
+    def load_variant(self, key):
+        filepath = self.get_cache_filepath(key)
+        if os.path.exists(filepath):
+            try:
+                # mark as recently used
+                os.utime(filepath)
+                return np.load(filepath)
+            except:
+                logger.error(traceback.format_exc())
+        return None
+
+    def save_variant(self, key, lut_datas):
+        filepath = self.get_cache_filepath(key)
+        temp_filepath = filepath + '.tmp.npz'
+        try:
+            np.savez(temp_filepath, **lut_datas)
+            os.replace(temp_filepath, filepath)
+        except:
+            logger.error(traceback.format_exc())
+            return
+        self.remove_old_variants()
+
+    def remove_old_variants(self):
+        filepaths = [os.path.join(self.cache_path, filename) for filename in os.listdir(self.cache_path)
+                     if filename.endswith('.npz') and not filename.endswith('.tmp.npz')]
+        filepaths.sort(key=os.path.getmtime, reverse=True)
+        for filepath in filepaths[self.max_variant_count:]:
+            try:
+                os.remove(filepath)
+            except:
+                logger.error(traceback.format_exc())
@@ -1,3 +1,4 @@
+import hashlib
 from math import cos, sin
 import numpy as np
 
@@ -11,75 +12,90 @@ from PyEngine3D.Render import ScreenQuad
 from .Constants import *
 
 
-def CieColorMatchingFunctionTableValue(wavelength, column):
-    if wavelength <= kLambdaMin or wavelength >= kLambdaMax:
-        return 0.0
+# increase when the precompute shaders are changed
+LUT_CACHE_VERSION = 1
+
+
+CIE_TABLE = np.array(CIE_2_DEG_COLOR_MATCHING_FUNCTIONS, dtype=np.float64).reshape(-1, 4)
+XYZ_TO_SRGB_MATRIX = np.array(XYZ_TO_SRGB, dtype=np.float64).reshape(3, 3)
+
+# { (function name, parameters) : result }
+spectral_cache = dict()
+
+
+def get_cached_spectral_result(key, compute_function):
+    result = spectral_cache.get(key)
+    if result is None:
+        result = compute_function()
+        spectral_cache[key] = result
+    return result
 
-    u = (wavelength - kLambdaMin) / 5.0
-    row = int(u)
-    assert(row >= 0 and row + 1 < 95)
-    assert(CIE_2_DEG_COLOR_MATCHING_FUNCTIONS[4 * row] <= wavelength <= CIE_2_DEG_COLOR_MATCHING_FUNCTIONS[4 * (row + 1)])
 
-    u -= row
-    return CIE_2_DEG_COLOR_MATCHING_FUNCTIONS[4 * row + column] * (1.0 - u) + \
-        CIE_2_DEG_COLOR_MATCHING_FUNCTIONS[4 * (row + 1) + column] * u
+def CieColorMatchingFunctionTableValues(wavelengths):
+    # x_bar, y_bar, z_bar of the wavelengths, the shape is (n, 3)
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    u = (wavelengths - kLambdaMin) / 5.0
+    valid = np.logical_and(kLambdaMin < wavelengths, wavelengths < kLambdaMax)
+    row = np.clip(u.astype(np.int64), 0, len(CIE_TABLE) - 2)
+    u = (u - row)[..., None]
+    values = CIE_TABLE[row, 1:4] * (1.0 - u) + CIE_TABLE[row + 1, 1:4] * u
+    values[np.logical_not(valid)] = 0.0
+    return values
+
+
+def CieColorMatchingFunctionTableValue(wavelength, column):
+    return float(CieColorMatchingFunctionTableValues([wavelength])[0, column - 1])
 
 
 def Interpolate(wavelengths, wavelength_function, wavelength):
+    # wavelength can be the array, it is clamped to the first and the last value.
     assert(len(wavelength_function) == len(wavelengths))
-    if wavelength < wavelengths[0]:
-        return wavelength_function[0]
-
-    for i in range(len(wavelengths) - 1):
-        if wavelength < wavelengths[i + 1]:
-            u = (wavelength - wavelengths[i]) / (wavelengths[i + 1] - wavelengths[i])
-            return wavelength_function[i] * (1.0 - u) + wavelength_function[i + 1] * u
-    return wavelength_function[wavelength_function.size() - 1]
+    return np.interp(wavelength, wavelengths, wavelength_function)
 
 
 # The returned constants are in lumen.nm / watt.
 def ComputeSpectralRadianceToLuminanceFactors(wavelengths, solar_irradiance, lambda_power):
-    k_r = 0.0
-    k_g = 0.0
-    k_b = 0.0
-
-    solar_r = Interpolate(wavelengths, solar_irradiance, kLambdaR)
-    solar_g = Interpolate(wavelengths, solar_irradiance, kLambdaG)
-    solar_b = Interpolate(wavelengths, solar_irradiance, kLambdaB)
-    dlambda = 1
-
-    for L in range(kLambdaMin, kLambdaMax, dlambda):
-        x_bar = CieColorMatchingFunctionTableValue(L, 1)
-        y_bar = CieColorMatchingFunctionTableValue(L, 2)
-        z_bar = CieColorMatchingFunctionTableValue(L, 3)
-        r_bar = XYZ_TO_SRGB[0] * x_bar + XYZ_TO_SRGB[1] * y_bar + XYZ_TO_SRGB[2] * z_bar
-        g_bar = XYZ_TO_SRGB[3] * x_bar + XYZ_TO_SRGB[4] * y_bar + XYZ_TO_SRGB[5] * z_bar
-        b_bar = XYZ_TO_SRGB[6] * x_bar + XYZ_TO_SRGB[7] * y_bar + XYZ_TO_SRGB[8] * z_bar
+    def compute():
+        lambdas = np.array([kLambdaR, kLambdaG, kLambdaB])
+        solar_rgb = Interpolate(wavelengths, solar_irradiance, lambdas)
+        dlambda = 1
+
+        L = np.arange(kLambdaMin, kLambdaMax, dlambda, dtype=np.float64)
+        rgb_bar = np.dot(CieColorMatchingFunctionTableValues(L), XYZ_TO_SRGB_MATRIX.T)
         irradiance = Interpolate(wavelengths, solar_irradiance, L)
-        k_r += r_bar * irradiance / solar_r * pow(L / kLambdaR, lambda_power)
-        k_g += g_bar * irradiance / solar_g * pow(L / kLambdaG, lambda_power)
-        k_b += b_bar * irradiance / solar_b * pow(L / kLambdaB, lambda_power)
-    k_r *= MAX_LUMINOUS_EFFICACY * dlambda
-    k_g *= MAX_LUMINOUS_EFFICACY * dlambda
-    k_b *= MAX_LUMINOUS_EFFICACY * dlambda
-    return [k_r, k_g, k_b]
+        k = np.sum(rgb_bar * (irradiance[:, None] / solar_rgb) * np.power(L[:, None] / lambdas, lambda_power), axis=0)
+        return list(k * MAX_LUMINOUS_EFFICACY * dlambda)
+
+    key = ('SpectralRadianceToLuminanceFactors', tuple(wavelengths), tuple(solar_irradiance), lambda_power)
+    return list(get_cached_spectral_result(key, compute))
 
 
 def ConvertSpectrumToLinearSrgb(wavelengths, spectrum):
-    x = 0.0
-    y = 0.0
-    z = 0.0
-    dlambda = 1
-    for L in range(kLambdaMin, kLambdaMax, dlambda):
+    def compute():
+        dlambda = 1
+        L = np.arange(kLambdaMin, kLambdaMax, dlambda, dtype=np.float64)
         value = Interpolate(wavelengths, spectrum, L)
-        x += CieColorMatchingFunctionTableValue(L, 1) * value
-        y += CieColorMatchingFunctionTableValue(L, 2) * value
-        z += CieColorMatchingFunctionTableValue(L, 3) * value
+        xyz = np.dot(value, CieColorMatchingFunctionTableValues(L))
+        return tuple(MAX_LUMINOUS_EFFICACY * np.dot(XYZ_TO_SRGB_MATRIX, xyz) * dlambda)
+
+    key = ('SpectrumToLinearSrgb', tuple(wavelengths), tuple(spectrum))
+    return get_cached_spectral_result(key, compute)
+
 
-    r = MAX_LUMINOUS_EFFICACY * (XYZ_TO_SRGB[0] * x + XYZ_TO_SRGB[1] * y + XYZ_TO_SRGB[2] * z) * dlambda
-    g = MAX_LUMINOUS_EFFICACY * (XYZ_TO_SRGB[3] * x + XYZ_TO_SRGB[4] * y + XYZ_TO_SRGB[5] * z) * dlambda
-    b = MAX_LUMINOUS_EFFICACY * (XYZ_TO_SRGB[6] * x + XYZ_TO_SRGB[7] * y + XYZ_TO_SRGB[8] * z) * dlambda
-    return r, g, b
+def ComputeLuminanceFromRadianceMatrices(num_precomputed_wavelengths):
+    # the wavelength triples and the luminance_from_radiance matrices of Model.generate with precompute_illuminance
+    def compute():
+        num_iterations = int((num_precomputed_wavelengths + 2) / 3)
+        dlambda = (kLambdaMax - kLambdaMin) / (3 * ((num_precomputed_wavelengths + 2) / 3))
+        lambdas = kLambdaMin + (np.arange(num_iterations * 3, dtype=np.float64) + 0.5) * dlambda
+        # coeff[lambda, component]
+        coeffs = np.dot(CieColorMatchingFunctionTableValues(lambdas), XYZ_TO_SRGB_MATRIX.T) * dlambda
+        lambdas = lambdas.reshape(num_iterations, 3)
+        matrices = np.transpose(coeffs.reshape(num_iterations, 3, 3), (0, 2, 1)).astype(np.float32)
+        return lambdas, matrices
+
+    key = ('LuminanceFromRadianceMatrices', num_precomputed_wavelengths)
+    return get_cached_spectral_result(key, compute)
 
 
 class DensityProfileLayer:
@@ -137,6 +153,51 @@ class Model:
             'COMBINED_SCATTERING_TEXTURES': 1 if use_combined_textures else 0
         }
 
+        self.transmittance_texture = None
+        self.scattering_texture = None
+        self.irradiance_texture = None
+        self.optional_single_mie_scattering_texture = None
+
+        self.delta_irradiance_texture = None
+        self.delta_rayleigh_scattering_texture = None
+        self.delta_mie_scattering_texture = None
+        self.delta_scattering_density_texture = None
+        self.delta_multiple_scattering_texture = None
+
+        self.quad = ScreenQuad.get_vertex_array_buffer()
+
+    def get_cache_key(self, num_scattering_orders):
+        def layers_to_tuple(layers):
+            return tuple((layer.width, layer.exp_term, layer.exp_scale, layer.linear_term, layer.constant_term)
+                         for layer in layers)
+
+        parameters = (LUT_CACHE_VERSION,
+                      TRANSMITTANCE_TEXTURE_WIDTH, TRANSMITTANCE_TEXTURE_HEIGHT,
+                      SCATTERING_TEXTURE_WIDTH, SCATTERING_TEXTURE_HEIGHT, SCATTERING_TEXTURE_DEPTH,
+                      IRRADIANCE_TEXTURE_WIDTH, IRRADIANCE_TEXTURE_HEIGHT,
+                      tuple(self.wavelengths),
+                      tuple(self.solar_irradiance),
+                      self.sun_angular_radius,
+                      self.bottom_radius,
+                      self.top_radius,
+                      layers_to_tuple(self.rayleigh_density),
+                      tuple(self.rayleigh_scattering),
+                      layers_to_tuple(self.mie_density),
+                      tuple(self.mie_scattering),
+                      tuple(self.mie_extinction),
+                      self.mie_phase_function_g,
+                      layers_to_tuple(self.absorption_density),
+                      tuple(self.absorption_extinction),
+                      tuple(self.ground_albedo),
+                      self.max_sun_zenith_angle,
+                      self.length_unit_in_meters,
+                      self.num_precomputed_wavelengths,
+                      self.precompute_illuminance,
+                      self.use_combined_textures,
+                      num_scattering_orders)
+        return hashlib.sha1(repr(parameters).encode('utf-8')).hexdigest()
+
+    def update_atmosphere_predefine(self):
         # Atmosphere shader code
         resource_manager = CoreManager.instance().resource_manager
         shaderLoader = resource_manager.shader_loader
@@ -146,120 +207,106 @@ class Model:
         shaderLoader.save_resource(shader_name)
         shaderLoader.load_resource(shader_name)
 
-        self.transmittance_texture = CreateTexture(
-            name="precomputed_atmosphere.transmittance",
-            texture_type=Texture2D,
-            width=TRANSMITTANCE_TEXTURE_WIDTH,
-            height=TRANSMITTANCE_TEXTURE_HEIGHT,
+    @staticmethod
+    def create_texture(name, texture_type, width, height, depth=1, wrap=GL_CLAMP, data=None):
+        texture_datas = dict(
+            name=name,
+            texture_type=texture_type,
+            width=width,
+            height=height,
             internal_format=GL_RGBA32F,
             texture_format=GL_RGBA,
             min_filter=GL_LINEAR,
             mag_filter=GL_LINEAR,
             data_type=GL_FLOAT,
-            wrap=GL_CLAMP_TO_EDGE
+            wrap=wrap,
+            data=data
         )
+        if Texture3D == texture_type:
+            texture_datas['depth'] = depth
+        return CreateTexture(**texture_datas)
 
-        self.scattering_texture = CreateTexture(
-            name="precomputed_atmosphere.scattering",
-            texture_type=Texture3D,
-            width=SCATTERING_TEXTURE_WIDTH,
-            height=SCATTERING_TEXTURE_HEIGHT,
-            depth=SCATTERING_TEXTURE_DEPTH,
-            internal_format=GL_RGBA32F,
-            texture_format=GL_RGBA,
-            min_filter=GL_LINEAR,
-            mag_filter=GL_LINEAR,
-            data_type=GL_FLOAT,
-            wrap=GL_CLAMP_TO_EDGE
-        )
+    def create_lut_textures(self, lut_datas=None):
+        def get_data(lut_name):
+            return lut_datas[lut_name] if lut_datas is not None else None
 
-        self.irradiance_texture = CreateTexture(
-            name="precomputed_atmosphere.irradiance",
-            texture_type=Texture2D,
-            width=IRRADIANCE_TEXTURE_WIDTH,
-            height=IRRADIANCE_TEXTURE_HEIGHT,
-            internal_format=GL_RGBA32F,
-            texture_format=GL_RGBA,
-            min_filter=GL_LINEAR,
-            mag_filter=GL_LINEAR,
-            data_type=GL_FLOAT,
-            wrap=GL_CLAMP
-        )
+        self.transmittance_texture = self.create_texture(
+            "precomputed_atmosphere.transmittance", Texture2D, TRANSMITTANCE_TEXTURE_WIDTH,
+            TRANSMITTANCE_TEXTURE_HEIGHT, wrap=GL_CLAMP_TO_EDGE, data=get_data('transmittance'))
+
+        self.scattering_texture = self.create_texture(
+            "precomputed_atmosphere.scattering", Texture3D, SCATTERING_TEXTURE_WIDTH, SCATTERING_TEXTURE_HEIGHT,
+            SCATTERING_TEXTURE_DEPTH, wrap=GL_CLAMP_TO_EDGE, data=get_data('scattering'))
+
+        self.irradiance_texture = self.create_texture(
+            "precomputed_atmosphere.irradiance", Texture2D, IRRADIANCE_TEXTURE_WIDTH, IRRADIANCE_TEXTURE_HEIGHT,
+            data=get_data('irradiance'))
 
         self.optional_single_mie_scattering_texture = None
         if not self.use_combined_textures:
-            self.optional_single_mie_scattering_texture = CreateTexture(
-                name="precomputed_atmosphere.optional_single_mie_scattering_texture",
-                texture_type=Texture3D,
-                width=SCATTERING_TEXTURE_WIDTH,
-                height=SCATTERING_TEXTURE_HEIGHT,
-                depth=SCATTERING_TEXTURE_DEPTH,
-                internal_format=GL_RGBA32F,
-                texture_format=GL_RGBA,
-                min_filter=GL_LINEAR,
-                mag_filter=GL_LINEAR,
-                data_type=GL_FLOAT,
-                wrap=GL_CLAMP
-            )
+            self.optional_single_mie_scattering_texture = self.create_texture(
+                "precomputed_atmosphere.optional_single_mie_scattering_texture", Texture3D, SCATTERING_TEXTURE_WIDTH,
+                SCATTERING_TEXTURE_HEIGHT, SCATTERING_TEXTURE_DEPTH, data=get_data('optional_single_mie_scattering'))
 
-        self.delta_irradiance_texture = CreateTexture(
-            name="precomputed_atmosphere.delta_irradiance_texture",
-            texture_type=Texture2D,
-            width=IRRADIANCE_TEXTURE_WIDTH,
-            height=IRRADIANCE_TEXTURE_HEIGHT,
-            internal_format=GL_RGBA32F,
-            texture_format=GL_RGBA,
-            min_filter=GL_LINEAR,
-            mag_filter=GL_LINEAR,
-            data_type=GL_FLOAT,
-            wrap=GL_CLAMP
-        )
+    def create_intermediate_textures(self):
+        self.delta_irradiance_texture = self.create_texture(
+            "precomputed_atmosphere.delta_irradiance_texture", Texture2D, IRRADIANCE_TEXTURE_WIDTH,
+            IRRADIANCE_TEXTURE_HEIGHT)
 
-        self.delta_rayleigh_scattering_texture = CreateTexture(
-            name="precomputed_atmosphere.delta_rayleigh_scattering_texture",
-            texture_type=Texture3D,
-            width=SCATTERING_TEXTURE_WIDTH,
-            height=SCATTERING_TEXTURE_HEIGHT,
-            depth=SCATTERING_TEXTURE_DEPTH,
-            internal_format=GL_RGBA32F,
-            texture_format=GL_RGBA,
-            min_filter=GL_LINEAR,
-            mag_filter=GL_LINEAR,
-            data_type=GL_FLOAT,
-            wrap=GL_CLAMP
-        )
+        self.delta_rayleigh_scattering_texture = self.create_texture(
+            "precomputed_atmosphere.delta_rayleigh_scattering_texture", Texture3D, SCATTERING_TEXTURE_WIDTH,
+            SCATTERING_TEXTURE_HEIGHT, SCATTERING_TEXTURE_DEPTH)
 
-        self.delta_mie_scattering_texture = CreateTexture(
-            name="precomputed_atmosphere.delta_mie_scattering_texture",
-            texture_type=Texture3D,
-            width=SCATTERING_TEXTURE_WIDTH,
-            height=SCATTERING_TEXTURE_HEIGHT,
-            depth=SCATTERING_TEXTURE_DEPTH,
-            internal_format=GL_RGBA32F,
-            texture_format=GL_RGBA,
-            min_filter=GL_LINEAR,
-            mag_filter=GL_LINEAR,
-            data_type=GL_FLOAT,
-            wrap=GL_CLAMP
-        )
+        self.delta_mie_scattering_texture = self.create_texture(
+            "precomputed_atmosphere.delta_mie_scattering_texture", Texture3D, SCATTERING_TEXTURE_WIDTH,
+            SCATTERING_TEXTURE_HEIGHT, SCATTERING_TEXTURE_DEPTH)
 
-        self.delta_scattering_density_texture = CreateTexture(
-            name="precomputed_atmosphere.delta_scattering_density_texture",
-            texture_type=Texture3D,
-            width=SCATTERING_TEXTURE_WIDTH,
-            height=SCATTERING_TEXTURE_HEIGHT,
-            depth=SCATTERING_TEXTURE_DEPTH,
-            internal_format=GL_RGBA32F,
-            texture_format=GL_RGBA,
-            min_filter=GL_LINEAR,
-            mag_filter=GL_LINEAR,
-            data_type=GL_FLOAT,
-            wrap=GL_CLAMP
-        )
+        self.delta_scattering_density_texture = self.create_texture(
+            "precomputed_atmosphere.delta_scattering_density_texture", Texture3D, SCATTERING_TEXTURE_WIDTH,
+            SCATTERING_TEXTURE_HEIGHT, SCATTERING_TEXTURE_DEPTH)
 
         self.delta_multiple_scattering_texture = self.delta_rayleigh_scattering_texture
 
-        self.quad = ScreenQuad.get_vertex_array_buffer()
+    def get_lut_datas_async(self, callback):
+        # the callback receives the lut datas when the readbacks of all the lut textures are finished.
+        lut_textures = dict(transmittance=self.transmittance_texture,
+                            scattering=self.scattering_texture,
+                            irradiance=self.irradiance_texture)
+        if self.optional_single_mie_scattering_texture is not None:
+            lut_textures['optional_single_mie_scattering'] = self.optional_single_mie_scattering_texture
+
+        lut_datas = dict()
+
+        def gather_lut_data(lut_name):
+            def on_readback(future):
+                lut_datas[lut_name] = future.result()
+                if len(lut_datas) == len(lut_textures) and all(data is not None for data in lut_datas.values()):
+                    callback(lut_datas)
+            return on_readback
+
+        for lut_name, lut_texture in lut_textures.items():
+            lut_texture.get_image_data_async(callback=gather_lut_data(lut_name))
+
+    def delete_lut_textures(self):
+        for texture in (self.transmittance_texture, self.scattering_texture, self.irradiance_texture,
+                        self.optional_single_mie_scattering_texture):
+            if texture is not None:
+                texture.delete()
+        self.transmittance_texture = None
+        self.scattering_texture = None
+        self.irradiance_texture = None
+        self.optional_single_mie_scattering_texture = None
+
+    def delete_intermediate_textures(self):
+        for texture in (self.delta_irradiance_texture, self.delta_rayleigh_scattering_texture,
+                        self.delta_mie_scattering_texture, self.delta_scattering_density_texture):
+            if texture is not None:
+                texture.delete()
+        self.delta_irradiance_texture = None
+        self.delta_rayleigh_scattering_texture = None
+        self.delta_mie_scattering_texture = None
+        self.delta_scattering_density_texture = None
+        self.delta_multiple_scattering_texture = None
 
     def glsl_header_factory(self, lambdas):
         def to_string(v, lambdas, scale):
@@ -321,45 +368,37 @@ class Model:
         return "\n".join(header)
 
     def generate(self, num_scattering_orders=4):
-        resource_manager = CoreManager.instance().resource_manager
-        framebuffer_manager = CoreManager.instance().renderer.framebuffer_manager
+        for step in self.generate_progressive(num_scattering_orders):
+            pass
+
+    def generate_progressive(self, num_scattering_orders=4):
+        # Generator of the precompute steps, every step renders a part of the textures and can be run on each frame.
+        # The intermediate textures are deleted at the end, the lut textures are kept.
+        if self.transmittance_texture is None:
+            self.create_lut_textures()
+        if self.delta_irradiance_texture is None:
+            self.create_intermediate_textures()
 
         if not self.precompute_illuminance:
             lambdas = [kLambdaR, kLambdaG, kLambdaB]
             luminance_from_radiance = Matrix3()
-            self.Precompute(lambdas,
-                            luminance_from_radiance,
-                            False,
-                            num_scattering_orders)
+            yield from self.Precompute(lambdas,
+                                       luminance_from_radiance,
+                                       False,
+                                       num_scattering_orders)
         else:
-            num_iterations = (self.num_precomputed_wavelengths + 2) / 3
-            dlambda = (kLambdaMax - kLambdaMin) / (3 * num_iterations)
-
-            def coeff(L, component):
-                x = CieColorMatchingFunctionTableValue(L, 1)
-                y = CieColorMatchingFunctionTableValue(L, 2)
-                z = CieColorMatchingFunctionTableValue(L, 3)
-                return (XYZ_TO_SRGB[component * 3] * x +
-                        XYZ_TO_SRGB[component * 3 + 1] * y +
-                        XYZ_TO_SRGB[component * 3 + 2] * z) * dlambda
-
-            for i in range(int(num_iterations)):
-                lambdas = [kLambdaMin + (3 * i + 0.5) * dlambda,
-                           kLambdaMin + (3 * i + 1.5) * dlambda,
-                           kLambdaMin + (3 * i + 2.5) * dlambda]
-
-                luminance_from_radiance = Matrix3()
-
-                luminance_from_radiance[0] = [coeff(lambdas[0], 0), coeff(lambdas[1], 0), coeff(lambdas[2], 0)]
-                luminance_from_radiance[1] = [coeff(lambdas[0], 1), coeff(lambdas[1], 1), coeff(lambdas[2], 1)]
-                luminance_from_radiance[2] = [coeff(lambdas[0], 2), coeff(lambdas[1], 2), coeff(lambdas[2], 2)]
+            lambdas_list, luminance_from_radiance_list = ComputeLuminanceFromRadianceMatrices(
+                self.num_precomputed_wavelengths)
 
-                self.Precompute(lambdas,
-                                luminance_from_radiance,
-                                0 < i,
-                                num_scattering_orders)
+            for i in range(len(lambdas_list)):
+                yield from self.Precompute(list(lambdas_list[i]),
+                                           luminance_from_radiance_list[i],
+                                           0 < i,
+                                           num_scattering_orders)
 
         # Note : recompute compute_transmittance
+        resource_manager = CoreManager.instance().resource_manager
+        framebuffer_manager = CoreManager.instance().renderer.framebuffer_manager
         framebuffer_manager.bind_framebuffer(self.transmittance_texture)
 
         recompute_transmittance_mi = resource_manager.get_material_instance(
@@ -367,30 +406,19 @@ class Model:
             macros=self.material_instance_macros)
         recompute_transmittance_mi.use_program()
         self.quad.draw_elements()
+        framebuffer_manager.unbind_framebuffer()
 
-        # save textures
-        def save_texture(texture):
-            resource = resource_manager.texture_loader.get_resource(texture.name)
-            if resource is None:
-                resource = resource_manager.texture_loader.create_resource(texture.name, texture)
-            else:
-                old_texture = resource.get_data()
-                old_texture.delete()
-                resource.set_data(texture)
-            resource_manager.texture_loader.save_resource(resource.name)
-
-        # precomputed textures
-        save_texture(self.transmittance_texture)
-        save_texture(self.scattering_texture)
-        save_texture(self.irradiance_texture)
-
-        # intermediate processing textures
-        # save_texture(self.delta_irradiance_texture)
-        # save_texture(self.delta_rayleigh_scattering_texture)
-        # save_texture(self.delta_mie_scattering_texture)
-        # save_texture(self.delta_scattering_density_texture)
-        # if not self.use_combined_textures:
-        #     save_texture(self.optional_single_mie_scattering_texture)
+        self.delete_intermediate_textures()
+
+    def begin_precompute_step(self):
+        # the other passes may have changed the states between the steps
+        glEnable(GL_BLEND)
+        glBlendEquation(GL_FUNC_ADD)
+        glBlendFunc(GL_ONE, GL_ONE)
+
+    def end_precompute_step(self):
+        glDisable(GL_BLEND)
+        CoreManager.instance().renderer.framebuffer_manager.unbind_framebuffer()
 
     def Precompute(self,
                    lambdas,
@@ -408,9 +436,7 @@ class Model:
         shaderLoader.save_resource(shader_name)
         shaderLoader.load_resource(shader_name)
 
-        glEnable(GL_BLEND)
-        glBlendEquation(GL_FUNC_ADD)
-        glBlendFunc(GL_ONE, GL_ONE)
+        self.begin_precompute_step()
 
         # compute_transmittance
         framebuffer_manager.bind_framebuffer(self.transmittance_texture)
@@ -471,7 +497,12 @@ class Model:
             compute_single_scattering_mi.bind_uniform_data("layer", layer)
             self.quad.draw_elements()
 
+        self.end_precompute_step()
+        yield True
+
         for scattering_order in range(2, num_scattering_orders + 1):
+            self.begin_precompute_step()
+
             # compute_scattering_density
             glDisablei(GL_BLEND, 0)
 
@@ -492,6 +523,10 @@ class Model:
                 compute_scattering_density_mi.bind_uniform_data('layer', layer)
                 self.quad.draw_elements()
 
+            self.end_precompute_step()
+            yield True
+            self.begin_precompute_step()
+
             # compute_indirect_irradiance
             framebuffer_manager.bind_framebuffer(self.delta_irradiance_texture, self.irradiance_texture)
             glDisablei(GL_BLEND, 0)
@@ -527,3 +562,6 @@ class Model:
                 compute_multiple_scattering_mi.bind_uniform_data('layer', layer)
                 self.quad.draw_elements()
 
+            self.end_precompute_step()
+            yield True
+
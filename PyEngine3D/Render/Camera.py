@@ -192,3 +192,11 @@ class Camera(StaticActor):
             frustum_vectors[1][...] = np.cross(self.transform.up, frustum_vectors[1])
             frustum_vectors[2][...] = np.cross(-self.transform.left, frustum_vectors[2])
             frustum_vectors[3][...] = -np.cross(-self.transform.left, frustum_vectors[3])
+
+    def get_ray(self, screen_x_ratio, screen_y_ratio):
+        # returns the world origin and the normalized direction of the ray through the screen ratio, (0, 0) is the left bottom.
+        ndc = Float4(screen_x_ratio * 2.0 - 1.0, screen_y_ratio * 2.0 - 1.0, 1.0, 1.0)
+        view_position = np.dot(ndc, self.inv_projection)
+        view_direction = Float4(*(view_position[:3] / view_position[3]), 0.0)
+        direction = np.dot(view_direction, self.inv_view)[:3]
+        return self.transform.get_pos().copy(), normalize(direction)
@@ -260,30 +260,11 @@ class EffectManager(Singleton):
                     material_instance.bind_material_instance()
                     material_instance.bind_uniform_data('texture_diffuse', particle_info.texture_diffuse)
 
-                    draw_count = 0
-                    for particle in emitter.particles:
-                        if particle.is_renderable():
-                            if AlignMode.BILLBOARD == particle_info.align_mode:
-                                particle_info.world_matrix_data[draw_count][...] = np.dot(particle.transform.matrix, main_camera.inv_view_origin)
-                                particle_info.world_matrix_data[draw_count][3][...] = np.dot(particle.transform.matrix, particle.parent_matrix)[3]
-                            elif AlignMode.VELOCITY_ALIGN == particle_info.align_mode:
-                                world_velocity = np.dot(particle.velocity_position, particle.parent_matrix[0:3, 0:3])
-                                velocity_length = length(world_velocity)
-                                if 0.0 < velocity_length:
-                                    direction = normalize(particle.parent_matrix[3][0:3] - cameara_position)
-                                    world_velocity /= velocity_length
-                                    world_matrix = particle_info.world_matrix_data[draw_count]
-                                    world_matrix[0][0:3] = np.cross(world_velocity, direction)
-                                    world_matrix[1][0:3] = world_velocity * (1.0 + velocity_length * particle_info.velocity_stretch * 0.1)
-                                    world_matrix[2][0:3] = np.cross(world_matrix[0][0:3], world_velocity)
-                                    world_matrix[3][...] = np.dot(particle.transform.matrix, particle.parent_matrix)[3]
-                            else:
-                                particle_info.world_matrix_data[draw_count][...] = np.dot(particle.transform.matrix, particle.parent_matrix)
-                            particle_info.uvs_data[draw_count][0:2] = particle.sequence_uv
-                            particle_info.uvs_data[draw_count][2:4] = particle.next_sequence_uv
-                            particle_info.sequence_opacity_data[draw_count][0] = particle.sequence_ratio
-                            particle_info.sequence_opacity_data[draw_count][1] = particle.final_opacity
-                            draw_count += 1
+                    draw_count = emitter.cpu_particles.build_instance_data(main_camera.inv_view_origin,
+                                                                           cameara_position,
+                                                                           particle_info.world_matrix_data,
+                                                                           particle_info.uvs_data,
+                                                                           particle_info.sequence_opacity_data)
 
                     if 0 < draw_count:
                         geometry.draw_elements_instanced(draw_count,
@@ -440,6 +421,8 @@ class Emitter:
         self.last_spawned_time = 0.0
         self.alive_particle_count = 0
         self.particles = []
+        self.cpu_particles = None
+        self.random_generator = None
 
         # gpu data
         self.need_to_initialize_gpu_buffer = True
@@ -524,6 +507,10 @@ class Emitter:
         self.alive_particle_count = 0
         self.gpu_particle_spawn_count = 0
 
+        # the same seed replays the same particles
+        random_seed = self.particle_info.random_seed
+        self.random_generator = np.random.default_rng(random_seed if 0 <= random_seed else None)
+
         if self.has_vector_field_rotation:
             self.reset_vector_field_transform()
 
@@ -539,11 +526,17 @@ class Emitter:
             # self.gpu_particle_spawn_count = self.particle_info.spawn_count
         else:
             # CPU Particle
-            self.particles = [Particle(self.parent_effect, self, self.particle_info) for i in range(self.particle_info.max_particle_count)]
+            self.cpu_particles = CPUParticles(self.particle_info, self.particle_info.max_particle_count)
             # spawn at first time
             # self.spawn_particle(self.particle_info.spawn_count)
 
     def spawn_particle(self, spawn_count):
+        if self.cpu_particles is not None:
+            effect_transform = self.parent_effect.transform
+            self.cpu_particles.spawn(spawn_count, effect_transform.matrix, effect_transform.inverse_matrix, self.random_generator)
+            self.alive_particle_count = self.cpu_particles.count
+            return
+
         spawn_count = min(spawn_count, self.particle_info.max_particle_count - self.alive_particle_count)
         if 0 < spawn_count:
             begin_index = self.alive_particle_count
@@ -558,6 +551,7 @@ class Emitter:
             particle.destroy()
 
         self.particles = []
+        self.cpu_particles = None
 
     def update(self, dt):
         if not self.alive or not self.particle_info.enable:
@@ -566,22 +560,25 @@ class Emitter:
         self.elapsed_time += dt
 
         # update particles
-        index = 0
-        alive_count = self.alive_particle_count
-        for n in range(alive_count):
-            particle = self.particles[index]
-            particle.update(dt)
-
-            if not particle.alive:
-                self.alive_particle_count -= 1
-                last_particle_index = self.alive_particle_count
-                if 0 < self.alive_particle_count:
-                    # swap the present and the last.
-                    if index != last_particle_index:
-                        self.particles[index] = self.particles[last_particle_index]
-                        self.particles[last_particle_index] = particle
-                        continue
-            index += 1
+        if self.cpu_particles is not None:
+            self.alive_particle_count = self.cpu_particles.update(dt)
+        else:
+            index = 0
+            alive_count = self.alive_particle_count
+            for n in range(alive_count):
+                particle = self.particles[index]
+                particle.update(dt)
+
+                if not particle.alive:
+                    self.alive_particle_count -= 1
+                    last_particle_index = self.alive_particle_count
+                    if 0 < self.alive_particle_count:
+                        # swap the present and the last.
+                        if index != last_particle_index:
+                            self.particles[index] = self.particles[last_particle_index]
+                            self.particles[last_particle_index] = particle
+                            continue
+                index += 1
 
         if self.has_vector_field_rotation:
             self.vector_field_transform.rotation(self.particle_info.vector_field_rotation * dt)
@@ -622,6 +619,288 @@ class Emitter:
         return self.gpu_particle_max_count if self.particle_info.enable_gpu_particle else self.alive_particle_count
 
 
+# Structure of arrays of the cpu particles of an emitter.
+# The alive particles are packed at the front of the arrays, so every step is done on the whole columns at once.
+class CPUParticles:
+    # delay, life time, spawn volume factors(4), rotation(3), scale(3), velocity position(3), rotation(3), scale(3)
+    SPAWN_RANDOM_COUNT = 21
+
+    def __init__(self, particle_info, capacity):
+        self.particle_info = particle_info
+        self.capacity = capacity
+        self.count = 0
+
+        # the times are double precision like the scalar times of the emitter.
+        self.delay = np.zeros(capacity, dtype=np.float64)
+        self.life_time = np.zeros(capacity, dtype=np.float64)
+        self.elapsed_time = np.zeros(capacity, dtype=np.float64)
+        self.opacity = np.zeros(capacity, dtype=np.float32)
+
+        self.pos = np.zeros((capacity, 3), dtype=np.float32)
+        self.rot = np.zeros((capacity, 3), dtype=np.float32)
+        self.scale = np.ones((capacity, 3), dtype=np.float32)
+        self.velocity_position = np.zeros((capacity, 3), dtype=np.float32)
+        self.velocity_rotation = np.zeros((capacity, 3), dtype=np.float32)
+        self.velocity_scale = np.zeros((capacity, 3), dtype=np.float32)
+        self.force = np.zeros((capacity, 3), dtype=np.float32)
+
+        # the local matrix and the parent matrix stored at the time of spawn
+        self.matrix = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.parent_matrix = np.zeros((capacity, 4, 4), dtype=np.float32)
+
+        # sequence
+        self.sequence_ratio = np.zeros(capacity, dtype=np.float32)
+        self.sequence_index = np.zeros(capacity, dtype=np.int32)
+        self.next_sequence_index = np.zeros(capacity, dtype=np.int32)
+        self.sequence_uv = np.zeros((capacity, 2), dtype=np.float32)
+        self.next_sequence_uv = np.zeros((capacity, 2), dtype=np.float32)
+
+        self.columns = [self.delay, self.life_time, self.elapsed_time, self.opacity, self.pos, self.rot, self.scale,
+                        self.velocity_position, self.velocity_rotation, self.velocity_scale, self.force,
+                        self.matrix, self.parent_matrix, self.sequence_ratio, self.sequence_index,
+                        self.next_sequence_index, self.sequence_uv, self.next_sequence_uv]
+
+    def sample_spawn_volume(self, random_factor):
+        particle_info = self.particle_info
+        spawn_volume_info = np.array(particle_info.spawn_volume_info, dtype=np.float32)
+        spawn_position = np.zeros((len(random_factor), 3), dtype=np.float32)
+
+        if SpawnVolume.BOX == particle_info.spawn_volume_type:
+            spawn_position[...] = spawn_volume_info * (random_factor[:, 0:3] - 0.5)
+        elif SpawnVolume.SPHERE == particle_info.spawn_volume_type:
+            vector = normalize_vectors(random_factor[:, 0:3] - 0.5)
+            radius = lerp(spawn_volume_info[1], spawn_volume_info[0], random_factor[:, 3] * random_factor[:, 3]) * 0.5
+            spawn_position[...] = vector * radius[:, np.newaxis]
+        elif SpawnVolume.CONE == particle_info.spawn_volume_type:
+            vector = normalize_vectors(random_factor[:, 0:2] - 0.5)
+            ratio = random_factor[:, 2] * random_factor[:, 2]
+            radius = lerp(spawn_volume_info[1], spawn_volume_info[0], ratio) * np.sqrt(random_factor[:, 3]) * 0.5
+            spawn_position[:, 0] = radius * vector[:, 0]
+            spawn_position[:, 1] = spawn_volume_info[2] * (ratio - 0.5)
+            spawn_position[:, 2] = radius * vector[:, 1]
+        elif SpawnVolume.CYLINDER == particle_info.spawn_volume_type:
+            vector = normalize_vectors(random_factor[:, 0:2] - 0.5)
+            radius = lerp(spawn_volume_info[1], spawn_volume_info[0], random_factor[:, 2] * random_factor[:, 2]) * 0.5
+            spawn_position[:, 0] = radius * vector[:, 0]
+            spawn_position[:, 1] = spawn_volume_info[2] * (random_factor[:, 2] - 0.5)
+            spawn_position[:, 2] = radius * vector[:, 1]
+
+        for i, is_abs_axis in enumerate(particle_info.spawn_volume_abs_axis):
+            if is_abs_axis:
+                spawn_position[:, i] = np.abs(spawn_position[:, i])
+
+        spawn_volume_matrix = particle_info.spawn_volume_transform.matrix
+        return np.dot(spawn_position, spawn_volume_matrix[0:3, 0:3]) + spawn_volume_matrix[3, 0:3]
+
+    def spawn(self, spawn_count, parent_matrix, parent_inverse_matrix, random_generator=None):
+        spawn_count = min(spawn_count, self.capacity - self.count)
+        if spawn_count <= 0:
+            return 0
+
+        particle_info = self.particle_info
+        begin_index = self.count
+        end_index = self.count + spawn_count
+        spawn_range = slice(begin_index, end_index)
+
+        # draw the random values of the whole spawn batch at once in the fixed order, so the replay is same.
+        random_generator = random_generator or np.random
+        random_values = random_generator.random((spawn_count, self.SPAWN_RANDOM_COUNT))
+
+        self.delay[spawn_range] = particle_info.delay.get_values(random_values[:, 0])
+        self.life_time[spawn_range] = particle_info.life_time.get_values(random_values[:, 1])
+        self.elapsed_time[spawn_range] = 0.0
+        self.opacity[spawn_range] = particle_info.opacity
+
+        random_factor = random_values[:, 2:6].astype(np.float32)
+        spawn_position = self.sample_spawn_volume(random_factor)
+        self.pos[spawn_range] = spawn_position
+        self.rot[spawn_range] = particle_info.transform_rotation.get_values(random_values[:, 6:9])
+        self.scale[spawn_range] = particle_info.transform_scale.get_values(random_values[:, 9:12])
+
+        # Store metrics at the time of spawn.
+        self.parent_matrix[spawn_range] = parent_matrix
+
+        # We will apply inverse_matrix here because we will apply parent_matrix later.
+        self.force[spawn_range] = np.dot([0.0, -particle_info.force_gravity, 0.0], parent_inverse_matrix[0:3, 0:3])
+
+        velocity_position = particle_info.velocity_position.get_values(random_values[:, 12:15])
+        if VelocityType.SPAWN_DIRECTION == particle_info.velocity_type:
+            velocity_position = np.abs(velocity_position) * normalize_vectors(spawn_position)
+        elif VelocityType.HURRICANE == particle_info.velocity_type:
+            velocity_position = np.abs(velocity_position) * np.cross(WORLD_UP, normalize_vectors(spawn_position))
+        self.velocity_position[spawn_range] = velocity_position
+        self.velocity_rotation[spawn_range] = particle_info.velocity_rotation.get_values(random_values[:, 15:18])
+        self.velocity_scale[spawn_range] = particle_info.velocity_scale.get_values(random_values[:, 18:21])
+
+        self.sequence_ratio[spawn_range] = 0.0
+        self.sequence_index[spawn_range] = 0
+        self.next_sequence_index[spawn_range] = 0
+        self.sequence_uv[spawn_range] = 0.0
+        self.next_sequence_uv[spawn_range] = 0.0
+
+        self.count = end_index
+        self.update_matrices(spawn_range)
+        return spawn_count
+
+    @staticmethod
+    def get_indices(mask):
+        # the slice is a view of the columns, fancy indexing copies.
+        return slice(0, len(mask)) if mask.all() else np.flatnonzero(mask)
+
+    def remove(self, alive_mask):
+        # pack the alive particles to the front
+        count = int(np.count_nonzero(alive_mask))
+        if count < self.count:
+            for column in self.columns:
+                column[:count] = column[:self.count][alive_mask]
+            self.count = count
+
+    def update_matrices(self, indices):
+        # same as TransformObject.update_transform
+        rotation_matrices = eulers_to_matrices(self.rot[indices])
+        rotation_matrices[:, 0:3] *= self.scale[indices][:, :, np.newaxis]
+        rotation_matrices[:, 3, 0:3] = self.pos[indices]
+        self.matrix[indices] = rotation_matrices
+
+    def update_sequence(self, indices, life_ratio):
+        particle_info = self.particle_info
+        cell_count = particle_info.cell_count
+        total_cell_count = cell_count[0] * cell_count[1]
+        if total_cell_count <= 1 or particle_info.play_speed <= 0:
+            return
+
+        ratio = life_ratio * particle_info.play_speed
+        ratio = (total_cell_count - 1) * (ratio - np.floor(ratio))
+        index = np.floor(ratio)
+        next_index = np.minimum(index + 1, total_cell_count - 1).astype(np.int32)
+        self.sequence_ratio[indices] = ratio - index
+
+        changed = next_index != self.next_sequence_index[indices]
+        indices = np.flatnonzero(changed) if type(indices) is slice else indices[changed]
+        next_index = next_index[changed]
+        self.sequence_index[indices] = self.next_sequence_index[indices]
+        self.sequence_uv[indices] = self.next_sequence_uv[indices]
+        self.next_sequence_index[indices] = next_index
+        self.next_sequence_uv[indices, 0] = (next_index % cell_count[0]) / cell_count[0]
+        self.next_sequence_uv[indices, 1] = (cell_count[1] - 1 - next_index // cell_count[0]) / cell_count[1]
+
+    def update(self, dt):
+        if self.count < 1:
+            return 0
+
+        particle_info = self.particle_info
+        count = self.count
+
+        # delay
+        delay = self.delay[:count]
+        elapsed_time = self.elapsed_time[:count]
+        delayed = 0.0 < delay
+        delay[delayed] -= dt
+        delay_end = delayed & (delay < 0.0)
+        elapsed_time[delay_end] -= delay[delay_end]
+        delay[delay_end] = 0.0
+        active = np.logical_not(delayed) | delay_end
+
+        # destroy
+        dead = active & (self.life_time[:count] < elapsed_time)
+        if dead.any():
+            alive_mask = np.logical_not(dead)
+            active = active[alive_mask]
+            self.remove(alive_mask)
+            count = self.count
+
+        if not active.any():
+            return count
+        indices = self.get_indices(active)
+
+        life_time = self.life_time[indices]
+        elapsed_time = self.elapsed_time[indices]
+        life_ratio = np.minimum(1.0, elapsed_time / np.where(0.0 < life_time, life_time, 1.0))
+        life_ratio[life_time <= 0.0] = 0.0
+        left_life_time = life_time - elapsed_time
+        self.elapsed_time[indices] = elapsed_time + dt
+
+        self.update_sequence(indices, life_ratio)
+
+        # update transform
+        velocity_position = self.velocity_position[indices]
+        if particle_info.force_gravity != 0.0:
+            velocity_position += self.force[indices] * dt
+
+        if 0.0 != particle_info.velocity_acceleration:
+            velocity_length = np.linalg.norm(velocity_position, axis=1)
+            moving = 0.0 < velocity_length
+            new_velocity_length = velocity_length + particle_info.velocity_acceleration * dt
+            velocity_limit = particle_info.velocity_limit.value
+            if 0.0 < velocity_limit[1]:
+                new_velocity_length = np.minimum(new_velocity_length, velocity_limit[1])
+            new_velocity_length = np.maximum(new_velocity_length, velocity_limit[0])
+            velocity_position[moving] *= (new_velocity_length[moving] / velocity_length[moving])[:, np.newaxis]
+
+        self.velocity_position[indices] = velocity_position
+        self.pos[indices] += velocity_position * dt
+
+        rot = self.rot[indices] + self.velocity_rotation[indices] * dt
+        self.rot[indices] = np.where((TWO_PI < rot) | (rot < 0.0), np.mod(rot, TWO_PI), rot)
+        self.scale[indices] += self.velocity_scale[indices] * dt
+
+        self.update_matrices(indices)
+
+        if 0.0 != particle_info.fade_in or 0.0 != particle_info.fade_out:
+            opacity = np.full(len(life_time), particle_info.opacity, dtype=np.float32)
+
+            if 0.0 < particle_info.fade_in:
+                fade_in = life_time < particle_info.fade_in
+                opacity[fade_in] *= life_time[fade_in] / particle_info.fade_in
+
+            if 0.0 < particle_info.fade_out:
+                fade_out = left_life_time < particle_info.fade_out
+                opacity[fade_out] *= left_life_time[fade_out] / particle_info.fade_out
+            self.opacity[indices] = opacity
+        return count
+
+    def build_instance_data(self, inv_view_origin, camera_position, world_matrix_data, uvs_data, sequence_opacity_data):
+        # writes the instance datas of the renderable particles, returns the draw count.
+        particle_info = self.particle_info
+        renderable = self.delay[:self.count] <= 0.0
+        draw_count = int(np.count_nonzero(renderable))
+        if draw_count < 1:
+            return 0
+        indices = self.get_indices(renderable)
+
+        matrix = self.matrix[indices]
+        parent_matrix = self.parent_matrix[indices]
+        world_matrix = np.matmul(matrix, parent_matrix)
+
+        if AlignMode.BILLBOARD == particle_info.align_mode:
+            world_matrix_data[:draw_count] = np.dot(matrix.reshape(-1, 4), inv_view_origin).reshape(-1, 4, 4)
+            world_matrix_data[:draw_count, 3] = world_matrix[:, 3]
+        elif AlignMode.VELOCITY_ALIGN == particle_info.align_mode:
+            world_velocity = np.matmul(self.velocity_position[indices][:, np.newaxis, :], parent_matrix[:, 0:3, 0:3])[:, 0]
+            velocity_length = np.linalg.norm(world_velocity, axis=1)
+            moving = self.get_indices(0.0 < velocity_length)
+            world_velocity = world_velocity[moving] / velocity_length[moving][:, np.newaxis]
+            direction = normalize_vectors(parent_matrix[moving, 3, 0:3] - camera_position)
+            stretch = 1.0 + velocity_length[moving] * particle_info.velocity_stretch * 0.1
+
+            # the particles which do not move are not aligned.
+            world_matrix[moving, 0, 0:3] = np.cross(world_velocity, direction)
+            world_matrix[moving, 1, 0:3] = world_velocity * stretch[:, np.newaxis]
+            world_matrix[moving, 2, 0:3] = np.cross(world_matrix[moving, 0, 0:3], world_velocity)
+            world_matrix[moving, 0:3, 3] = 0.0
+            world_matrix_data[:draw_count] = world_matrix
+        else:
+            world_matrix_data[:draw_count] = world_matrix
+
+        uvs_data[:draw_count, 0:2] = self.sequence_uv[indices]
+        uvs_data[:draw_count, 2:4] = self.next_sequence_uv[indices]
+        sequence_opacity_data[:draw_count, 0] = self.sequence_ratio[indices]
+        sequence_opacity_data[:draw_count, 1] = self.opacity[indices]
+        return draw_count
+
+
+# The gpu particle emitter keeps one Particle for the delay and the life time of the emitter,
+# the cpu particles are simulated by CPUParticles.
 class Particle:
     def __init__(self, parent_effect, parent_emitter, particle_info):
         self.parent_effect = parent_effect
@@ -629,107 +908,20 @@ class Particle:
         self.particle_info = particle_info
         self.alive = False
         self.elapsed_time = 0.0
-
-        # sequence
-        self.total_cell_count = 0
-        self.sequence_uv = [0.0, 0.0]
-        self.next_sequence_uv = [0.0, 0.0]
-        self.sequence_ratio = 0.0
-        self.sequence_index = 0
-        self.next_sequence_index = 0
-
         self.delay = 0.0
         self.life_time = 0.0
-        self.velocity_position = Float3()
-        self.velocity_rotation = Float3()
-        self.velocity_scale = Float3()
-
-        self.has_velocity_position = False
-        self.has_velocity_rotation = False
-        self.has_velocity_scale = False
-
-        self.final_opacity = 1.0
-        self.force = Float3()
-
-        self.transform = TransformObject()
-        self.parent_matrix = MATRIX4_IDENTITY.copy()
 
     def initialize(self):
-        self.total_cell_count = self.particle_info.cell_count[0] * self.particle_info.cell_count[1]
-
-        if self.particle_info.enable_gpu_particle:
-            # GPU Particle
-            self.delay = self.particle_info.delay.get_max()
-            self.life_time = self.particle_info.life_time.get_max()
-            if not self.parent_emitter.is_infinite_emitter():
-                self.life_time += self.particle_info.spawn_end_time
-        else:
-            # CPU Particle
-            self.delay = self.particle_info.delay.get_uniform()
-            self.life_time = self.particle_info.life_time.get_uniform()
-
-            random_factor = np.array([np.random.uniform() for i in range(4)], dtype=np.float32)
-            spawn_volume_info = self.particle_info.spawn_volume_info
-            if SpawnVolume.BOX == self.particle_info.spawn_volume_type:
-                spawn_position = spawn_volume_info * (random_factor[0:3] - 0.5)
-            elif SpawnVolume.SPHERE == self.particle_info.spawn_volume_type:
-                vector = normalize(random_factor[0:3] - 0.5)
-                spawn_position = vector * lerp(spawn_volume_info[1], spawn_volume_info[0], random_factor[3] * random_factor[3]) * 0.5
-            elif SpawnVolume.CONE == self.particle_info.spawn_volume_type:
-                vector = normalize(random_factor[0:2] - 0.5)
-                ratio = random_factor[2] * random_factor[2]
-                y = spawn_volume_info[2] * (ratio - 0.5)
-                l = lerp(spawn_volume_info[1], spawn_volume_info[0], ratio) * sqrt(random_factor[3]) * 0.5
-                x = l * vector[0]
-                z = l * vector[1]
-                spawn_position = Float3(x, y, z)
-            elif SpawnVolume.CYLINDER == self.particle_info.spawn_volume_type:
-                vector = normalize(random_factor[0:2] - 0.5)
-                y = spawn_volume_info[2] * (random_factor[2] - 0.5)
-                l = lerp(spawn_volume_info[1], spawn_volume_info[0], random_factor[2] * random_factor[2]) * 0.5
-                x = l * vector[0]
-                z = l * vector[1]
-                spawn_position = Float3(x, y, z)
-
-            for i, is_abs_axis in enumerate(self.particle_info.spawn_volume_abs_axis):
-                if is_abs_axis:
-                    spawn_position[i] = abs(spawn_position[i])
-
-            spawn_position[...] = np.dot([spawn_position[0], spawn_position[1], spawn_position[2], 1.0], self.particle_info.spawn_volume_transform.matrix)[:3]
-
-            self.transform.set_pos(spawn_position)
-            self.transform.set_rotation(self.particle_info.transform_rotation.get_uniform())
-            self.transform.set_scale(self.particle_info.transform_scale.get_uniform())
-
-            # Store metrics at the time of spawn.
-            self.parent_matrix[...] = self.parent_effect.transform.matrix
-
-            # We will apply inverse_matrix here because we will apply parent_matrix later.
-            self.force[...] = np.dot([0.0, -self.particle_info.force_gravity, 0.0], self.parent_effect.transform.inverse_matrix[0:3, 0:3])
-
-            self.velocity_position[...] = self.particle_info.velocity_position.get_uniform()
-            if VelocityType.SPAWN_DIRECTION == self.particle_info.velocity_type:
-                self.velocity_position[...] = abs(self.velocity_position) * normalize(spawn_position)
-            elif VelocityType.HURRICANE == self.particle_info.velocity_type:
-                self.velocity_position[...] = abs(self.velocity_position) * np.cross(WORLD_UP, normalize(spawn_position))
-
-            self.velocity_rotation[...] = self.particle_info.velocity_rotation.get_uniform()
-            self.velocity_scale[...] = self.particle_info.velocity_scale.get_uniform()
-
-            self.has_velocity_position = any([v != 0.0 for v in self.velocity_position]) or self.particle_info.force_gravity != 0.0
-            self.has_velocity_rotation = any([v != 0.0 for v in self.velocity_rotation])
-            self.has_velocity_scale = any([v != 0.0 for v in self.velocity_scale])
-
-            self.final_opacity = self.particle_info.opacity
+        self.delay = self.particle_info.delay.get_max()
+        self.life_time = self.particle_info.life_time.get_max()
+        if not self.parent_emitter.is_infinite_emitter():
+            self.life_time += self.particle_info.spawn_end_time
 
     def spawn(self):
         self.initialize()
 
         self.alive = True
         self.elapsed_time = 0.0
-        self.sequence_ratio = 0.0
-        self.sequence_index = 0
-        self.next_sequence_index = 0
 
     def destroy(self):
         self.alive = False
@@ -740,25 +932,6 @@ class Particle:
     def is_infinite_particle(self):
         return self.particle_info.life_time.get_max() <= 0.0
 
-    def update_sequence(self, life_ratio):
-        if 1 < self.total_cell_count and 0 < self.particle_info.play_speed:
-            ratio = life_ratio * self.particle_info.play_speed
-            ratio = (self.total_cell_count - 1) * (ratio - math.floor(ratio))
-            index = math.floor(ratio)
-            next_index = min(index + 1, self.total_cell_count - 1)
-            self.sequence_ratio = ratio - index
-
-            if next_index == self.next_sequence_index:
-                return
-
-            cell_count = self.particle_info.cell_count
-            self.sequence_index = self.next_sequence_index
-            self.sequence_uv[0] = self.next_sequence_uv[0]
-            self.sequence_uv[1] = self.next_sequence_uv[1]
-            self.next_sequence_index = next_index
-            self.next_sequence_uv[0] = (next_index % cell_count[0]) / cell_count[0]
-            self.next_sequence_uv[1] = (cell_count[1] - 1 - int(math.floor(next_index / cell_count[0]))) / cell_count[1]
-
     def update(self, dt):
         if not self.alive:
             return
@@ -775,53 +948,8 @@ class Particle:
             self.destroy()
             return
 
-        life_ratio = 0.0
-        if 0.0 < self.life_time:
-            life_ratio = min(1.0, self.elapsed_time / self.life_time)
-
-        left_life_time = self.life_time - self.elapsed_time
-
         self.elapsed_time += dt
 
-        if self.particle_info.enable_gpu_particle:
-            # gpu particle, just return.
-            return
-
-        self.update_sequence(life_ratio)
-
-        # update transform
-        if self.particle_info.force_gravity != 0.0:
-            self.velocity_position += self.force * dt
-
-        if self.has_velocity_position:
-            if any(self.velocity_position != 0.0) and 0.0 != self.particle_info.velocity_acceleration:
-                velocity_length = length(self.velocity_position)
-                self.velocity_position /= velocity_length
-                velocity_length += self.particle_info.velocity_acceleration * dt
-                if 0.0 < self.particle_info.velocity_limit.value[1]:
-                    velocity_length = min(velocity_length, self.particle_info.velocity_limit.value[1])
-                velocity_length = max(velocity_length, self.particle_info.velocity_limit.value[0])
-                self.velocity_position *= velocity_length
-
-            self.transform.move(self.velocity_position * dt)
-
-        if self.has_velocity_rotation:
-            self.transform.rotation(self.velocity_rotation * dt)
-
-        if self.has_velocity_scale:
-            self.transform.scaling(self.velocity_scale * dt)
-
-        self.transform.update_transform()
-
-        if 0.0 != self.particle_info.fade_in or 0.0 != self.particle_info.fade_out:
-            self.final_opacity = self.particle_info.opacity
-
-            if 0.0 < self.particle_info.fade_in and self.life_time < self.particle_info.fade_in:
-                self.final_opacity *= self.life_time / self.particle_info.fade_in
-
-            if 0.0 < self.particle_info.fade_out and left_life_time < self.particle_info.fade_out:
-                self.final_opacity *= left_life_time / self.particle_info.fade_out
-
 
 class EffectInfo:
     def __init__(self, name, **effect_info):
@@ -892,6 +1020,8 @@ class ParticleInfo:
         self.spawn_count = particle_info.get('spawn_count', 1)
         self.spawn_term = particle_info.get('spawn_term', 0.1)
         self.spawn_end_time = particle_info.get('spawn_end_time', -1.0)
+        # -1 is a new random seed for every play
+        self.random_seed = particle_info.get('random_seed', -1)
 
         self.align_mode = AlignMode(particle_info.get('align_mode', AlignMode.BILLBOARD.value))
         self.color = particle_info.get('color', Float3(1.0, 1.0, 1.0))
@@ -983,6 +1113,7 @@ class ParticleInfo:
             spawn_count=self.spawn_count,
             spawn_term=self.spawn_term,
             spawn_end_time=self.spawn_end_time,
+            random_seed=self.random_seed,
             align_mode=self.align_mode.value,
             velocity_stretch=self.velocity_stretch,
             color=self.color,
@@ -7,6 +7,8 @@ from PyEngine3D.App import CoreManager
 from .Actor import StaticActor
 
 
+SHADOW_VOLUME_CORNERS = np.array([[x, y, z, 1.0] for x in (-1.0, 1.0) for y in (-1.0, 1.0) for z in (-1.0, 1.0)], dtype=np.float32)
+
 class MainLight(StaticActor):
     def __init__(self, name, **object_data):
         StaticActor.__init__(self, name, **object_data)
@@ -25,6 +27,8 @@ class MainLight(StaticActor):
         self.shadow_depth = object_data.get('shadow_depth', SHADOW_DISTANCE)
         self.shadow_orthogonal = Matrix4()
         self.shadow_view_projection = Matrix4()
+        self.shadow_bound_min = Float3()
+        self.shadow_bound_max = Float3()
         self.changed = False
 
         self.update_shadow_orthogonal()
@@ -83,12 +87,19 @@ class MainLight(StaticActor):
             set_translate_matrix(self.shadow_view_projection, *(-camera_pos))
             self.shadow_view_projection[...] = np.dot(np.dot(self.shadow_view_projection, self.transform.inverse_matrix), self.shadow_orthogonal)
 
+            # world space aabb of the shadow volume
+            shadow_volume = np.dot(SHADOW_VOLUME_CORNERS, np.linalg.inv(self.shadow_view_projection))[:, :3]
+            self.shadow_bound_min[...] = np.min(shadow_volume, axis=0)
+            self.shadow_bound_max[...] = np.max(shadow_volume, axis=0)
+
 
 class PointLight(StaticActor):
     def __init__(self, name, **object_data):
         StaticActor.__init__(self, name, **object_data)
         self.light_color = Float3(*object_data.get('light_color', (1.0, 1.0, 1.0)))
         self.light_radius = object_data.get('light_radius', 10.0)
+        # the light is inserted to the octree of the scene when it is registered, this flag is for the changes after.
+        self.bound_box_updated = False
 
     def get_attribute(self):
         super().get_attribute()
@@ -102,6 +113,8 @@ class PointLight(StaticActor):
             self.light_color[:] = attribute_value[:]
         elif hasattr(self, attribute_name):
             setattr(self, attribute_name, attribute_value)
+            if attribute_name == 'light_radius':
+                self.bound_box_updated = True
 
     def get_save_data(self):
         save_data = StaticActor.get_save_data(self)
@@ -109,5 +122,9 @@ class PointLight(StaticActor):
         save_data['light_radius'] = self.light_radius
         return save_data
 
+    def get_light_bound(self):
+        return self.transform.pos - self.light_radius, self.transform.pos + self.light_radius
+
     def update(self):
-        self.transform.update_transform()
+        if self.transform.update_transform():
+            self.bound_box_updated = True
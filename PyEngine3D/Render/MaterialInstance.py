@@ -13,6 +13,7 @@ from PyEngine3D.Common import logger
 from PyEngine3D.App import CoreManager
 from PyEngine3D.OpenGLContext import CreateUniformBuffer, CreateUniformDataFromString
 from PyEngine3D.Utilities import Attributes
+from .RenderInfo import RenderInfoCache
 
 
 class MaterialInstance:
@@ -40,6 +41,7 @@ class MaterialInstance:
             uniform_datas = data.get('uniform_datas', {})
             for data_name, data_value in uniform_datas.items():
                 self.set_uniform_data_from_string(data_name, data_value)
+            self.update_normal_map_macro()
         else:
             logger.error("%s material instance has no material." % self.name)
             return
@@ -76,6 +78,7 @@ class MaterialInstance:
 
             self.material = material
             self.material_name = material.name
+            RenderInfoCache.invalidate(self)
             self.macros = copy.copy(material.macros)
 
             # link_uniform_buffers
@@ -106,6 +109,7 @@ class MaterialInstance:
             # Remove the uniform data that is not in Material and Shader.
             for uniform_name in old_uniform_names:
                 self.linked_uniform_map.pop(uniform_name)
+            self.update_normal_map_macro()
 
     def bind_material_instance(self):
         for uniform_buffer, uniform_data in self.linked_material_component_map.values():
@@ -127,6 +131,19 @@ class MaterialInstance:
         uniform = self.linked_uniform_map.get(uniform_name)
         if uniform:
             uniform[1] = uniform_data
+            if 'texture_normal' == uniform_name:
+                self.update_normal_map_macro()
+
+    def update_normal_map_macro(self):
+        # the BC5 compressed normal map has only two channels, so the shader reconstructs the up of the normal.
+        if self.material is None or 'NORMAL_MAP_BC5' not in self.macros:
+            return
+        texture_normal = self.get_uniform_data('texture_normal')
+        normal_map_bc5 = 1 if GL_COMPRESSED_RG_RGTC2 == getattr(texture_normal, 'internal_format', None) else 0
+        if normal_map_bc5 != self.macros['NORMAL_MAP_BC5']:
+            self.macros['NORMAL_MAP_BC5'] = normal_map_bc5
+            material = CoreManager.instance().resource_manager.get_material(self.material.shader_name, self.macros)
+            self.set_material(material)
 
     def set_uniform_data_from_string(self, uniform_name, str_uniform_data):
         uniform = self.linked_uniform_map.get(uniform_name)
@@ -136,6 +153,8 @@ class MaterialInstance:
                 uniform_data = CreateUniformDataFromString(uniform_buffer.uniform_type, str_uniform_data)
                 if uniform_data is not None:
                     uniform[1] = uniform_data
+                    if 'texture_normal' == uniform_name and self.valid:
+                        self.update_normal_map_macro()
                     return True
         logger.warn("%s material instance has no %s uniform variable. It may have been optimized by the compiler..)" % (self.name, uniform_name))
 
@@ -69,6 +69,21 @@ class Geometry:
         self.vertex_buffer = geometry_data.get('vertex_buffer')
         self.skeleton = geometry_data.get('skeleton')
         self.bound_box = BoundBox(**geometry_data)
+        # cpu copy of the triangles for the ray picking, the bvh is built at the first query.
+        self.mode = geometry_data.get('mode', GL_TRIANGLES)
+        self.positions = geometry_data.get('positions')
+        self.indices = geometry_data.get('indices')
+        self.triangle_bvh = None
+
+    def get_triangle_bvh(self):
+        if self.triangle_bvh is None and self.positions is not None and self.indices is not None:
+            indices = np.asarray(self.indices, dtype=np.uint32)
+            if GL_QUADS == self.mode:
+                indices = np.reshape(indices[:len(indices) // 4 * 4], (-1, 4))[:, [0, 1, 2, 2, 3, 0]]
+            elif GL_TRIANGLES != self.mode:
+                indices = np.zeros(0, dtype=np.uint32)
+            self.triangle_bvh = TriangleBVH(self.positions, indices[:len(indices) // 3 * 3])
+        return self.triangle_bvh
 
     def draw_elements(self):
         self.vertex_buffer.draw_elements()
@@ -144,6 +159,9 @@ class Mesh:
                 index=i,
                 vertex_buffer=vertex_buffer,
                 skeleton=skeleton,
+                mode=geometry_data.get('mode', GL_TRIANGLES),
+                positions=geometry_data.get('positions'),
+                indices=geometry_data.get('indices'),
                 bound_min=bound_min,
                 bound_max=bound_max,
                 radius=radius
@@ -309,17 +327,22 @@ class Cube(Mesh):
 # CLASS : Plane
 # ------------------------------#
 class Plane(Mesh):
-    def __init__(self, mesh_name, width=4, height=4, xz_plane=True, mode=GL_TRIANGLES):
+    def __init__(self, mesh_name, width=4, height=4, xz_plane=True, mode=GL_TRIANGLES, skirt_depth=0.0):
         self.width = width
         self.height = height
         self.xz_plane = xz_plane
         self.mode = mode
+        # the ring of the quads hanging down from the border by skirt_depth, it hides the cracks between the lods.
+        self.skirt_depth = skirt_depth
         geometry_datas = self.get_geometry_datas()
         Mesh.__init__(self, mesh_name, geometry_datas=geometry_datas)
 
     def get_geometry_datas(self):
-        width_points = self.width + 1
-        height_points = self.height + 1
+        skirt = 1 if 0.0 < self.skirt_depth else 0
+        quad_width = self.width + skirt * 2
+        quad_height = self.height + skirt * 2
+        width_points = quad_width + 1
+        height_points = quad_height + 1
         width_step = 1.0 / self.width
         height_step = 1.0 / self.height
         array_count = width_points * height_points
@@ -329,19 +352,21 @@ class Plane(Mesh):
         tangents = np.array([[1, 0, 0], ] * array_count, dtype=np.float32)
         texcoords = np.array([[0, 0], ] * array_count, dtype=np.float32)
         array_index = 0
-        for y in range(height_points):
-            y *= height_step
-            for x in range(width_points):
-                x *= width_step
-                positions[array_index][:] = [x * 2.0 - 1.0, 0.0, 1.0 - y * 2.0] if self.xz_plane else [x * 2.0 - 1.0, 1.0 - y * 2.0, 0.0]
+        for y in range(-skirt, self.height + 1 + skirt):
+            is_skirt_y = y < 0 or self.height < y
+            y = min(max(0, y), self.height) * height_step
+            for x in range(-skirt, self.width + 1 + skirt):
+                depth = -self.skirt_depth if is_skirt_y or x < 0 or self.width < x else 0.0
+                x = min(max(0, x), self.width) * width_step
+                positions[array_index][:] = [x * 2.0 - 1.0, depth, 1.0 - y * 2.0] if self.xz_plane else [x * 2.0 - 1.0, 1.0 - y * 2.0, depth]
                 texcoords[array_index][:] = [x, 1.0 - y]
                 array_index += 1
 
         array_index = 0
         vertex_count = 4 if self.mode == GL_QUADS else 6
-        indices = np.zeros(self.width * self.height * vertex_count, dtype=np.uint32)
-        for y in range(self.height):
-            for x in range(self.width):
+        indices = np.zeros(quad_width * quad_height * vertex_count, dtype=np.uint32)
+        for y in range(quad_height):
+            for x in range(quad_width):
                 i = y * width_points + x
                 if GL_QUADS == self.mode:
                     indices[array_index: array_index + vertex_count] = [i, i + 1, i + 1 + width_points, i + width_points]
@@ -6,6 +6,7 @@ import numpy as np
 from PyEngine3D.Common import logger
 from PyEngine3D.Utilities import GetClassName, Attributes
 from PyEngine3D.App import CoreManager
+from .RenderInfo import RenderInfoCache
 
 
 class Model:
@@ -29,6 +30,7 @@ class Model:
             for i in range(min(len(self.material_instances), len(material_instances))):
                 material_instances[i] = self.material_instances[i]
             self.material_instances = material_instances
+            RenderInfoCache.invalidate(self)
 
     def get_save_data(self):
         save_data = dict(
@@ -54,6 +56,7 @@ class Model:
     def set_material_instance(self, material_instance, attribute_index):
         if attribute_index < len(self.material_instances):
             self.material_instances[attribute_index] = material_instance
+            RenderInfoCache.invalidate(self)
 
     def get_attribute(self):
         self.attributes.set_attribute('name', self.name)
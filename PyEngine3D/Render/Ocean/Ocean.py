@@ -9,6 +9,7 @@ from PyEngine3D.OpenGLContext import CreateTexture, Texture2D, Texture2DArray, T
 from PyEngine3D.Render import RenderTarget, ScreenQuad, Plane
 from PyEngine3D.Utilities import *
 from .Constants import *
+from .OceanSimulator import OceanSimulator
 
 
 def sqr(x):
@@ -16,31 +17,47 @@ def sqr(x):
 
 
 def omega(k):
-    return math.sqrt(9.81 * k * (1.0 + sqr(k / km)))
+    return np.sqrt(9.81 * k * (1.0 + sqr(k / km)))
 
 
 def frandom(seed_data):
     return (seed_data >> (31 - 24)) / float(1 << 24)
 
 
+def lcg_sequence(seed, count):
+    # the states of seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF after 1 ~ count steps.
+    # The sequence is doubled by the jump ahead, s[n + m] = A(m) * s[n] + C(m), so there is no python loop per step.
+    states = np.array([seed], dtype=np.uint64)
+    mask = np.uint64(0x7FFFFFFF)
+    multiplier = np.uint64(1103515245)
+    increment = np.uint64(12345)
+    while len(states) <= count:
+        states = np.concatenate([states, (states * multiplier + increment) & mask])
+        increment = (multiplier * increment + increment) & mask
+        multiplier = (multiplier * multiplier) & mask
+    return states[1:count + 1].astype(np.int64)
+
+
 def bitReverse(i, N):
-    i = int(i)
-    N = int(N)
-    j = i
-    M = N
+    # works on the int arrays too
     Sum = 0
     W = 1
-    M = int(M / 2)
+    M = int(N) // 2
     while M != 0:
-        j = (i & M) > (M - 1)
-        Sum += j * W
+        Sum = Sum + ((i & M) != 0) * W
         W *= 2
-        M = int(M / 2)
-    return int(Sum)
+        M //= 2
+    return Sum
 
 
 def computeWeight(N, k):
-    return cos(2.0 * pi * k / float(N)), sin(2.0 * pi * k / float(N))
+    return np.cos(2.0 * pi * k / float(N)), np.sin(2.0 * pi * k / float(N))
+
+
+def getWaveNumbers():
+    # signed wave number index of the texels, -FFT_SIZE / 2 ~ FFT_SIZE / 2 - 1
+    x = np.arange(FFT_SIZE)
+    return np.where(x >= FFT_SIZE / 2, x - FFT_SIZE, x)
 
 
 class Ocean:
@@ -56,6 +73,7 @@ class Ocean:
         self.simulation_wind = object_data.get('simulation_wind', 1.0)
         self.simulation_amplitude = object_data.get('simulation_amplitude', 3.0)
         self.simulation_scale = object_data.get('simulation_scale', 1.0)
+        self.cpu_simulation_resolution = object_data.get('cpu_simulation_resolution', FFT_SIZE)
 
         self.is_render_ocean = object_data.get('is_render_ocean', True)
         self.attributes = Attributes()
@@ -79,6 +97,11 @@ class Ocean:
         self.texture_slope_variance = None
         self.texture_butterfly = None
 
+        # cpu simulation for the height queries
+        self.spectrum12_data = None
+        self.spectrum34_data = None
+        self.cpu_simulator = None
+
         self.quad = None
         self.fft_grid = None
 
@@ -130,6 +153,7 @@ class Ocean:
         self.attributes.set_attribute('simulation_wind', self.simulation_wind)
         self.attributes.set_attribute('simulation_amplitude', self.simulation_amplitude)
         self.attributes.set_attribute('simulation_scale', self.simulation_scale)
+        self.attributes.set_attribute('cpu_simulation_resolution', self.cpu_simulation_resolution)
         return self.attributes
 
     def set_attribute(self, attribute_name, attribute_value, item_info_history, attribute_index):
@@ -140,6 +164,8 @@ class Ocean:
                 self.generate_texture()
             elif attribute_name == 'simulation_scale':
                 self.simulation_size = GRID_SIZES * self.simulation_scale
+            elif attribute_name == 'cpu_simulation_resolution':
+                self.cpu_simulator = None
         return self.attributes
 
     def get_save_data(self):
@@ -150,6 +176,7 @@ class Ocean:
             wind=self.wind,
             omega=self.omega,
             amplitude=self.amplitude,
+            cpu_simulation_resolution=self.cpu_simulation_resolution,
         )
         return save_data
 
@@ -161,27 +188,28 @@ class Ocean:
         return kSquare * hSquare * 2.0
 
     def spectrum(self, kx, ky, omnispectrum=False):
+        # kx, ky are the arrays of the wave numbers, k must not be zero.
         U10 = max(0.001, self.wind)
         Omega = self.omega
         Amp = self.amplitude
 
-        k = sqrt(kx * kx + ky * ky)
+        k = np.sqrt(kx * kx + ky * ky)
         c = omega(k) / k
 
         # spectral peak
         kp = 9.81 * sqr(Omega / U10)
-        cp = omega(kp) / kp
+        cp = float(omega(kp)) / kp
 
         # friction velocity
         z0 = 3.7e-5 * sqr(U10) / 9.81 * pow(U10 / cp, 0.9)
         u_star = 0.41 * U10 / log(10.0 / z0)
 
-        Lpm = exp(- 5.0 / 4.0 * sqr(kp / k))
+        Lpm = np.exp(- 5.0 / 4.0 * sqr(kp / k))
         gamma = 1.7 if Omega < 1.0 else 1.7 + 6.0 * log(Omega)
         sigma = 0.08 * (1.0 + 4.0 / pow(Omega, 3.0))
-        Gamma = exp(-1.0 / (2.0 * sqr(sigma)) * sqr(sqrt(k / kp) - 1.0))
-        Jp = pow(gamma, Gamma)
-        Fp = Lpm * Jp * exp(- Omega / sqrt(10.0) * (sqrt(k / kp) - 1.0))
+        Gamma = np.exp(-1.0 / (2.0 * sqr(sigma)) * sqr(np.sqrt(k / kp) - 1.0))
+        Jp = np.power(gamma, Gamma)
+        Fp = Lpm * Jp * np.exp(- Omega / sqrt(10.0) * (np.sqrt(k / kp) - 1.0))
         alphap = 0.006 * sqrt(Omega)
         Bl = 0.5 * alphap * cp / c * Fp
 
@@ -190,7 +218,7 @@ class Ocean:
             alpham *= (1.0 + log(u_star / cm))
         else:
             alpham *= (1.0 + 3.0 * log(u_star / cm))
-        Fm = exp(-0.25 * sqr(k / km - 1.0))
+        Fm = np.exp(-0.25 * sqr(k / km - 1.0))
         Bh = 0.5 * alpham * cm / c * Fm * Lpm
 
         if omnispectrum:
@@ -199,94 +227,93 @@ class Ocean:
         a0 = log(2.0) / 4.0
         ap = 4.0
         am = 0.13 * u_star / cm
-        Delta = tanh(a0 + ap * pow(c / cp, 2.5) + am * pow(cm / c, 2.5))
-        phi = atan2(ky, kx)
-
-        if kx < 0.0:
-            return 0.0
-        else:
-            Bl *= 2.0
-            Bh *= 2.0
-        return Amp * (Bl + Bh) * (1.0 + Delta * cos(2.0 * phi)) / (2.0 * pi * sqr(sqr(k)))
-
-    def getSpectrumSample(self, i, j, lengthScale, kMin):
-        dk = 2.0 * pi / lengthScale
-        kx = i * dk
-        ky = j * dk
-        if abs(kx) < kMin and abs(ky) < kMin:
-            return 0.0, 0.0
-        else:
-            S = self.spectrum(kx, ky)
-            h = sqrt(S / 2.0) * dk
-            self.fft_seed = (self.fft_seed * 1103515245 + 12345) & 0x7FFFFFFF
-            phi = frandom(self.fft_seed) * 2.0 * pi
-            return h * cos(phi), h * sin(phi)
+        Delta = np.tanh(a0 + ap * np.power(c / cp, 2.5) + am * np.power(cm / c, 2.5))
+        phi = np.arctan2(ky, kx)
+
+        Bl = Bl * 2.0
+        Bh = Bh * 2.0
+        S = Amp * (Bl + Bh) * (1.0 + Delta * np.cos(2.0 * phi)) / (2.0 * pi * sqr(sqr(k)))
+        return np.where(kx < 0.0, 0.0, S)
+
+    def getSpectrumSamples(self):
+        # spectrum samples of the 4 grids of all texels, the shape is (FFT_SIZE, FFT_SIZE, 4 grids, real and imaginary).
+        # The phases take the random sequence in the order of y, x and grid, same as sampling the texels one by one.
+        length_scales = np.array([GRID1_SIZE, GRID2_SIZE, GRID3_SIZE, GRID4_SIZE], dtype=np.float64)
+        k_mins = np.array([pi / GRID1_SIZE, pi * FFT_SIZE / GRID1_SIZE, pi * FFT_SIZE / GRID2_SIZE, pi * FFT_SIZE / GRID3_SIZE])
+        dk = 2.0 * pi / length_scales
+        wave_numbers = getWaveNumbers()
+        kx = wave_numbers[None, :, None] * dk
+        ky = wave_numbers[:, None, None] * dk
+        kx, ky = np.broadcast_arrays(kx, ky)
+
+        # the center of the spectrum is zero and does not take a random number
+        sample_mask = np.logical_not(np.logical_and(np.abs(kx) < k_mins, np.abs(ky) < k_mins))
+        sample_count = int(np.count_nonzero(sample_mask))
+        seeds = lcg_sequence(self.fft_seed, sample_count)
+        if 0 < sample_count:
+            self.fft_seed = int(seeds[-1])
+
+        S = self.spectrum(kx[sample_mask], ky[sample_mask])
+        h = np.sqrt(S / 2.0) * np.broadcast_to(dk, kx.shape)[sample_mask]
+        phi = frandom(seeds) * 2.0 * pi
+
+        samples = np.zeros(kx.shape + (2, ), dtype=np.float64)
+        samples[sample_mask, 0] = h * np.cos(phi)
+        samples[sample_mask, 1] = h * np.sin(phi)
+        return samples
 
     def computeButterflyLookupTexture(self, butterfly_data):
+        butterfly_data = butterfly_data.reshape(PASSES, FFT_SIZE, 4)
+        index = np.arange(FFT_SIZE // 2)
         for i in range(PASSES):
-            nBlocks = int(pow(2.0, float(PASSES - 1 - i)))
-            nHInputs = int(pow(2.0, float(i)))
-            for j in range(nBlocks):
-                for k in range(nHInputs):
-                    i1, i2, j1, j2 = 0, 0, 0, 0
-                    if i == 0:
-                        i1 = j * nHInputs * 2 + k
-                        i2 = j * nHInputs * 2 + nHInputs + k
-                        j1 = bitReverse(i1, FFT_SIZE)
-                        j2 = bitReverse(i2, FFT_SIZE)
-                    else:
-                        i1 = j * nHInputs * 2 + k
-                        i2 = j * nHInputs * 2 + nHInputs + k
-                        j1 = i1
-                        j2 = i2
-
-                    wr, wi = computeWeight(FFT_SIZE, k * nBlocks)
-
-                    offset1 = 4 * (i1 + i * FFT_SIZE)
-                    butterfly_data[offset1 + 0] = (j1 + 0.5) / FFT_SIZE
-                    butterfly_data[offset1 + 1] = (j2 + 0.5) / FFT_SIZE
-                    butterfly_data[offset1 + 2] = wr
-                    butterfly_data[offset1 + 3] = wi
-
-                    offset2 = 4 * (i2 + i * FFT_SIZE)
-                    butterfly_data[offset2 + 0] = (j1 + 0.5) / FFT_SIZE
-                    butterfly_data[offset2 + 1] = (j2 + 0.5) / FFT_SIZE
-                    butterfly_data[offset2 + 2] = -wr
-                    butterfly_data[offset2 + 3] = -wi
+            nBlocks = 1 << (PASSES - 1 - i)
+            nHInputs = 1 << i
+            j = index // nHInputs
+            k = index % nHInputs
+            i1 = j * nHInputs * 2 + k
+            i2 = j * nHInputs * 2 + nHInputs + k
+            if i == 0:
+                j1 = bitReverse(i1, FFT_SIZE)
+                j2 = bitReverse(i2, FFT_SIZE)
+            else:
+                j1 = i1
+                j2 = i2
+
+            wr, wi = computeWeight(FFT_SIZE, k * nBlocks)
+
+            butterfly_data[i, i1, 0] = (j1 + 0.5) / FFT_SIZE
+            butterfly_data[i, i1, 1] = (j2 + 0.5) / FFT_SIZE
+            butterfly_data[i, i1, 2] = wr
+            butterfly_data[i, i1, 3] = wi
+
+            butterfly_data[i, i2, 0] = (j1 + 0.5) / FFT_SIZE
+            butterfly_data[i, i2, 1] = (j2 + 0.5) / FFT_SIZE
+            butterfly_data[i, i2, 2] = -wr
+            butterfly_data[i, i2, 3] = -wi
 
     def generateWavesSpectrum(self, spectrum12_data, spectrum34_data):
-        for y in range(FFT_SIZE):
-            for x in range(FFT_SIZE):
-                offset = 4 * (x + y * FFT_SIZE)
-                i = (x - FFT_SIZE) if (x >= FFT_SIZE / 2) else x
-                j = (y - FFT_SIZE) if (y >= FFT_SIZE / 2) else y
-                s12_0, s12_1 = self.getSpectrumSample(i, j, GRID1_SIZE, pi / GRID1_SIZE)
-                s12_2, s12_3 = self.getSpectrumSample(i, j, GRID2_SIZE, pi * FFT_SIZE / GRID1_SIZE)
-                s34_0, s34_1 = self.getSpectrumSample(i, j, GRID3_SIZE, pi * FFT_SIZE / GRID2_SIZE)
-                s34_2, s34_3 = self.getSpectrumSample(i, j, GRID4_SIZE, pi * FFT_SIZE / GRID3_SIZE)
-                spectrum12_data[offset: offset+4] = s12_0, s12_1, s12_2, s12_3
-                spectrum34_data[offset: offset+4] = s34_0, s34_1, s34_2, s34_3
+        samples = self.getSpectrumSamples().reshape(FFT_SIZE, FFT_SIZE, 8)
+        spectrum12_data[...] = samples[..., 0:4].reshape(-1)
+        spectrum34_data[...] = samples[..., 4:8].reshape(-1)
+
+    def computeSlopeVariance(self, spectrum12_data, spectrum34_data):
+        # k = 5e-3 ~ 1e3, k *= 1.001
+        step_count = int(ceil(log(1e3 / 5e-3) / log(1.001))) + 1
+        ks = np.cumprod(np.concatenate([[5e-3], np.full(step_count, 1.001)]))
+        ks = ks[ks < 1e3]
+        theoreticSlopeVariance = np.sum(ks * ks * self.spectrum(ks, 0.0, True) * (ks * 1.001 - ks))
+
+        wave_numbers = 2.0 * pi * getWaveNumbers()
+        i = wave_numbers[None, :, None]
+        j = wave_numbers[:, None, None]
+        grid_sizes = np.array([GRID1_SIZE, GRID2_SIZE, GRID3_SIZE, GRID4_SIZE], dtype=np.float64)
+        samples = np.concatenate([spectrum12_data.reshape(FFT_SIZE, FFT_SIZE, 2, 2),
+                                  spectrum34_data.reshape(FFT_SIZE, FFT_SIZE, 2, 2)], axis=2).astype(np.float64)
+        totalSlopeVariance = np.sum(self.getSlopeVariance(i / grid_sizes, j / grid_sizes, samples[..., 0], samples[..., 1]))
+        return float(theoreticSlopeVariance), float(totalSlopeVariance)
 
     def computeSlopeVarianceTex(self, spectrum12_data, spectrum34_data):
-        theoreticSlopeVariance = 0.0
-        k = 5e-3
-        while k < 1e3:
-            nextK = k * 1.001
-            theoreticSlopeVariance += k * k * self.spectrum(k, 0, True) * (nextK - k)
-            k = nextK
-
-        totalSlopeVariance = 0.0
-        for y in range(FFT_SIZE):
-            for x in range(FFT_SIZE):
-                offset = 4 * (x + y * FFT_SIZE)
-                i = 2.0 * pi * ((x - FFT_SIZE) if (x >= FFT_SIZE / 2) else x)
-                j = 2.0 * pi * ((y - FFT_SIZE) if (y >= FFT_SIZE / 2) else y)
-                s12_0, s12_1, s12_2, s12_3 = spectrum12_data[offset: offset + 4]
-                s34_0, s34_1, s34_2, s34_3 = spectrum34_data[offset: offset + 4]
-                totalSlopeVariance += self.getSlopeVariance(i/GRID1_SIZE, j/GRID1_SIZE, s12_0, s12_1)
-                totalSlopeVariance += self.getSlopeVariance(i/GRID2_SIZE, j/GRID2_SIZE, s12_2, s12_3)
-                totalSlopeVariance += self.getSlopeVariance(i/GRID3_SIZE, j/GRID3_SIZE, s34_0, s34_1)
-                totalSlopeVariance += self.getSlopeVariance(i/GRID4_SIZE, j/GRID4_SIZE, s34_2, s34_3)
+        theoreticSlopeVariance, totalSlopeVariance = self.computeSlopeVariance(spectrum12_data, spectrum34_data)
 
         self.fft_variance.use_program()
         self.fft_variance.bind_uniform_data("GRID_SIZES", GRID_SIZES)
@@ -305,7 +332,7 @@ class Ocean:
         resource = self.resource_manager.texture_loader.get_resource(texture.name)
         if resource is None:
             resource = self.resource_manager.texture_loader.create_resource(texture.name, texture)
-            self.resource_manager.texture_loader.save_resource(resource.name)
+            self.resource_manager.texture_loader.save_resource_async(resource.name)
         else:
             old_texture = resource.get_data()
             old_texture.delete()
@@ -329,6 +356,10 @@ class Ocean:
         self.generateWavesSpectrum(spectrum12_data, spectrum34_data)
         self.computeButterflyLookupTexture(butterfly_data)
 
+        self.spectrum12_data = spectrum12_data
+        self.spectrum34_data = spectrum34_data
+        self.cpu_simulator = None
+
         # create render targets
         self.texture_spectrum_1_2 = CreateTexture(
             name='fft_ocean.spectrum_1_2',
@@ -397,6 +428,36 @@ class Ocean:
         self.save_texture(self.texture_slope_variance)
         self.save_texture(self.texture_butterfly)
 
+    def get_spectrum_data(self):
+        if self.spectrum12_data is None or self.spectrum34_data is None:
+            # read the saved spectrum textures instead of the gpu readback
+            texture_loader = self.resource_manager.texture_loader
+            spectrum_datas = []
+            for texture_name in ("fft_ocean.spectrum_1_2", "fft_ocean.spectrum_3_4"):
+                texture_datas = texture_loader.load_resource_data(texture_loader.get_resource(texture_name, noWarn=True))
+                if texture_datas is None or texture_datas.get('data') is None:
+                    logger.error("Failed to get the spectrum data of %s" % texture_name)
+                    return None, None
+                spectrum_datas.append(np.asarray(texture_datas['data'], dtype=np.float32).reshape(-1))
+            self.spectrum12_data, self.spectrum34_data = spectrum_datas
+        return self.spectrum12_data, self.spectrum34_data
+
+    def get_cpu_simulator(self):
+        if self.cpu_simulator is None:
+            spectrum12_data, spectrum34_data = self.get_spectrum_data()
+            if spectrum12_data is None:
+                return None
+            self.cpu_simulator = OceanSimulator(spectrum12_data, spectrum34_data, self.cpu_simulation_resolution)
+        self.cpu_simulator.set_parameters(self.height, self.simulation_wind, self.simulation_amplitude, self.simulation_size)
+        return self.cpu_simulator
+
+    def sample_height(self, xz_array, time=None):
+        # water heights at the world xz positions, the shape of xz_array is (n, 2). time is the ocean time by default.
+        cpu_simulator = self.get_cpu_simulator()
+        if cpu_simulator is None:
+            return np.full(len(xz_array), self.height, dtype=np.float64)
+        return cpu_simulator.sample_height(xz_array, self.acc_time if time is None else time)
+
     def update(self, delta):
         self.acc_time += delta
         self.caustic_index = int((self.acc_time * 20.0) % len(self.texture_caustics))
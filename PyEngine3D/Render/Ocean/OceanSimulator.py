@@ -0,0 +1,102 @@
+import numpy as np
+
+from .Constants import *
+
+
+# CPU reference of the fft ocean, the same waves as fft_ocean.init, fft_x, fft_y and the displacement of fft_ocean.render.
+# It needs only the spectrum datas, so a headless server can query the water height without the gpu readback.
+#   resolution : the fft size of the simulation. If it is less than FFT_SIZE, the high wave numbers of every grid are
+#                dropped, it is cheaper but the waves near the spectral peak can be lost.
+class OceanSimulator:
+    def __init__(self, spectrum12_data, spectrum34_data, resolution=FFT_SIZE):
+        fft_size = int(np.sqrt(spectrum12_data.size // 4))
+        spectrum = np.concatenate([np.reshape(spectrum12_data, (fft_size, fft_size, 2, 2)),
+                                   np.reshape(spectrum34_data, (fft_size, fft_size, 2, 2))], axis=2).astype(np.float64)
+        spectrum = spectrum[..., 0] + 1j * spectrum[..., 1]  # shape is (y, x, grid)
+
+        self.resolution = min(int(resolution), fft_size)
+        half_resolution = self.resolution // 2
+        index = np.concatenate([np.arange(half_resolution), np.arange(fft_size - half_resolution, fft_size)])
+        conjugate_index = (fft_size - index) % fft_size
+        self.s0 = spectrum[np.ix_(index, index)]
+        self.s0c = spectrum[np.ix_(conjugate_index, conjugate_index)]
+
+        wave_numbers = np.where(index >= fft_size / 2, index - fft_size, index) * (2.0 * np.pi)
+        self.kx = wave_numbers[None, :, None] / GRID_SIZES.astype(np.float64)
+        self.ky = wave_numbers[:, None, None] / GRID_SIZES.astype(np.float64)
+        k = np.sqrt(self.kx * self.kx + self.ky * self.ky)
+        self.inverse_k = np.divide(1.0, k, out=np.zeros_like(k), where=(k != 0.0))
+        self.w = np.sqrt(9.81 * k * (1.0 + k * k / (370.0 * 370.0)))
+
+        self.height = 0.0
+        self.simulation_wind = 1.0
+        self.simulation_amplitude = 3.0
+        self.simulation_size = GRID_SIZES.astype(np.float64)
+
+        self.simulation_time = None
+        # displacement x, height, displacement z of the grids, the shape is (grid, z, x, 3)
+        self.fields = np.zeros((4, self.resolution, self.resolution, 3), dtype=np.float64)
+
+    def set_parameters(self, height, simulation_wind, simulation_amplitude, simulation_size):
+        self.height = height
+        self.simulation_wind = simulation_wind
+        self.simulation_amplitude = simulation_amplitude
+        if np.any(self.simulation_size != simulation_size):
+            self.simulation_size = np.array(simulation_size, dtype=np.float64)
+
+    def simulate(self, time):
+        t = time * self.simulation_wind
+        if t == self.simulation_time:
+            return self.fields
+        self.simulation_time = t
+
+        c = np.cos(self.w * t)
+        s = np.sin(self.w * t)
+        s0 = self.s0
+        s0c = self.s0c
+        h = ((s0.real + s0c.real) * c - (s0.imag + s0c.imag) * s) + 1j * ((s0.real - s0c.real) * s + (s0.imag - s0c.imag) * c)
+
+        # The butterfly passes are the unnormalized inverse transform. The fields are real, so only the half of
+        # the hermitian spectrum is transformed.
+        resolution = self.resolution
+        half = slice(0, resolution // 2 + 1)
+        h = h[:, half]
+        kx = self.kx[:, half] * self.inverse_k[:, half]
+        ky = self.ky * self.inverse_k[:, half]
+        spectrums = np.stack([1j * kx * h, h, 1j * ky * h], axis=-1)
+        fields = np.fft.irfft2(spectrums, s=(resolution, resolution), axes=(0, 1)) * float(resolution * resolution)
+        self.fields[...] = np.moveaxis(fields, 2, 0)
+        return self.fields
+
+    def sample_fields(self, xz_array):
+        # bilinear sampling with the wrap, same as the texel centers of the fft textures
+        xz_array = np.reshape(np.asarray(xz_array, dtype=np.float64), (-1, 2))
+        resolution = self.resolution
+        displacement = np.zeros((len(xz_array), 3), dtype=np.float64)
+        for grid in range(4):
+            texel = xz_array * (resolution / self.simulation_size[grid]) - 0.5
+            texel_floor = np.floor(texel)
+            fraction = texel - texel_floor
+            x0, z0 = (texel_floor.astype(np.int64) % resolution).T
+            x1 = (x0 + 1) % resolution
+            z1 = (z0 + 1) % resolution
+            fx = fraction[:, 0:1]
+            fz = fraction[:, 1:2]
+            field = self.fields[grid]
+            displacement += (field[z0, x0] * (1.0 - fx) + field[z0, x1] * fx) * (1.0 - fz) + \
+                            (field[z1, x0] * (1.0 - fx) + field[z1, x1] * fx) * fz
+        return displacement * self.simulation_amplitude
+
+    def sample_displacement(self, xz_array, time):
+        # the offset of the water surface from the undisplaced positions, shape is (n, 3)
+        self.simulate(time)
+        return self.sample_fields(xz_array)
+
+    def sample_height(self, xz_array, time, iterations=3):
+        # The waves move the surface horizontally too, so find the undisplaced position which is moved onto xz.
+        self.simulate(time)
+        xz_array = np.reshape(np.asarray(xz_array, dtype=np.float64), (-1, 2))
+        undisplaced_xz = xz_array
+        for i in range(iterations):
+            undisplaced_xz = xz_array - self.sample_fields(undisplaced_xz)[:, 0::2]
+        return self.height + self.sample_fields(undisplaced_xz)[:, 1]
@@ -1 +1,2 @@
 from .Ocean import Ocean
+from .OceanSimulator import OceanSimulator
@@ -45,7 +45,7 @@ class NoiseTexture3D:
         resource = resource_manager.texture_loader.get_resource(self.texture_name)
         if resource is None:
             resource = resource_manager.texture_loader.create_resource(self.texture_name, texture)
-            resource_manager.texture_loader.save_resource(resource.name)
+            resource_manager.texture_loader.save_resource_async(resource.name)
         else:
             old_texture = resource.get_data()
             old_texture.delete()
@@ -73,7 +73,7 @@ class VectorFieldTexture3D:
         renderer.restore_blend_state_prev()
 
         # save
-        resource_manager.texture_loader.save_resource(resource.name)
+        resource_manager.texture_loader.save_resource_async(resource.name)
 
     def get_save_data(self):
         save_data = dict(
@@ -1,4 +1,5 @@
 import math
+import weakref
 
 from PyEngine3D.Utilities import *
 
@@ -43,6 +44,38 @@ def shadow_culling(camera, light, actor, geometry_bound_box):
     return False
 
 
+def view_frustum_culling_geometries(camera, light, geometry_bounds, indices=None):
+    bound_centers = geometry_bounds.bound_centers if indices is None else geometry_bounds.bound_centers[indices]
+    radiuses = geometry_bounds.radiuses if indices is None else geometry_bounds.radiuses[indices]
+    distances = np.dot(bound_centers - camera.transform.pos, camera.frustum_vectors.T)
+    return np.any(radiuses[:, np.newaxis] < distances, axis=1)
+
+
+def shadow_culling_geometries(camera, light, geometry_bounds, indices=None):
+    bound_mins = geometry_bounds.bound_mins if indices is None else geometry_bounds.bound_mins[indices]
+    bound_maxs = geometry_bounds.bound_maxs if indices is None else geometry_bounds.bound_maxs[indices]
+    count = len(bound_mins)
+    bounds = np.ones((count * 2, 4), dtype=np.float32)
+    bounds[:count, :3] = bound_mins
+    bounds[count:, :3] = bound_maxs
+    bounds = np.dot(bounds, light.shadow_view_projection)[:, :3]
+    minimum = np.minimum(bounds[:count], bounds[count:])
+    maximum = np.maximum(bounds[:count], bounds[count:])
+    return np.any(maximum < -1.0, axis=1) | np.any(1.0 < minimum, axis=1)
+
+
+def create_render_info(actor, geometry_index):
+    material_instance = actor.get_material_instance(geometry_index)
+    render_info = RenderInfo()
+    render_info.actor = actor
+    render_info.geometry = actor.get_geometry(geometry_index)
+    render_info.geometry_data = actor.get_geometry_data(geometry_index)
+    render_info.gl_call_list = actor.get_gl_call_list(geometry_index)
+    render_info.material = material_instance.material if material_instance else None
+    render_info.material_instance = material_instance
+    return render_info
+
+
 def gather_render_infos(culling_func, camera, light, actor_list, solid_render_infos, translucent_render_infos):
     for actor in actor_list:
         for i in range(actor.get_geometry_count()):
@@ -52,21 +85,225 @@ def gather_render_infos(culling_func, camera, light, actor_list, solid_render_in
             if culling_func(camera, light, actor, actor.get_geometry_bound_box(i)):
                 continue
 
-            material_instance = actor.get_material_instance(i)
-            render_info = RenderInfo()
-            render_info.actor = actor
-            render_info.geometry = actor.get_geometry(i)
-            render_info.geometry_data = actor.get_geometry_data(i)
-            render_info.gl_call_list = actor.get_gl_call_list(i)
-            render_info.material = material_instance.material if material_instance else None
-            render_info.material_instance = material_instance
-            if render_info.material_instance is not None and render_info.material_instance.is_translucent():
+            render_info = create_render_info(actor, i)
+            if render_info.is_translucent():
                 if translucent_render_infos is not None:
                     translucent_render_infos.append(render_info)
             elif solid_render_infos is not None:
                 solid_render_infos.append(render_info)
 
 
+# bound spheres and aabbs of actor geometries packed into contiguous arrays for the batch culling.
+class GeometryBounds:
+    def __init__(self):
+        self.actor_geometries = []
+        self.bound_mins = np.zeros((0, 3), dtype=np.float32)
+        self.bound_maxs = np.zeros((0, 3), dtype=np.float32)
+        self.bound_centers = np.zeros((0, 3), dtype=np.float32)
+        self.radiuses = np.zeros(0, dtype=np.float32)
+
+    def get_count(self):
+        return len(self.actor_geometries)
+
+    def clear(self):
+        self.set_actor_geometries([])
+
+    def set_actor_geometries(self, actor_geometries):
+        self.actor_geometries = actor_geometries
+        bound_boxes = [actor.get_geometry_bound_box(i) for actor, i in actor_geometries]
+        count = len(bound_boxes)
+        self.bound_mins = np.array([bound_box.bound_min for bound_box in bound_boxes], dtype=np.float32).reshape(count, 3)
+        self.bound_maxs = np.array([bound_box.bound_max for bound_box in bound_boxes], dtype=np.float32).reshape(count, 3)
+        self.bound_centers = (self.bound_mins + self.bound_maxs) * 0.5
+        self.radiuses = np.array([bound_box.radius for bound_box in bound_boxes], dtype=np.float32)
+
+    def update_bounds(self, indices):
+        for index in indices:
+            actor, geometry_index = self.actor_geometries[index]
+            bound_box = actor.get_geometry_bound_box(geometry_index)
+            self.bound_mins[index] = bound_box.bound_min
+            self.bound_maxs[index] = bound_box.bound_max
+            self.bound_centers[index] = (bound_box.bound_min + bound_box.bound_max) * 0.5
+            self.radiuses[index] = bound_box.radius
+
+
+# Retained render infos, one per actor geometry, kept in draw order (sorted by geometry and material).
+# They are rebuilt only when an actor is added or removed, and the render infos of the actors which refer to
+# a changed model, mesh, material instance or material are recreated by invalidate.
+# Otherwise the actors push their changes, the visibility by set_actor_visible and the moved bounds by
+# set_actor_bound_box_updated, so nothing walks all actors each frame.
+class RenderInfoCache:
+    caches = weakref.WeakSet()
+
+    @staticmethod
+    def invalidate(resource_data):
+        # the render infos of the actors which refer to the resource_data are recreated on the next update.
+        for render_info_cache in RenderInfoCache.caches:
+            render_info_cache.invalidate_data(resource_data)
+
+    @staticmethod
+    def set_actor_visible(actor):
+        for render_info_cache in RenderInfoCache.caches:
+            render_info_cache.update_actor_visible(actor)
+
+    @staticmethod
+    def set_actor_bound_box_updated(actor):
+        for render_info_cache in RenderInfoCache.caches:
+            if actor in render_info_cache.actor_index_map:
+                render_info_cache.bound_box_updated_actors.add(actor)
+
+    def __init__(self):
+        self.actors = []
+        self.actor_index_map = {}
+        self.render_infos = []
+        self.geometry_bounds = GeometryBounds()
+        self.actor_indices = np.zeros(0, dtype=np.int32)
+        self.actor_render_info_indices = []
+        self.actor_visibles = np.zeros(0, dtype=np.bool_)
+        self.translucent_mask = np.zeros(0, dtype=np.bool_)
+        self.visible_mask = np.zeros(0, dtype=np.bool_)
+        # id of the referred actor, model, mesh, material instance or material : actor indices
+        self.reference_map = {}
+        self.invalidated_actor_indices = set()
+        self.bound_box_updated_actors = set()
+        self.need_to_rebuild = True
+        RenderInfoCache.caches.add(self)
+
+    def clear(self):
+        self.actors = []
+        self.actor_index_map = {}
+        self.bound_box_updated_actors.clear()
+        self.need_to_rebuild = True
+
+    def add_actor(self, actor):
+        self.actor_index_map[actor] = len(self.actors)
+        self.actors.append(actor)
+        self.need_to_rebuild = True
+
+    def remove_actor(self, actor):
+        if actor in self.actor_index_map:
+            self.actors.remove(actor)
+            self.actor_index_map = {actor: actor_index for actor_index, actor in enumerate(self.actors)}
+            self.bound_box_updated_actors.discard(actor)
+            self.need_to_rebuild = True
+
+    def invalidate_data(self, resource_data):
+        if not self.need_to_rebuild:
+            actor_indices = self.reference_map.get(id(resource_data))
+            if actor_indices:
+                self.invalidated_actor_indices.update(actor_indices)
+
+    def rebuild(self):
+        self.need_to_rebuild = False
+        self.invalidated_actor_indices.clear()
+
+        items = []
+        for actor_index, actor in enumerate(self.actors):
+            for geometry_index in range(len(actor.get_geometry_bound_boxes())):
+                items.append((create_render_info(actor, geometry_index), actor_index, geometry_index))
+        self.actor_visibles = np.array([actor.visible for actor in self.actors], dtype=np.bool_)
+        self.set_items(items)
+
+    def rebuild_actors(self, actor_indices):
+        actor_render_infos = {}
+        for actor_index in actor_indices:
+            actor = self.actors[actor_index]
+            geometry_count = len(actor.get_geometry_bound_boxes())
+            if geometry_count != len(self.actor_render_info_indices[actor_index]):
+                # the geometries are added or removed, so the draw order is rebuilt.
+                self.rebuild()
+                return
+            actor_render_infos[actor_index] = [create_render_info(actor, i) for i in range(geometry_count)]
+
+        items = []
+        for render_info, actor_index, (actor, geometry_index) in zip(self.render_infos, self.actor_indices,
+                                                                     self.geometry_bounds.actor_geometries):
+            if actor_index in actor_render_infos:
+                render_info = actor_render_infos[actor_index][geometry_index]
+            items.append((render_info, actor_index, geometry_index))
+        self.set_items(items)
+
+    def set_items(self, items):
+        # items are the list of (render_info, actor_index, geometry_index)
+        items.sort(key=lambda x: (id(x[0].geometry), id(x[0].material)))
+
+        self.render_infos = [item[0] for item in items]
+        self.actor_indices = np.array([item[1] for item in items], dtype=np.int32)
+        self.actor_render_info_indices = [[] for actor in self.actors]
+        self.reference_map = {}
+        for actor_index, actor in enumerate(self.actors):
+            self.reference_map.setdefault(id(actor), set()).add(actor_index)
+            if actor.model is not None:
+                self.reference_map.setdefault(id(actor.model), set()).add(actor_index)
+                self.reference_map.setdefault(id(actor.model.mesh), set()).add(actor_index)
+        for render_info_index, (render_info, actor_index, geometry_index) in enumerate(items):
+            self.actor_render_info_indices[actor_index].append(render_info_index)
+            self.reference_map.setdefault(id(render_info.material_instance), set()).add(actor_index)
+            self.reference_map.setdefault(id(render_info.material), set()).add(actor_index)
+        self.translucent_mask = np.array([render_info.is_translucent() for render_info in self.render_infos], dtype=np.bool_)
+        self.visible_mask = self.actor_visibles[self.actor_indices]
+        self.geometry_bounds.set_actor_geometries([(self.actors[item[1]], item[2]) for item in items])
+
+    def update(self):
+        if self.need_to_rebuild:
+            self.rebuild()
+        elif self.invalidated_actor_indices:
+            actor_indices = sorted(self.invalidated_actor_indices)
+            self.invalidated_actor_indices.clear()
+            self.rebuild_actors(actor_indices)
+
+    def update_actor_visible(self, actor):
+        # the visibles are read again on rebuild anyway.
+        actor_index = self.actor_index_map.get(actor)
+        if actor_index is not None and not self.need_to_rebuild:
+            self.actor_visibles[actor_index] = actor.visible
+            self.visible_mask[self.actor_render_info_indices[actor_index]] = actor.visible
+
+    def pop_bound_box_updated_actors(self):
+        # the actors whose bound box is changed since the last call, their geometry bounds are updated here.
+        actors = self.bound_box_updated_actors
+        self.bound_box_updated_actors = set()
+        if not self.need_to_rebuild:
+            for actor in actors:
+                self.geometry_bounds.update_bounds(self.actor_render_info_indices[self.actor_index_map[actor]])
+        return actors
+
+    def gather_render_infos(self, culling_func, camera, light, solid_render_infos, translucent_render_infos, actors=None):
+        # culling_func tests all geometries at once and returns the culled mask, the draw order is already sorted.
+        # actors limits the test to the geometries of the given actors, e.g. the result of a spatial query.
+        if len(self.render_infos) < 1:
+            return
+
+        if actors is None:
+            indices = None
+            visible_mask = self.visible_mask
+            translucent_mask = self.translucent_mask
+        else:
+            actor_render_info_indices = self.actor_render_info_indices
+            actor_index_map = self.actor_index_map
+            indices = []
+            for actor in actors:
+                actor_index = actor_index_map.get(actor)
+                if actor_index is not None:
+                    indices.extend(actor_render_info_indices[actor_index])
+            indices = np.sort(np.array(indices, dtype=np.int32))
+            visible_mask = self.visible_mask[indices]
+            translucent_mask = self.translucent_mask[indices]
+
+        visible_mask = visible_mask & ~culling_func(camera, light, self.geometry_bounds, indices)
+        solid_indices = np.flatnonzero(visible_mask & ~translucent_mask)
+        translucent_indices = np.flatnonzero(visible_mask & translucent_mask)
+        if indices is not None:
+            solid_indices = indices[solid_indices]
+            translucent_indices = indices[translucent_indices]
+
+        render_infos = self.render_infos
+        if solid_render_infos is not None:
+            solid_render_infos.extend([render_infos[i] for i in solid_indices])
+        if translucent_render_infos is not None:
+            translucent_render_infos.extend([render_infos[i] for i in translucent_indices])
+
+
 class RenderInfo:
     def __init__(self):
         self.actor = None
@@ -75,3 +312,6 @@ class RenderInfo:
         self.gl_call_list = None
         self.material = None
         self.material_instance = None
+
+    def is_translucent(self):
+        return self.material_instance is not None and self.material_instance.is_translucent()
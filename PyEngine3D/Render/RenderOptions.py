@@ -23,7 +23,10 @@ class RenderOption:
     RENDER_COLLISION = True
     RENDER_DEBUG_LINE = True
     RENDER_GIZMO = True
-    RENDER_OBJECT_ID = True
+    RENDER_OBJECT_ID = False  # the object id pass is rendered only for the readback requests if it is False.
+    CPU_PICKING = True
+    BATCH_CULLING = True
+    BATCH_TRANSFORM = True
 
 
 class RenderingType(AutoEnum):
@@ -10,6 +10,7 @@ from PyEngine3D.Common import logger, COMMAND
 from PyEngine3D.Common.Constants import *
 from PyEngine3D.Utilities import *
 from PyEngine3D.OpenGLContext import InstanceBuffer, FrameBufferManager, RenderBuffer, UniformBlock, CreateTexture
+from PyEngine3D.OpenGLContext import TextureReadbackQueue, TextureStreamingManager
 from .PostProcess import AntiAliasing, PostProcess
 from . import RenderTargets, RenderOption, RenderingType, RenderGroup, RenderMode
 from . import SkeletonActor, StaticActor, ScreenQuad, Line
@@ -82,6 +83,13 @@ class Renderer(Singleton):
 
         self.actor_instance_buffer = None
 
+        self.texture_readback_queue = None
+        self.texture_streaming_manager = None
+
+        # async readback of the object id under the mouse, the object id pass is rendered for the requests.
+        self.object_id_requests = []
+        self.object_id_futures = []
+
         self.render_custom_translucent_callbacks = []
 
     def initialize(self, core_manager):
@@ -127,6 +135,10 @@ class Renderer(Singleton):
         # instance buffer
         self.actor_instance_buffer = InstanceBuffer(name="actor_instance_buffer", location_offset=7, element_datas=[MATRIX4_IDENTITY, ])
 
+        self.texture_readback_queue = TextureReadbackQueue.instance()
+        self.texture_readback_queue.initialize()
+        self.texture_streaming_manager = TextureStreamingManager.instance()
+
         # scene constants uniform buffer
         program = self.scene_constants_material.get_program()
 
@@ -235,7 +247,25 @@ class Renderer(Singleton):
         self.core_manager.send_rendering_type_list(rendering_type_list)
 
     def close(self):
-        pass
+        if self.texture_readback_queue is not None:
+            self.texture_readback_queue.clear()
+
+        if self.texture_streaming_manager is not None:
+            self.texture_streaming_manager.clear()
+
+    def request_object_id(self, screen_x_ratio, screen_y_ratio):
+        x = math.floor(min(1.0, max(0.0, screen_x_ratio)) * (RenderTargets.OBJECT_ID.width - 1))
+        y = math.floor(min(1.0, max(0.0, screen_y_ratio)) * (RenderTargets.OBJECT_ID.height - 1))
+        self.object_id_requests.append((x, y))
+
+    def get_object_id_results(self):
+        # the object ids of the finished requests, they arrive a frame or two after the request.
+        object_ids = []
+        while self.object_id_futures and self.object_id_futures[0].done():
+            object_id_data = self.object_id_futures.pop(0).result()
+            if object_id_data is not None:
+                object_ids.append(math.floor(object_id_data[0, 0, 0] + 0.5))
+        return object_ids
 
     def render_custom_translucent(self, render_custom_translucent_callback):
         self.render_custom_translucent_callbacks.append(render_custom_translucent_callback)
@@ -964,6 +994,9 @@ class Renderer(Singleton):
     def render_scene(self):
         main_camera = self.scene_manager.main_camera
 
+        # resolve the finished texture readbacks of the previous frames
+        self.texture_readback_queue.update()
+
         # bind scene constants uniform blocks
         self.bind_uniform_blocks()
 
@@ -1133,8 +1166,11 @@ class Renderer(Singleton):
 
             self.render_postprocess()
 
-        if RenderOption.RENDER_OBJECT_ID:
+        if RenderOption.RENDER_OBJECT_ID or self.object_id_requests:
             self.render_object_id()
+            for x, y in self.object_id_requests:
+                self.object_id_futures.append(self.texture_readback_queue.request(RenderTargets.OBJECT_ID, x=x, y=y, width=1, height=1))
+            self.object_id_requests.clear()
 
         self.render_selected_object()
 
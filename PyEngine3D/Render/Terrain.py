@@ -1,3 +1,5 @@
+import traceback
+
 from OpenGL.GL import *
 
 from PyEngine3D.Common import logger
@@ -6,6 +8,7 @@ from PyEngine3D.Render import Plane
 from PyEngine3D.OpenGLContext import InstanceBuffer
 from PyEngine3D.Utilities import *
 from . import RenderMode
+from .TerrainQuadTree import HeightField, TerrainQuadTree
 
 
 class Terrain:
@@ -27,9 +30,17 @@ class Terrain:
         self.subdivide_level = object_data.get('subdivide_level', 100)
         self.height_map_size = np.array(object_data.get('height_map_size', [10.0, 10.0]), dtype=np.float32)
 
+        # the chunks are drawn at a larger size if the distance to the camera is larger than the node size * lod_distance_ratio
+        self.lod_distance_ratio = object_data.get('lod_distance_ratio', 4.0)
+
         self.instance_offset = None
+        self.render_instance_offset = None
+        self.shadow_instance_offset = None
         self.instance_buffer = None
 
+        self.height_field = None
+        self.quad_tree = None
+
         self.terrain_grid = None
 
         self.texture_height_map_name = object_data.get('texture_height_map', "common.noise")
@@ -46,6 +57,7 @@ class Terrain:
         self.generate_terrain(self.subdivide_level)
 
         self.texture_height_map = self.resource_manager.get_texture(self.texture_height_map_name)
+        self.build_quad_tree()
         self.terrain_render = self.resource_manager.get_material_instance('terrain.terrain_render_ps')
         self.terrain_shadow = self.resource_manager.get_material_instance('terrain.terrain_shadow')
 
@@ -59,6 +71,7 @@ class Terrain:
             width=self.width,
             height=self.height,
             subdivide_level=self.subdivide_level,
+            lod_distance_ratio=self.lod_distance_ratio,
             texture_height_map=self.texture_height_map.name if self.texture_height_map is not None else self.texture_height_map_name,
         )
         return save_data
@@ -78,30 +91,191 @@ class Terrain:
             self.transform.set_scale(attribute_value)
         elif attribute_name == 'texture_height_map':
             self.texture_height_map = self.resource_manager.get_texture(attribute_value)
+            self.build_quad_tree()
         elif hasattr(self, attribute_name):
             setattr(self, attribute_name, attribute_value)
             if attribute_name in ('width', 'height'):
                 self.set_instance_offset(self.width, self.height)
-            elif attribute_name in 'subdivide_level':
+                self.build_quad_tree()
+            elif attribute_name == 'subdivide_level':
                 self.generate_terrain(self.subdivide_level)
+                self.build_quad_tree()
+            elif attribute_name == 'height_map_size':
+                self.height_map_size = np.array(attribute_value, dtype=np.float32)
+                self.build_quad_tree()
         return self.attributes
 
     def generate_terrain(self, subdivide_level):
-        self.terrain_grid = Plane("Terrain_Grid", mode=GL_QUADS, width=subdivide_level, height=subdivide_level, xz_plane=True)
+        # the skirts as deep as the whole height range cover the cracks between the chunks of the different lods.
+        self.terrain_grid = Plane("Terrain_Grid", mode=GL_QUADS, width=subdivide_level, height=subdivide_level, xz_plane=True,
+                                  skirt_depth=1.0)
 
     def set_instance_offset(self, width, height):
-        count = width * height
-        self.instance_offset = np.zeros(count, (np.float32, 4))
-        i = 0
-        for y in range(height):
-            for x in range(width):
-                self.instance_offset[i][0] = x
-                self.instance_offset[i][1] = y
-                i += 1
+        # all of the chunks, it is used when there is no quad tree
+        self.instance_offset = np.zeros((width * height, 4), dtype=np.float32)
+        self.instance_offset[:, 0] = np.tile(np.arange(width), height)
+        self.instance_offset[:, 1] = np.repeat(np.arange(height), width)
+        self.render_instance_offset = self.instance_offset
+        self.shadow_instance_offset = self.instance_offset
+
+    def build_quad_tree(self):
+        self.height_field = None
+        self.quad_tree = None
+        self.render_instance_offset = self.instance_offset
+        self.shadow_instance_offset = self.instance_offset
+        texture_name = self.texture_height_map.name if self.texture_height_map is not None else self.texture_height_map_name
+        texture_loader = self.resource_manager.texture_loader
+        texture_datas = texture_loader.load_resource_data(texture_loader.get_resource(texture_name, noWarn=True))
+        if not texture_datas or texture_datas.get('data') is None:
+            logger.warn("%s cannot read the height map %s, the quad tree is disabled." % (self.name, texture_name))
+            return
+        try:
+            height_field = HeightField.create_from_texture_datas(texture_datas)
+            quad_tree = TerrainQuadTree(self.width, self.height)
+            quad_tree.build(height_field, self.height_map_size, self.subdivide_level)
+        except BaseException:
+            logger.error(traceback.format_exc())
+            logger.error("%s cannot build the quad tree from the height map %s, the quad tree is disabled." % (self.name, texture_name))
+            return
+        self.height_field = height_field
+        self.quad_tree = quad_tree
 
     def update(self, delta):
         self.transform.update_transform()
 
+        camera = self.scene_manager.main_camera
+        if self.quad_tree is not None and camera is not None:
+            camera_position = camera.transform.get_pos()
+            self.render_instance_offset = self.quad_tree.select_nodes(self.transform.matrix, self.transform.scale, camera_position,
+                                                                      self.lod_distance_ratio, camera.frustum_vectors)
+            # the shadow casters can be out of the view
+            self.shadow_instance_offset = self.quad_tree.select_nodes(self.transform.matrix, self.transform.scale, camera_position,
+                                                                      self.lod_distance_ratio)
+
+    # Queries in the world space for the game logic, the positions are arrays of shape (n, 2) or (n, 3).
+    def get_local_positions(self, xz_array):
+        xz_array = np.reshape(np.asarray(xz_array, dtype=np.float64), (-1, 2))
+        positions = np.zeros((len(xz_array), 4), dtype=np.float64)
+        positions[:, 0::2] = xz_array
+        positions[:, 3] = 1.0
+        return np.dot(positions, np.linalg.inv(self.transform.matrix))[:, 0::2]
+
+    def get_local_heights(self, local_xz):
+        heights = self.height_field.sample(local_xz / self.height_map_size)
+        inside = np.all(np.logical_and(0.0 <= local_xz, local_xz <= (self.width, self.height)), axis=1)
+        return np.where(inside, heights, np.nan)
+
+    def to_world_positions(self, local_xz, local_heights):
+        positions = np.ones((len(local_xz), 4), dtype=np.float64)
+        positions[:, 0::2] = local_xz
+        positions[:, 1] = local_heights
+        return np.dot(positions, self.transform.matrix)[:, :3]
+
+    def get_heights(self, xz_array):
+        # world height of the ground at xz, nan if xz is out of the terrain
+        local_xz = self.get_local_positions(xz_array)
+        return self.to_world_positions(local_xz, self.get_local_heights(local_xz))[:, 1]
+
+    def get_normals(self, xz_array):
+        # the same normals as the vertex shader at the finest lod
+        local_xz = self.get_local_positions(xz_array)
+        delta = 1.0 / max(1, self.subdivide_level)
+        local_xz_w = local_xz + (delta, 0.0)
+        local_xz_h = local_xz + (0.0, delta)
+        positions = self.to_world_positions(local_xz, self.height_field.sample(local_xz / self.height_map_size))
+        positions_w = self.to_world_positions(local_xz_w, self.height_field.sample(local_xz_w / self.height_map_size))
+        positions_h = self.to_world_positions(local_xz_h, self.height_field.sample(local_xz_h / self.height_map_size))
+        normals = np.cross(positions_h - positions, positions_w - positions)
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        inside = np.logical_not(np.isnan(self.get_local_heights(local_xz)))
+        return np.where(inside[:, np.newaxis], normals, np.nan)
+
+    def raycast(self, origins, directions, max_distance=np.inf, step_block_size=64, bisection_count=12):
+        # returns hits, distances, positions. the distance is in the unit of the direction length, inf if missed.
+        origins = np.reshape(np.asarray(origins, dtype=np.float64), (-1, 3))
+        directions = np.reshape(np.asarray(directions, dtype=np.float64), (-1, 3))
+        ray_count = len(origins)
+        distances = np.full(ray_count, np.inf)
+        if self.quad_tree is None or 0 == ray_count:
+            return np.zeros(ray_count, dtype=np.bool_), distances, np.full((ray_count, 3), np.nan)
+
+        # the ray in the local space has the same parameter t, because the transform is affine.
+        inverse_matrix = np.linalg.inv(self.transform.matrix)
+        local_origins = np.dot(origins, inverse_matrix[:3, :3]) + inverse_matrix[3, :3]
+        local_directions = np.dot(directions, inverse_matrix[:3, :3])
+
+        # clip with the bound box of the root node
+        min_height, max_height = self.quad_tree.get_bound_min_max()
+        bound_min = np.array([0.0, min_height, 0.0])
+        bound_max = np.array([self.width, max_height, self.height])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t0 = (bound_min - local_origins) / local_directions
+            t1 = (bound_max - local_origins) / local_directions
+        t_near = np.nanmax(np.minimum(t0, t1), axis=1)
+        t_far = np.nanmin(np.maximum(t0, t1), axis=1)
+        t_near = np.maximum(t_near, 0.0)
+        t_far = np.minimum(t_far, max_distance)
+
+        def get_heights_above_ground(indices, t):
+            points = local_origins[indices, np.newaxis] + local_directions[indices, np.newaxis] * t[..., np.newaxis]
+            local_xz = points[..., 0::2].reshape(-1, 2)
+            heights = self.height_field.sample(local_xz / self.height_map_size).reshape(t.shape)
+            return points[..., 1] - heights
+
+        # march with the steps which are smaller than the grid of the quad tree
+        indices = np.where(t_near <= t_far)[0]
+        cell_size = 1.0 / self.quad_tree.samples_per_chunk
+        horizontal_lengths = np.linalg.norm(local_directions[indices][:, 0::2], axis=1)
+        step_counts = np.maximum(1, np.ceil((t_far[indices] - t_near[indices]) * horizontal_lengths / cell_size))
+        step_sizes = (t_far[indices] - t_near[indices]) / step_counts
+        t_starts = t_near[indices]
+        prev_heights = get_heights_above_ground(indices, t_starts[:, np.newaxis])[:, 0]
+        hit_indices = []
+        hit_t0 = []
+        hit_t1 = []
+        block = np.arange(1, step_block_size + 1)
+        step = 0
+        while 0 < len(indices):
+            steps = np.minimum(step + block[np.newaxis, :], step_counts[:, np.newaxis])
+            t = t_starts[:, np.newaxis] + steps * step_sizes[:, np.newaxis]
+            heights = get_heights_above_ground(indices, t)
+            heights = np.concatenate([prev_heights[:, np.newaxis], heights], axis=1)
+            crossed = np.logical_and(0.0 < heights[:, :-1], heights[:, 1:] <= 0.0)
+            if 0 == step:
+                # the origin is already under the ground, the rays entering the side of the bound box are not the case.
+                crossed[:, 0] = np.logical_or(crossed[:, 0], np.logical_and(heights[:, 0] <= 0.0, t_starts <= 0.0))
+            hit = np.any(crossed, axis=1)
+            first = np.argmax(crossed, axis=1)
+            hit_rows = np.where(hit)[0]
+            if 0 < len(hit_rows):
+                end_steps = steps[hit_rows, first[hit_rows]]
+                hit_indices.append(indices[hit_rows])
+                hit_t1.append(t_starts[hit_rows] + end_steps * step_sizes[hit_rows])
+                hit_t0.append(np.maximum(t_starts[hit_rows], hit_t1[-1] - step_sizes[hit_rows]))
+            step += step_block_size
+            remain = np.logical_and(np.logical_not(hit), step < step_counts)
+            indices = indices[remain]
+            step_counts = step_counts[remain]
+            step_sizes = step_sizes[remain]
+            t_starts = t_starts[remain]
+            prev_heights = heights[remain, -1]
+
+        if hit_indices:
+            indices = np.concatenate(hit_indices)
+            t0 = np.concatenate(hit_t0)
+            t1 = np.concatenate(hit_t1)
+            for i in range(bisection_count):
+                t = (t0 + t1) * 0.5
+                above = 0.0 < get_heights_above_ground(indices, t[:, np.newaxis])[:, 0]
+                t0 = np.where(above, t, t0)
+                t1 = np.where(above, t1, t)
+            distances[indices] = t1
+
+        hits = np.isfinite(distances)
+        positions = np.full((ray_count, 3), np.nan)
+        positions[hits] = origins[hits] + directions[hits] * distances[hits, np.newaxis]
+        return hits, distances, positions
+
     def render_terrain(self, render_mode):
         if RenderMode.GBUFFER == render_mode:
             material_instance = self.terrain_render
@@ -116,5 +290,7 @@ class Terrain:
         material_instance.bind_uniform_data('texture_height_map', self.texture_height_map)
         material_instance.bind_uniform_data('scale', self.transform.scale)
         material_instance.bind_uniform_data('subdivide_level', self.subdivide_level)
-        self.terrain_grid.get_geometry().draw_elements_instanced(len(self.instance_offset), self.instance_buffer, [self.instance_offset, ])
+        instance_offset = self.shadow_instance_offset if RenderMode.SHADOW == render_mode else self.render_instance_offset
+        if 0 < len(instance_offset):
+            self.terrain_grid.get_geometry().draw_elements_instanced(len(instance_offset), self.instance_buffer, [instance_offset, ])
 
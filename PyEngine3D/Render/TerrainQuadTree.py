@@ -0,0 +1,173 @@
+import numpy as np
+
+from OpenGL.GL import GL_REPEAT
+
+from PyEngine3D.Utilities import *
+
+
+class HeightField:
+    # CPU copy of the height map, the height is the first channel in 0.0 ~ 1.0 same as texture2DLod(...).x
+    def __init__(self, data, width, height, wrap=True):
+        data = np.frombuffer(data, dtype=np.uint8) if isinstance(data, bytes) else np.asarray(data)
+        channel_count = max(1, data.size // (width * height))
+        heights = data.reshape(height, width, channel_count)[..., 0]
+        if np.issubdtype(heights.dtype, np.integer):
+            heights = heights.astype(np.float32) / float(np.iinfo(heights.dtype).max)
+        self.heights = np.ascontiguousarray(heights, dtype=np.float32)
+        self.width = width
+        self.height = height
+        self.wrap = wrap
+
+    @staticmethod
+    def create_from_texture_datas(texture_datas):
+        wrap = texture_datas.get('wrap_s') or texture_datas.get('wrap', GL_REPEAT)
+        data = texture_datas['data']
+        compression = texture_datas.get('compression')
+        if compression:
+            data = decompress_texture(data, compression, texture_datas['width'], texture_datas['height'])
+        return HeightField(data, texture_datas['width'], texture_datas['height'], GL_REPEAT == wrap)
+
+    def sample(self, tex_coords):
+        # bilinear sampling, the texel centers are same as the gpu
+        tex_coords = np.reshape(np.asarray(tex_coords, dtype=np.float64), (-1, 2))
+        texel = tex_coords * (self.width, self.height) - 0.5
+        texel_floor = np.floor(texel)
+        fraction = texel - texel_floor
+        x0 = texel_floor[:, 0].astype(np.int64)
+        y0 = texel_floor[:, 1].astype(np.int64)
+        x1 = x0 + 1
+        y1 = y0 + 1
+        if self.wrap:
+            x0 %= self.width
+            x1 %= self.width
+            y0 %= self.height
+            y1 %= self.height
+        else:
+            x0 = np.clip(x0, 0, self.width - 1)
+            x1 = np.clip(x1, 0, self.width - 1)
+            y0 = np.clip(y0, 0, self.height - 1)
+            y1 = np.clip(y1, 0, self.height - 1)
+        fx = fraction[:, 0]
+        fy = fraction[:, 1]
+        heights = self.heights
+        return (heights[y0, x0] * (1.0 - fx) + heights[y0, x1] * fx) * (1.0 - fy) + \
+               (heights[y1, x0] * (1.0 - fx) + heights[y1, x1] * fx) * fy
+
+
+# Quadtree of the terrain chunks, the chunk is the unit grid drawn at an instance offset of Terrain.
+# The nodes are kept per level in 2d arrays like the mip levels, level 0 is the chunks and the top level is the root.
+# Each node has the min/max height of its chunks in the local space of the terrain.
+class TerrainQuadTree:
+    def __init__(self, width, height, max_samples_per_chunk=32):
+        self.width = width
+        self.height = height
+        self.max_samples_per_chunk = max_samples_per_chunk
+        self.samples_per_chunk = 1
+        self.level_count = 0
+        self.min_heights = []
+        self.max_heights = []
+        self.completes = []  # the node has all of its chunks, so it can be drawn as one instance
+
+    def get_bound_min_max(self):
+        if 0 == self.level_count:
+            return 0.0, 0.0
+        return float(self.min_heights[-1][0, 0]), float(self.max_heights[-1][0, 0])
+
+    def build(self, height_field, height_map_size, subdivide_level):
+        width = self.width
+        height = self.height
+        self.samples_per_chunk = max(1, min(int(subdivide_level), self.max_samples_per_chunk))
+        sample_count = self.samples_per_chunk + 1
+        grid = np.linspace(0.0, 1.0, sample_count)
+
+        size = 1
+        while size < max(width, height):
+            size *= 2
+        self.level_count = int(np.log2(size)) + 1
+
+        min_heights = np.full((size, size), np.inf, dtype=np.float32)
+        max_heights = np.full((size, size), -np.inf, dtype=np.float32)
+
+        # sample the vertices of the finest grid, one row of the chunks at once
+        xs = (np.arange(width)[:, None] + grid).reshape(-1)
+        for y in range(height):
+            zs = y + grid
+            tex_coords = np.stack(np.meshgrid(xs, zs), axis=-1).reshape(-1, 2) / height_map_size
+            heights = height_field.sample(tex_coords).reshape(sample_count, width, sample_count)
+            min_heights[y, :width] = np.min(heights, axis=(0, 2))
+            max_heights[y, :width] = np.max(heights, axis=(0, 2))
+
+        completes = np.zeros((size, size), dtype=np.bool_)
+        completes[:height, :width] = True
+
+        self.min_heights = [min_heights]
+        self.max_heights = [max_heights]
+        self.completes = [completes]
+        while 1 < size:
+            size //= 2
+            self.min_heights.append(self.min_heights[-1].reshape(size, 2, size, 2).min(axis=(1, 3)))
+            self.max_heights.append(self.max_heights[-1].reshape(size, 2, size, 2).max(axis=(1, 3)))
+            self.completes.append(self.completes[-1].reshape(size, 2, size, 2).all(axis=(1, 3)))
+
+    def select_nodes(self, matrix, scale, camera_position, lod_distance_ratio, frustum_vectors=None):
+        # returns the instance offsets (x, y, size, level) of the nodes to draw, the culled nodes are skipped.
+        if 0 == self.level_count:
+            return np.zeros((0, 4), dtype=np.float32)
+
+        scale = np.abs(np.asarray(scale, dtype=np.float32))
+        max_scale_xz = max(scale[0], scale[2])
+        instances = []
+        nodes = np.zeros((1, 2), dtype=np.int64)
+        for level in range(self.level_count - 1, -1, -1):
+            iy, ix = nodes.T
+            min_heights = self.min_heights[level][iy, ix]
+            max_heights = self.max_heights[level][iy, ix]
+            exists = min_heights <= max_heights
+            nodes = nodes[exists]
+            iy, ix = nodes.T
+            min_heights = min_heights[exists]
+            max_heights = max_heights[exists]
+            if 0 == len(nodes):
+                break
+
+            node_size = 1 << level
+            half_size = node_size * 0.5
+            local_centers = np.stack([ix * node_size + half_size, (min_heights + max_heights) * 0.5,
+                                      iy * node_size + half_size, np.ones(len(nodes))], axis=-1)
+            centers = np.dot(local_centers, matrix)[:, :3]
+            half_extents = np.stack([np.full(len(nodes), half_size), (max_heights - min_heights) * 0.5,
+                                     np.full(len(nodes), half_size)], axis=-1)
+            radiuses = np.linalg.norm(half_extents * scale, axis=-1)
+
+            if frustum_vectors is not None:
+                distances = np.dot(centers - camera_position, frustum_vectors.T)
+                visible = np.logical_not(np.any(radiuses[:, np.newaxis] < distances, axis=1))
+                nodes = nodes[visible]
+                centers = centers[visible]
+                radiuses = radiuses[visible]
+                iy, ix = nodes.T
+
+            completes = self.completes[level][iy, ix]
+            if 0 < level:
+                distances = np.linalg.norm(centers - camera_position, axis=-1) - radiuses
+                far_enough = (node_size * max_scale_xz * lod_distance_ratio) < distances
+                draw = np.logical_and(completes, far_enough)
+            else:
+                draw = completes
+
+            draw_nodes = nodes[draw]
+            if 0 < len(draw_nodes):
+                offsets = np.zeros((len(draw_nodes), 4), dtype=np.float32)
+                offsets[:, 0] = draw_nodes[:, 1] * node_size
+                offsets[:, 1] = draw_nodes[:, 0] * node_size
+                offsets[:, 2] = node_size
+                offsets[:, 3] = level
+                instances.append(offsets)
+
+            # subdivide the others
+            nodes = nodes[np.logical_not(draw)] * 2
+            nodes = (nodes[:, np.newaxis, :] + np.array([[0, 0], [0, 1], [1, 0], [1, 1]])).reshape(-1, 2)
+
+        if instances:
+            return np.concatenate(instances)
+        return np.zeros((0, 4), dtype=np.float32)
@@ -1,10 +1,12 @@
-from .RenderInfo import RenderInfo, gather_render_infos
+from .RenderInfo import RenderInfo, RenderInfoCache, GeometryBounds, gather_render_infos
 from .RenderInfo import view_frustum_culling_geometry, cone_sphere_culling_actor, always_pass, shadow_culling
+from .RenderInfo import view_frustum_culling_geometries, shadow_culling_geometries
 from .RenderOptions import BlendMode, RenderOption, RenderingType, RenderGroup, RenderMode, RenderOptionManager
 
 from .MaterialInstance import MaterialInstance
 
-from .Animation import Animation, AnimationNode
+from .Animation import AnimationPoseCache, Animation, AnimationNode
+from .AnimationBlender import AnimationState, AnimationLayer, AnimationBlender
 from .Skeleton import Skeleton, Bone
 from .Mesh import BoundBox, Geometry, Mesh, Triangle, Quad, Cube, Plane, ScreenQuad, Line
 from .Model import Model
@@ -18,6 +20,7 @@ from .Light import MainLight, PointLight
 from .LightProbe import LightProbe
 from .Atmosphere import Atmosphere
 from .Ocean import Ocean
+from .TerrainQuadTree import HeightField, TerrainQuadTree
 from .Terrain import Terrain
 from .Spline import SplinePoint, SplineData, Spline3D
 
@@ -0,0 +1,139 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+
+# Binary mesh container
+#   magic(8) | version(uint32) | header size(uint32) | header(json) | aligned raw array blocks
+# The header keeps the structure of the mesh data, the arrays are replaced by the index of the block table.
+# The blocks are read by np.memmap, so loading does not decompress or unpickle anything.
+BINARY_MESH_MAGIC = b'PYE3DMSH'
+BINARY_MESH_VERSION = 1
+BINARY_MESH_ALIGNMENT = 64
+BINARY_MESH_PREFIX_SIZE = 16
+# Windows cannot replace a file which is memory mapped, so the blocks are read into the memory there
+# and the mesh files can be saved again while the meshes are loaded.
+USE_MEMORY_MAP = 'nt' != os.name
+
+# the arrays which are stored as the given dtype, the other integer or bool arrays keep their dtype
+# and the float arrays are stored as float32.
+INTEGER_ARRAY_DTYPES = dict(indices=np.uint32)
+
+
+def is_binary_mesh_file(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read(len(BINARY_MESH_MAGIC)) == BINARY_MESH_MAGIC
+    return False
+
+
+def align_offset(offset):
+    return (offset + BINARY_MESH_ALIGNMENT - 1) // BINARY_MESH_ALIGNMENT * BINARY_MESH_ALIGNMENT
+
+
+def to_numeric_array(value, key):
+    # the list of numbers or vectors to an array, otherwise None.
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, (list, tuple)) and 0 < len(value) and \
+            all(isinstance(x, (int, float, np.number, np.ndarray, list, tuple)) for x in value):
+        try:
+            array = np.array(value)
+        except ValueError:
+            return None
+    else:
+        return None
+
+    if array.dtype.kind not in 'fiub':
+        return None
+    dtype = INTEGER_ARRAY_DTYPES.get(key)
+    if dtype is not None:
+        return np.ascontiguousarray(array, dtype=dtype)
+    elif array.dtype.kind in 'iub':
+        # e.g. the bone indices
+        return np.ascontiguousarray(array)
+    return np.ascontiguousarray(array, dtype=np.float32)
+
+
+def save_binary_mesh(filepath, mesh_data):
+    arrays = []
+
+    def pack(value, key=''):
+        array = to_numeric_array(value, key)
+        if array is not None:
+            arrays.append(array)
+            return {'__array__': len(arrays) - 1}
+        elif isinstance(value, dict):
+            return {k: pack(v, k) for k, v in value.items()}
+        elif isinstance(value, (list, tuple)):
+            return [pack(x, key) for x in value]
+        elif isinstance(value, np.ndarray):
+            return pack(value.tolist(), key)
+        elif isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    structure = pack(mesh_data)
+
+    # block table, offsets are relative to the data section
+    blocks = []
+    offset = 0
+    for array in arrays:
+        offset = align_offset(offset)
+        blocks.append([offset, array.dtype.str, list(array.shape)])
+        offset += array.nbytes
+
+    header = json.dumps(dict(blocks=blocks, data=structure)).encode('utf-8')
+    data_offset = align_offset(BINARY_MESH_PREFIX_SIZE + len(header))
+
+    # the file is replaced at once, the memory maps of the loaded meshes still refer to the old file.
+    temp_filepath = filepath + '.tmp'
+    with open(temp_filepath, 'wb') as f:
+        f.write(BINARY_MESH_MAGIC)
+        f.write(struct.pack('<II', BINARY_MESH_VERSION, len(header)))
+        f.write(header)
+        for (block_offset, dtype, shape), array in zip(blocks, arrays):
+            f.seek(data_offset + block_offset)
+            f.write(array.tobytes())
+    os.replace(temp_filepath, filepath)
+
+
+def load_binary_mesh(filepath):
+    with open(filepath, 'rb') as f:
+        prefix = f.read(BINARY_MESH_PREFIX_SIZE)
+        if prefix[:len(BINARY_MESH_MAGIC)] != BINARY_MESH_MAGIC:
+            raise ValueError("%s is not a binary mesh file." % filepath)
+        version, header_size = struct.unpack('<II', prefix[len(BINARY_MESH_MAGIC):])
+        if version != BINARY_MESH_VERSION:
+            raise ValueError("%s has unsupported binary mesh version %d." % (filepath, version))
+        header = json.loads(f.read(header_size).decode('utf-8'))
+
+    data_offset = align_offset(BINARY_MESH_PREFIX_SIZE + header_size)
+    blocks = header['blocks']
+    arrays = []
+    with open(filepath, 'rb') as f:
+        for offset, dtype, shape in blocks:
+            dtype = np.dtype(dtype)
+            shape = tuple(shape)
+            count = int(np.prod(shape))
+            if 0 == count:
+                # the empty block can't be mapped, e.g. the empty geometry
+                arrays.append(np.zeros(shape, dtype=dtype))
+            elif USE_MEMORY_MAP:
+                # copy on write, the loaded arrays can be modified without touching the file.
+                arrays.append(np.memmap(filepath, dtype=dtype, mode='c', offset=data_offset + offset, shape=shape))
+            else:
+                f.seek(data_offset + offset)
+                arrays.append(np.fromfile(f, dtype=dtype, count=count).reshape(shape))
+
+    def unpack(value):
+        if isinstance(value, dict):
+            if '__array__' in value and 1 == len(value):
+                return arrays[value['__array__']]
+            return {k: unpack(v) for k, v in value.items()}
+        elif isinstance(value, list):
+            return [unpack(x) for x in value]
+        return value
+
+    return unpack(header['data'])
@@ -5,6 +5,7 @@ import io
 import re
 import traceback
 import copy
+import warnings
 from collections import OrderedDict
 
 import numpy as np
@@ -41,6 +42,24 @@ def convert_list(data, data_type=float, stride=1):
         return [data_list[i * stride:i * stride + stride] for i in range(int(len(data_list) / stride))]
 
 
+def convert_array(data, dtype=np.float64, stride=1):
+    # the bulk version of convert_list for the numeric arrays
+    array = None
+    if data:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                array = np.fromstring(data, dtype=dtype, sep=' ')
+        except (ValueError, DeprecationWarning):
+            array = np.array(convert_list(data, float if np.issubdtype(dtype, np.floating) else int), dtype=dtype)
+    else:
+        array = np.zeros(0, dtype=dtype)
+
+    if stride < 2:
+        return array
+    return array[:len(array) // stride * stride].reshape(-1, stride)
+
+
 def parsing_source_data(xml_element):
     """
     :param xml_element:
@@ -57,7 +76,10 @@ def parsing_source_data(xml_element):
             if xml_array is not None:
                 source_text = get_xml_text(xml_array)
                 if source_text:
-                    source_data = convert_list(source_text, data_type, stride)
+                    if data_type is float:
+                        source_data = convert_array(source_text, np.float64, stride)
+                    else:
+                        source_data = convert_list(source_text, data_type, stride)
                 break
         sources[source_id] = source_data
     return sources
@@ -173,7 +195,7 @@ class ColladaContoller:
             # parsing bind_shape_matrix
             bind_shape_matrix = get_xml_text(xml_skin.find('bind_shape_matrix'), None)
             if bind_shape_matrix:
-                self.bind_shape_matrix = np.array(convert_list(bind_shape_matrix), dtype=np.float32).reshape(4, 4)
+                self.bind_shape_matrix = convert_array(bind_shape_matrix, np.float32).reshape(4, 4)
             else:
                 self.bind_shape_matrix = Matrix4()
 
@@ -195,8 +217,8 @@ class ColladaContoller:
                 # parse vertex weights
                 vcount_text = get_xml_text(xml_vertex_weights.find('vcount'))
                 v_text = get_xml_text(xml_vertex_weights.find('v'))
-                vcount_list = convert_list(vcount_text, int)
-                v_list = convert_list(v_text, int)
+                vcount_list = convert_array(vcount_text, np.int64)
+                v_list = convert_array(v_text, np.int64)
 
                 # make geomtry data
                 self.build(sources, joins_semantics, weights_semantics, vcount_list, v_list)
@@ -206,29 +228,39 @@ class ColladaContoller:
         semantic_stride = len(weights_semantics)
         # build weights and indicies
         max_bone = 4  # max influence bone count per vertex
-        weight_source_id = weights_semantics['WEIGHT']['source']
-        weight_sources = sources[weight_source_id]
-        index = 0
-        for vcount in vcount_list:
-            bone_indicies = []
-            bone_weights = []
-            indicies = v_list[index: index + vcount * semantic_stride]
-            index += vcount * semantic_stride
-            for v in range(max_bone):
-                if 'JOINT' in weights_semantics:
-                    offset = weights_semantics['JOINT']['offset']
-                    if v < vcount:
-                        bone_indicies.append(indicies[offset + v * semantic_stride])
-                    else:
-                        bone_indicies.append(0)
-                if 'WEIGHT' in weights_semantics:
-                    offset = weights_semantics['WEIGHT']['offset']
-                    if v < vcount:
-                        bone_weights.append(weight_sources[indicies[offset + v * semantic_stride]])
-                    else:
-                        bone_weights.append(0.0)
-            self.bone_indicies.append(bone_indicies)
-            self.bone_weights.append(bone_weights)
+        vertex_count = len(vcount_list)
+        influence_count = int(np.sum(vcount_list))
+        influences = v_list[:influence_count * semantic_stride].reshape(-1, semantic_stride)
+        influence_vertices = np.repeat(np.arange(vertex_count), vcount_list)
+
+        if 'WEIGHT' in weights_semantics:
+            weight_sources = np.reshape(sources[weights_semantics['WEIGHT']['source']], -1)
+            weights = weight_sources[influences[:, weights_semantics['WEIGHT']['offset']]]
+        else:
+            weights = np.zeros(influence_count, dtype=np.float64)
+
+        # keep the largest weights of each vertex, in order of the source
+        order = np.lexsort((-weights, influence_vertices))
+        ranks = np.arange(influence_count) - (np.cumsum(vcount_list) - vcount_list)[influence_vertices[order]]
+        order = np.sort(order[ranks < max_bone])
+        vertices = influence_vertices[order]
+        kept_counts = np.minimum(vcount_list, max_bone)
+        ranks = np.arange(len(order)) - np.repeat(np.cumsum(kept_counts) - kept_counts, kept_counts)
+
+        bone_count = max_bone if 'JOINT' in weights_semantics else 0
+        self.bone_indicies = np.zeros((vertex_count, bone_count), dtype=np.float32)
+        if 'JOINT' in weights_semantics:
+            self.bone_indicies[vertices, ranks] = influences[order, weights_semantics['JOINT']['offset']]
+
+        bone_count = max_bone if 'WEIGHT' in weights_semantics else 0
+        self.bone_weights = np.zeros((vertex_count, bone_count), dtype=np.float32)
+        if 'WEIGHT' in weights_semantics:
+            self.bone_weights[vertices, ranks] = weights[order]
+            # the dropped weights are distributed to the others
+            over_influenced = max_bone < vcount_list
+            if np.any(over_influenced):
+                weight_sums = np.sum(self.bone_weights[over_influenced], axis=1, keepdims=True)
+                self.bone_weights[over_influenced] /= np.where(0.0 < weight_sums, weight_sums, 1.0)
         # joints
         if 'JOINT' in joins_semantics:
             joints_source = joins_semantics['JOINT'].get('source', '')
@@ -276,7 +308,8 @@ class ColladaAnimation:
 
         if 'OUTPUT' in joins_semantics:
             source_name = joins_semantics['OUTPUT'].get('source', '')
-            self.outputs = sources.get(source_name, [])
+            # the frames are replaced by the precomputed matrices, see Collada.get_animation_data
+            self.outputs = list(sources.get(source_name, []))
 
         if 'INTERPOLATION' in joins_semantics:
             source_name = joins_semantics['INTERPOLATION'].get('source', '')
@@ -359,34 +392,23 @@ class ColladaGeometry:
                     semantic_stride = len(semantics)
 
                     # parse polygon indices
-                    vertex_index_list = []  # flatten vertex list as triangle
                     if tag == 'triangles':
-                        vertex_index_list = get_xml_text(xml_polygons.find('p'))
-                        vertex_index_list = convert_list(vertex_index_list, int)
-                    elif tag == 'polylist' or tag == 'polygons':
-                        vcount_list = []
-                        polygon_index_list = []
+                        vertex_index_list = convert_array(get_xml_text(xml_polygons.find('p')), np.int64)
+                        vertex_index_list = vertex_index_list[:len(vertex_index_list) // semantic_stride * semantic_stride]
+                        vertex_index_list = vertex_index_list.reshape(-1, semantic_stride)
+                    else:
                         if tag == 'polylist':
-                            vcount_list = convert_list(get_xml_text(xml_polygons.find('vcount')), int)
-                            # flatten list
-                            polygon_index_list = convert_list(get_xml_text(xml_polygons.find('p')), int)
-                        elif tag == 'polygons':
-                            for xml_p in xml_polygons.findall('p'):
-                                polygon_indices = convert_list(get_xml_text(xml_p), int)
-                                # flatten list
-                                polygon_index_list += polygon_indices
-                                vcount_list.append(int(len(polygon_indices) / semantic_stride))
-                        # triangulate
-                        elapsed_vindex = 0
-                        for vcount in vcount_list:
-                            if vcount == 3:
-                                vertex_index_list += polygon_index_list[
-                                                     elapsed_vindex: elapsed_vindex + vcount * semantic_stride]
-                            else:
-                                polygon_indices = polygon_index_list[
-                                                  elapsed_vindex: elapsed_vindex + vcount * semantic_stride]
-                                vertex_index_list += convert_triangulate(polygon_indices, vcount, semantic_stride)
-                            elapsed_vindex += vcount * semantic_stride
+                            vcount_list = convert_array(get_xml_text(xml_polygons.find('vcount')), np.int64)
+                            polygon_index_list = convert_array(get_xml_text(xml_polygons.find('p')), np.int64)
+                        else:
+                            polygon_index_lists = [convert_array(get_xml_text(xml_p), np.int64) for xml_p in xml_polygons.findall('p')]
+                            vcount_list = np.array([len(polygon_indices) // semantic_stride for polygon_indices in polygon_index_lists], dtype=np.int64)
+                            polygon_index_lists = [polygon_indices[:len(polygon_indices) // semantic_stride * semantic_stride]
+                                                   for polygon_indices in polygon_index_lists]
+                            polygon_index_list = np.concatenate(polygon_index_lists) if polygon_index_lists else np.zeros(0, dtype=np.int64)
+                        polygon_vertices = polygon_index_list[:int(np.sum(vcount_list)) * semantic_stride].reshape(-1, semantic_stride)
+                        # triangulate, flatten vertex list as triangle
+                        vertex_index_list = polygon_vertices[triangulate_polygons(vcount_list).reshape(-1)]
                     # make geomtry data
                     self.build(sources, position_source_id, semantics, semantic_stride, vertex_index_list)
                     return  # done
@@ -401,39 +423,23 @@ class ColladaGeometry:
                     "Different count. vertex_count : %d, bone_weight_count : %d" % (vertex_count, bone_weight_count))
                 return
 
-        indexMap = {}
-        for i in range(int(len(vertex_index_list) / semantic_stride)):
-            vertIndices = tuple(vertex_index_list[i * semantic_stride: i * semantic_stride + semantic_stride])
-            if vertIndices in indexMap:
-                self.indices.append(indexMap[vertIndices])
-            else:
-                self.indices.append(len(indexMap))
-                indexMap[vertIndices] = len(indexMap)
-
-                if 'VERTEX' in semantics:
-                    source_id = position_source_id
-                    offset = semantics['VERTEX']['offset']
-                    posisiton = sources[source_id][vertIndices[offset]]
-                    self.positions.append(posisiton)
-                    if self.controller:
-                        self.bone_indicies.append(self.controller.bone_indicies[vertIndices[offset]])
-                        self.bone_weights.append(self.controller.bone_weights[vertIndices[offset]])
-
-                if 'NORMAL' in semantics:
-                    source_id = semantics['NORMAL']['source']
-                    offset = semantics['NORMAL']['offset']
-                    normal = sources[source_id][vertIndices[offset]]
-                    self.normals.append(normal)
-
-                if 'COLOR' in semantics:
-                    source_id = semantics['COLOR']['source']
-                    offset = semantics['COLOR']['offset']
-                    self.colors.append(sources[source_id][vertIndices[offset]])
-
-                if 'TEXCOORD' in semantics:
-                    source_id = semantics['TEXCOORD']['source']
-                    offset = semantics['TEXCOORD']['offset']
-                    self.texcoords.append(sources[source_id][vertIndices[offset]])
+        vertex_keys, self.indices = get_unique_vertices(vertex_index_list)
+
+        if 'VERTEX' in semantics:
+            vertex_indices = vertex_keys[:, semantics['VERTEX']['offset']]
+            self.positions = np.asarray(sources[position_source_id])[vertex_indices]
+            if self.controller:
+                self.bone_indicies = self.controller.bone_indicies[vertex_indices]
+                self.bone_weights = self.controller.bone_weights[vertex_indices]
+
+        if 'NORMAL' in semantics:
+            self.normals = np.asarray(sources[semantics['NORMAL']['source']])[vertex_keys[:, semantics['NORMAL']['offset']]]
+
+        if 'COLOR' in semantics:
+            self.colors = np.asarray(sources[semantics['COLOR']['source']])[vertex_keys[:, semantics['COLOR']['offset']]]
+
+        if 'TEXCOORD' in semantics:
+            self.texcoords = np.asarray(sources[semantics['TEXCOORD']['source']])[vertex_keys[:, semantics['TEXCOORD']['offset']]]
         self.valid = True
 
 
@@ -641,33 +647,30 @@ class Collada:
             geometry.bind_shape_matrix = swap_up_axis_matrix(geometry.bind_shape_matrix, True, False, self.up_axis)
 
             # precompute bind_shape_matrix
-            bound_min = Float3(FLOAT32_MAX, FLOAT32_MAX, FLOAT32_MAX)
-            bound_max = Float3(FLOAT32_MIN, FLOAT32_MIN, FLOAT32_MIN)
-            for i, position in enumerate(geometry.positions):
-                geometry.positions[i] = np.dot([position[0], position[1], position[2], 1.0], geometry.bind_shape_matrix)[:3]
-                position = geometry.positions[i]
-                for j in range(3):
-                    if bound_min[j] > position[j]:
-                        bound_min[j] = position[j]
-                    if bound_max[j] < position[j]:
-                        bound_max[j] = position[j]
-
-            for i, normal in enumerate(geometry.normals):
-                geometry.normals[i] = np.dot([normal[0], normal[1], normal[2], 0.0], geometry.bind_shape_matrix)[:3]
-                geometry.normals[i] = normalize(geometry.normals[i])
+            positions = np.reshape(np.asarray(geometry.positions, dtype=np.float64), (-1, 3))
+            positions = (np.dot(positions, geometry.bind_shape_matrix[:3, :3]) + geometry.bind_shape_matrix[3, :3]).astype(np.float32)
+            if 0 < len(positions):
+                bound_min = np.min(positions, axis=0)
+                bound_max = np.max(positions, axis=0)
+            else:
+                bound_min = Float3(FLOAT32_MAX, FLOAT32_MAX, FLOAT32_MAX)
+                bound_max = Float3(FLOAT32_MIN, FLOAT32_MIN, FLOAT32_MIN)
+
+            normals = np.reshape(np.asarray(geometry.normals, dtype=np.float64), (-1, 3))
+            normals = normalize_vectors(np.dot(normals, geometry.bind_shape_matrix[:3, :3])).astype(np.float32)
 
             geometry_data = dict(
                 name=geometry.name,
-                positions=copy.deepcopy(geometry.positions),
-                normals=copy.deepcopy(geometry.normals),
-                colors=copy.deepcopy(geometry.colors),
-                texcoords=copy.deepcopy(geometry.texcoords),
-                indices=copy.deepcopy(geometry.indices),
+                positions=positions,
+                normals=normals,
+                colors=np.asarray(geometry.colors, dtype=np.float32),
+                texcoords=np.asarray(geometry.texcoords, dtype=np.float32),
+                indices=np.asarray(geometry.indices, dtype=np.uint32),
                 skeleton_name=skeleton_name,
                 bone_indicies=copy.deepcopy(bone_indicies),
                 bone_weights=copy.deepcopy(bone_weights),
-                bound_min=copy.deepcopy(bound_min),
-                bound_max=copy.deepcopy(bound_max),
+                bound_min=bound_min,
+                bound_max=bound_max,
                 radius=length(bound_max - bound_min)
             )
 
@@ -0,0 +1,256 @@
+import heapq
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PyEngine3D.Common import logger
+
+
+class LOADING_STATE:
+    WAITING = 0
+    READING = 1
+    DECODING = 2
+    WAITING_DEPENDENCIES = 3
+    UPLOADING = 4
+    DONE = 5
+
+
+class LoadingRequest:
+    def __init__(self, resource_loader, resource, priority, order):
+        self.resource_loader = resource_loader
+        self.resource = resource
+        self.priority = priority
+        self.order = order
+        self.state = LOADING_STATE.WAITING
+        self.future = None
+        self.data = None
+        self.dependencies = []
+        self.callbacks = []
+
+    def __lt__(self, other):
+        return (self.priority, self.order) < (other.priority, other.order)
+
+    def get_key(self):
+        return self.resource_loader.resource_type_name, self.resource.name
+
+    def is_done(self):
+        return LOADING_STATE.DONE == self.state
+
+    def depends_on(self, other):
+        visited = set()
+        stack = list(self.dependencies)
+        while stack:
+            dependency = stack.pop()
+            if dependency is other:
+                return True
+            if id(dependency) not in visited:
+                visited.add(id(dependency))
+                stack.extend(dependency.dependencies)
+        return False
+
+
+# Asynchronous loading of the resources.
+#   read : file I/O and decompression on the loading threads, ResourceLoader.read_resource
+#   decode : cpu heavy decoding on the loading processes, ResourceLoader.get_decode_function
+#   upload : creating the resource and the GL objects on the main thread in the order of the priority and
+#            the dependencies, ResourceLoader.upload_resource. The upload time per frame is limited by the budget.
+# The lower priority value is loaded first.
+class ResourceLoadingService:
+    def __init__(self, resource_manager, thread_count=4, process_count=2, upload_time_budget=0.004, max_reading_count=16):
+        self.resource_manager = resource_manager
+        self.thread_count = thread_count
+        self.process_count = process_count
+        self.upload_time_budget = upload_time_budget
+        self.max_reading_count = max_reading_count
+        self.thread_pool = None
+        self.process_pool = None
+        self.request_order = 0
+        self.requests = {}
+        self.waiting_queue = []
+        self.reading_requests = []
+        self.dependency_requests = []
+        self.upload_queue = []
+
+    def initialize(self):
+        self.thread_pool = ThreadPoolExecutor(max_workers=self.thread_count, thread_name_prefix='ResourceLoading')
+
+    def close(self):
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=True, cancel_futures=True)
+            self.thread_pool = None
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True, cancel_futures=True)
+            self.process_pool = None
+        self.requests = {}
+        self.waiting_queue = []
+        self.reading_requests = []
+        self.dependency_requests = []
+        self.upload_queue = []
+
+    def get_process_pool(self):
+        if self.process_pool is None and 0 < self.process_count:
+            # do not fork the process which has the GL context.
+            self.process_pool = ProcessPoolExecutor(max_workers=self.process_count,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+        return self.process_pool
+
+    def is_loading(self):
+        return 0 < len(self.requests)
+
+    def get_loading_count(self):
+        return len(self.requests)
+
+    def get_request(self, resource_type_name, resource_name):
+        return self.requests.get((resource_type_name, resource_name))
+
+    def request(self, resource_type_name, resource_name, priority=0, callback=None, force=False):
+        resource_loader = self.resource_manager.find_resource_loader(resource_type_name)
+        resource = resource_loader.get_resource(resource_name, noWarn=True) if resource_loader is not None else None
+        if resource is None:
+            logger.error("Failed to request loading %s : %s" % (resource_type_name, resource_name))
+            return None
+
+        request = self.requests.get((resource_loader.resource_type_name, resource.name))
+        if request is not None:
+            if priority < request.priority:
+                request.priority = priority
+                heapq.heapify(self.waiting_queue)
+                heapq.heapify(self.upload_queue)
+            if callback is not None:
+                request.callbacks.append(callback)
+            return request
+
+        if not force and not resource.is_need_to_load():
+            if callback is not None:
+                callback(resource.data)
+            return None
+
+        request = LoadingRequest(resource_loader, resource, priority, self.request_order)
+        self.request_order += 1
+        if callback is not None:
+            request.callbacks.append(callback)
+        self.requests[request.get_key()] = request
+        heapq.heappush(self.waiting_queue, request)
+        return request
+
+    def update(self):
+        if not self.requests:
+            return
+        self.submit_requests()
+        self.gather_requests()
+        self.resolve_dependencies()
+        self.upload_requests()
+
+    def flush(self):
+        # load all the requests right now, e.g. before the first frame.
+        while self.requests:
+            self.submit_requests()
+            self.gather_requests(wait=True)
+            self.resolve_dependencies()
+            self.upload_requests(time_budget=None)
+            if not self.waiting_queue and not self.reading_requests:
+                self.resolve_dependencies()
+                if not self.upload_queue and self.dependency_requests:
+                    # nothing can be loaded anymore, upload the stuck requests anyway.
+                    for request in self.dependency_requests:
+                        logger.error('Dependencies of %s : %s are never loaded.' % request.get_key())
+                        request.state = LOADING_STATE.UPLOADING
+                        heapq.heappush(self.upload_queue, request)
+                    self.dependency_requests = []
+
+    def submit_requests(self):
+        while self.waiting_queue and len(self.reading_requests) < self.max_reading_count:
+            request = heapq.heappop(self.waiting_queue)
+            request.state = LOADING_STATE.READING
+            request.future = self.thread_pool.submit(request.resource_loader.read_resource, request.resource)
+            self.reading_requests.append(request)
+
+    def gather_requests(self, wait=False):
+        reading_requests = []
+        for request in self.reading_requests:
+            if not request.future.done() and not (wait and request is self.reading_requests[0]):
+                reading_requests.append(request)
+                continue
+
+            try:
+                data = request.future.result()
+            except BrokenProcessPool:
+                # decode on the loading threads from now on.
+                logger.error(traceback.format_exc())
+                self.process_pool = None
+                self.process_count = 0
+                data = None
+            except:
+                logger.error(traceback.format_exc())
+                data = None
+            request.future = None
+
+            if LOADING_STATE.READING == request.state and data is not None:
+                decode_function = request.resource_loader.get_decode_function(request.resource, data)
+                if decode_function is not None:
+                    pool = self.get_process_pool() or self.thread_pool
+                    request.state = LOADING_STATE.DECODING
+                    request.future = pool.submit(decode_function, data)
+                    reading_requests.append(request)
+                    continue
+
+            # None means the resource loader has nothing to read, it will be loaded on the main thread.
+            request.data = data
+            request.state = LOADING_STATE.WAITING_DEPENDENCIES
+            dependencies = request.resource_loader.get_resource_dependencies(request.resource, data)
+            for resource_type_name, resource_name in dependencies:
+                dependency = self.request(resource_type_name, resource_name, priority=request.priority)
+                if dependency is None or dependency is request:
+                    continue
+                if dependency.depends_on(request):
+                    # A -> B -> A never finishes, the one which is read later doesn't wait.
+                    logger.error('Circular dependency between %s : %s and %s : %s' %
+                                 (request.get_key() + dependency.get_key()))
+                    continue
+                request.dependencies.append(dependency)
+            self.dependency_requests.append(request)
+        self.reading_requests = reading_requests
+
+    def resolve_dependencies(self):
+        dependency_requests = []
+        for request in self.dependency_requests:
+            if all(dependency.is_done() for dependency in request.dependencies):
+                request.state = LOADING_STATE.UPLOADING
+                heapq.heappush(self.upload_queue, request)
+            else:
+                dependency_requests.append(request)
+        self.dependency_requests = dependency_requests
+
+    def upload_requests(self, time_budget=-1.0):
+        if time_budget is not None and time_budget < 0.0:
+            time_budget = self.upload_time_budget
+
+        start_time = time.perf_counter()
+        while self.upload_queue:
+            request = heapq.heappop(self.upload_queue)
+            self.upload_request(request)
+            if time_budget is not None and time_budget < (time.perf_counter() - start_time):
+                break
+
+    def upload_request(self, request):
+        resource_loader = request.resource_loader
+        resource = request.resource
+        try:
+            if request.data is None:
+                resource_loader.load_resource(resource.name)
+            elif not resource_loader.upload_resource(resource, request.data):
+                logger.error('%s failed to load %s' % (resource_loader.name, resource.name))
+        except:
+            logger.error(traceback.format_exc())
+
+        request.state = LOADING_STATE.DONE
+        request.data = None
+        self.requests.pop(request.get_key(), None)
+
+        for callback in request.callbacks:
+            try:
+                callback(resource.data)
+            except:
+                logger.error(traceback.format_exc())
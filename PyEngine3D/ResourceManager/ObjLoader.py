@@ -1,5 +1,6 @@
-import copy
 import os, traceback
+import re
+import warnings
 from collections import OrderedDict
 
 import numpy as np
@@ -12,151 +13,342 @@ defaultTexCoord = [0.0, 0.0]
 defaultNormal = [0.0, 1.0, 0.0]
 
 
+OBJ_CHUNK_SIZE = 1 << 23
+
+RECORD_NONE = 0
+RECORD_POSITION = 1
+RECORD_TEXCOORD = 2
+RECORD_NORMAL = 3
+RECORD_FACE = 4
+RECORD_SMOOTH = 5
+RECORD_OTHER = 6
+
+PREFIX_TOKENS = [b'v', b'vt', b'vn', b'f']
+VALUE_TRANSLATE_TABLE = bytes.maketrans(b'vtn', b'   ')
+FACE_TRANSLATE_TABLE = bytes.maketrans(b'f/', b'  ')
+WHITE_SPACE_TRANSLATE_TABLE = bytes.maketrans(b'\t\r\f\v', b'    ')
+
+
 class MeshObject:
     def __init__(self, default_name):
         self.name = default_name
         self.group_name = ''
         self.mtl_name = ''
+        # arrays of the triangles, shape is (triangle count, 3, 3), the last axis is (position, normal, texcoord) index
+        # the omitted normal or texcoord index is -1
         self.indices = []
 
 
+def read_lines_in_chunk(filename, chunk_size=OBJ_CHUNK_SIZE):
+    # yields the large blocks of the whole lines, the blocks end with a new line.
+    with open(filename, 'rb') as f:
+        remain = b''
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                if remain:
+                    yield remain + b'\n'
+                break
+            data = remain + data
+            last_line_end = data.rfind(b'\n')
+            if last_line_end < 0:
+                remain = data
+                continue
+            remain = data[last_line_end + 1:]
+            yield data[:last_line_end + 1]
+
+
+def get_token_infos(data):
+    # The lines of data are separated by single new line and have no leading spaces.
+    # returns the bytes array, the mask of the token starts and the token count of each line.
+    data_array = np.frombuffer(data, dtype=np.uint8)
+    line_ends = data_array == 10
+    is_separator = np.logical_or(data_array == 32, line_ends)
+    token_starts = np.logical_not(is_separator)
+    token_starts[1:] &= is_separator[:-1]
+    line_ids = np.zeros(len(data_array), dtype=np.int32)
+    np.cumsum(line_ends[:-1], out=line_ids[1:], dtype=np.int32)
+    token_counts = np.bincount(line_ids[token_starts], minlength=int(np.count_nonzero(line_ends)))
+    return data_array, token_starts, token_counts
+
+
+def parse_numbers(data, number_count, translate_table, dtype):
+    # The C parser of numpy is much faster than the conversion of the split tokens.
+    # The prefix letters are removed by the translate table, so the tokens like nan, inf go to the slow path.
+    if number_count == 0:
+        return np.zeros(0, dtype=dtype)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            numbers = np.fromstring(data.translate(translate_table), dtype=dtype, sep=' ')
+    except (ValueError, DeprecationWarning):
+        numbers = None
+    if numbers is None or len(numbers) != number_count:
+        tokens = np.array(data.replace(b'/', b' ').split())
+        numbers = tokens[np.logical_not(np.isin(tokens, PREFIX_TOKENS))].astype(dtype)
+    return numbers
+
+
+def parse_values(data, value_count):
+    # parse the first value_count values after the prefix of the lines,
+    # returns the values of the lines which have the enough values and the mask of the lines.
+    data_array, token_starts, token_counts = get_token_infos(data)
+    value_counts = token_counts - 1
+    values = parse_numbers(data, int(np.sum(value_counts)), VALUE_TRANSLATE_TABLE, np.float64)
+    valid = value_count <= value_counts
+    if np.all(value_counts == value_count):
+        return values.reshape(-1, value_count), valid
+    first_value_indices = np.cumsum(value_counts) - value_counts
+    value_indices = first_value_indices[valid][:, np.newaxis] + np.arange(value_count)
+    return values[value_indices], valid
+
+
+def parse_faces(data):
+    # returns the index triples (position, texcoord, normal) of the face vertices and the vertex count of the faces.
+    # the omitted index is 0, and the indices are not converted to zero based yet.
+    data = data.replace(b'//', b'/0/')
+    data = re.sub(rb'/(?=[ \n])', b'/0', data)
+    data_array, token_starts, token_counts = get_token_infos(data)
+    token_ids = np.cumsum(token_starts, dtype=np.int32) - 1
+    component_counts = np.bincount(token_ids[data_array == 47], minlength=int(np.count_nonzero(token_starts))) + 1
+
+    # skip the prefix token of the lines
+    is_vertex_token = np.ones(len(component_counts), dtype=np.bool_)
+    is_vertex_token[np.cumsum(token_counts) - token_counts] = False
+    component_counts = np.where(is_vertex_token, component_counts, 0)
+
+    values = parse_numbers(data, int(np.sum(component_counts)), FACE_TRANSLATE_TABLE, np.int64)
+    value_offsets = (np.cumsum(component_counts) - component_counts)[is_vertex_token]
+    component_counts = component_counts[is_vertex_token]
+    vertex_indices = np.zeros((len(component_counts), 3), dtype=np.int64)
+    for i in range(3):
+        has_component = i < component_counts
+        vertex_indices[has_component, i] = values[value_offsets[has_component] + i]
+    return vertex_indices, token_counts - 1
+
+
+def get_vertex_attributes(values, keys, default_value):
+    # the omitted attributes, their keys are -1 or out of the values, are the default value.
+    # returns the attributes and the mask of the vertices which have the value.
+    attributes = np.empty((len(keys), len(default_value)), dtype=np.float32)
+    attributes[...] = default_value
+    has_value = np.logical_and(0 <= keys, keys < len(values))
+    attributes[has_value] = values[keys[has_value]]
+    return attributes, has_value
+
+
+def compute_vertex_normals(positions, position_indices, indices):
+    # the area weighted normals of the triangles are accumulated on the positions, so the vertices are smooth shaded.
+    triangles = np.reshape(indices, (-1, 3))
+    p0, p1, p2 = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+    face_normals = np.cross(p1 - p0, p2 - p0)
+    position_normals = np.zeros((int(np.max(position_indices)) + 1, 3), dtype=np.float64)
+    for i in range(3):
+        np.add.at(position_normals, position_indices[triangles[:, i]], face_normals)
+    normals = normalize_vectors(position_normals[position_indices]).astype(np.float32)
+    # the degenerated triangles have no normal
+    normals[np.all(0.0 == normals, axis=1)] = defaultNormal
+    return normals
+
+
 class OBJ:
     def __init__(self, filename, scale, swapyz):
         """
         Loads a wavefront OBJ file.
+        The file is read in the large chunks and the records of v, vt, vn, f are decoded into the numpy arrays.
         """
         self.meshes = []
-        self.positions = []
-        self.normals = []
-        self.texcoords = []
+        self.positions = np.zeros((0, 3), dtype=np.float64)
+        self.normals = np.zeros((0, 3), dtype=np.float64)
+        self.texcoords = np.zeros((0, 2), dtype=np.float64)
         self.glList = None
         self.filename = filename
 
+        self.scale = scale
+        self.default_name = ''
+        self.prev_record = RECORD_NONE
+        self.position_chunks = []
+        self.normal_chunks = []
+        self.texcoord_chunks = []
+        self.position_count = 0
+        self.normal_count = 0
+        self.texcoord_count = 0
+
         # check is exist file
         if os.path.exists(filename):
             # load OBJ file
-            default_name = os.path.splitext(os.path.split(filename)[-1])[0]
-            preFix = None
-            mesh_object = None
-            for line in open(filename, "r"):
-                # is comment?
-                line = line.strip()
-                if line == '' or line.startswith('#'):
-                    continue
-
-                values = [value.strip() for value in line.split()]
-                if len(values) < 2:
-                    continue
-
-                # start to paring a new mesh.
-                if mesh_object is None or (preFix == 'f' and values[0] not in ('f', 's')):
-                    mesh_object = MeshObject(default_name)
-                    self.meshes.append(mesh_object)
-
-                # first strings
-                preFix = values[0]
-                values = values[1:]
-
-                if preFix == 'o':
-                    mesh_object.name = ' '.join(values)
-                elif preFix == 'g':
-                    mesh_object.group_name = ' '.join(values)
-                    if mesh_object.name == '':
-                        mesh_object.name = mesh_object.group_name
-                elif preFix == 'mtllib':
-                    # TODO : Parsing mtllib
-                    pass
-                # vertex position
-                elif preFix == 'v' and len(values) >= 3:
-                    # apply scale
-                    self.positions.append(list(map(lambda x: float(x) * scale, values[:3])))
-                # vertex normal
-                elif preFix == 'vn' and len(values) >= 3:
-                    self.normals.append(list(map(float, values[:3])))
-                # texture coordinate
-                elif preFix == 'vt' and len(values) >= 2:
-                    self.texcoords.append(list(map(float, values[:2])))
-                # material name
-                elif preFix in ('usemtl', 'usemat'):
-                    mesh_object.material = ' '.join(values)
-                    if mesh_object.name == '':
-                        mesh_object.name = mesh_object.material
-                # faces
-                elif preFix == 'f':
-                    pos_indices = []
-                    normal_indices = []
-                    tex_indices = []
-
-                    # If texcoord is empty, add the default texcoord.
-                    if len(self.texcoords) < 1:
-                        self.texcoords.append(copy.copy(defaultTexCoord))
-                    # If normal is empty, add the default normal.
-                    if len(self.normals) < 1:
-                        self.normals.append(copy.copy(defaultNormal))
-
-                    # parsing index data
-                    for indices in values:
-                        pos_index, tex_index, normal_index = list(
-                            map(lambda x: int(x) - 1 if x else 0, indices.split('/')))
-                        # insert vertex, texcoord, normal index
-                        pos_indices.append(pos_index)
-                        tex_indices.append(tex_index)
-                        normal_indices.append(normal_index)
-
-                    # append face list
-                    if len(pos_indices) == 3:
-                        mesh_object.indices.append((pos_indices, normal_indices, tex_indices))
-                    # Quad to Two Triangles.
-                    elif len(pos_indices) == 4:
-                        mesh_object.indices.append((pos_indices[:3], normal_indices[:3], tex_indices[:3]))
-                        mesh_object.indices.append(([pos_indices[2], pos_indices[3], pos_indices[0]],
-                                                    [normal_indices[2], normal_indices[3], normal_indices[0]],
-                                                    [tex_indices[2], tex_indices[3], tex_indices[0]]))
+            self.default_name = os.path.splitext(os.path.split(filename)[-1])[0]
+            for data in read_lines_in_chunk(filename):
+                self.parse_chunk(data)
+
+            if self.position_chunks:
+                self.positions = np.concatenate(self.position_chunks)
+            if self.normal_chunks:
+                self.normals = np.concatenate(self.normal_chunks)
+            if self.texcoord_chunks:
+                self.texcoords = np.concatenate(self.texcoord_chunks)
+            self.position_chunks = []
+            self.normal_chunks = []
+            self.texcoord_chunks = []
+
+    def parse_chunk(self, data):
+        # strip the lines
+        data = data.translate(WHITE_SPACE_TRANSLATE_TABLE)
+        if b' \n' in data:
+            data = re.sub(rb' +\n', b'\n', data)
+        if b'\n ' in data:
+            data = re.sub(rb'\n +', b'\n', data)
+        data = data.lstrip(b' ')
+        if data == b'':
+            return
+
+        data_array = np.frombuffer(data, dtype=np.uint8)
+        line_ends = np.flatnonzero(data_array == 10)
+        line_starts = np.concatenate([[0], line_ends[:-1] + 1])
+        padded_data = np.concatenate([data_array, np.zeros(2, dtype=np.uint8)])
+        c0 = padded_data[line_starts]
+        c1 = padded_data[line_starts + 1]
+        c2 = padded_data[line_starts + 2]
+
+        records = np.zeros(len(line_starts), dtype=np.int8)
+        records[np.logical_and(c0 == ord('v'), c1 == 32)] = RECORD_POSITION
+        records[(c0 == ord('v')) & (c1 == ord('t')) & (c2 == 32)] = RECORD_TEXCOORD
+        records[(c0 == ord('v')) & (c1 == ord('n')) & (c2 == 32)] = RECORD_NORMAL
+        records[np.logical_and(c0 == ord('f'), c1 == 32)] = RECORD_FACE
+
+        # the other records are few, parse them line by line.
+        other_lines = {}
+        for line_index in np.flatnonzero((records == RECORD_NONE) & (c0 != 10) & (c0 != ord('#'))):
+            values = data[line_starts[line_index]:line_ends[line_index]].decode('utf-8', 'replace').split()
+            if len(values) < 2:
+                continue
+            other_lines[line_index] = values
+            records[line_index] = RECORD_SMOOTH if values[0] == 's' else RECORD_OTHER
+
+        # start to paring a new mesh after the faces.
+        record_lines = np.flatnonzero(records)
+        if 0 == len(record_lines):
+            return
+        line_records = records[record_lines]
+        prev_records = np.concatenate([[self.prev_record], line_records[:-1]])
+        new_meshes = (prev_records == RECORD_FACE) & (line_records != RECORD_FACE) & (line_records != RECORD_SMOOTH)
+        if 0 == len(self.meshes):
+            new_meshes[0] = True
+        mesh_ids = np.cumsum(new_meshes) + (len(self.meshes) - 1)
+        for i in range(int(np.count_nonzero(new_meshes))):
+            self.meshes.append(MeshObject(self.default_name))
+        self.prev_record = line_records[-1]
+
+        line_mesh_ids = np.zeros(len(records), dtype=np.int64)
+        line_mesh_ids[record_lines] = mesh_ids
+        for line_index, values in other_lines.items():
+            mesh_object = self.meshes[line_mesh_ids[line_index]]
+            preFix = values[0]
+            values = values[1:]
+            if preFix == 'o':
+                mesh_object.name = ' '.join(values)
+            elif preFix == 'g':
+                mesh_object.group_name = ' '.join(values)
+                if mesh_object.name == '':
+                    mesh_object.name = mesh_object.group_name
+            elif preFix == 'mtllib':
+                # TODO : Parsing mtllib
+                pass
+            elif preFix in ('usemtl', 'usemat'):
+                mesh_object.material = ' '.join(values)
+                if mesh_object.name == '':
+                    mesh_object.name = mesh_object.material
+
+        def get_lines(record):
+            lines = np.flatnonzero(records == record)
+            line_bytes = np.zeros(len(records), dtype=np.bool_)
+            line_bytes[lines] = True
+            line_bytes = np.repeat(line_bytes, line_ends - line_starts + 1)
+            return lines, data_array[line_bytes].tobytes()
+
+        # the record counts before each line, to resolve the relative indices.
+        def get_record_counts(lines, valid, count):
+            counts = np.zeros(len(records) + 1, dtype=np.int64)
+            counts[lines[valid] + 1] = 1
+            return np.cumsum(counts)[:-1] + count
+
+        position_lines, position_data = get_lines(RECORD_POSITION)
+        texcoord_lines, texcoord_data = get_lines(RECORD_TEXCOORD)
+        normal_lines, normal_data = get_lines(RECORD_NORMAL)
+        positions, valid_positions = parse_values(position_data, 3)
+        texcoords, valid_texcoords = parse_values(texcoord_data, 2)
+        normals, valid_normals = parse_values(normal_data, 3)
+
+        face_lines = np.flatnonzero(records == RECORD_FACE)
+        position_counts = get_record_counts(position_lines, valid_positions, self.position_count)
+        texcoord_counts = get_record_counts(texcoord_lines, valid_texcoords, self.texcoord_count)
+        normal_counts = get_record_counts(normal_lines, valid_normals, self.normal_count)
+
+        # apply scale
+        self.position_chunks.append(positions * self.scale)
+        self.texcoord_chunks.append(texcoords)
+        self.normal_chunks.append(normals)
+        self.position_count += len(positions)
+        self.texcoord_count += len(texcoords)
+        self.normal_count += len(normals)
+
+        if 0 == len(face_lines):
+            return
+
+        # faces
+        vertex_indices, vertex_counts = parse_faces(get_lines(RECORD_FACE)[1])
+        face_vertex_lines = np.repeat(face_lines, vertex_counts)
+        for i, record_counts in enumerate((position_counts, texcoord_counts, normal_counts)):
+            indices = vertex_indices[:, i]
+            # convert to the zero based index, the negative index is relative to the end of the records.
+            # the omitted index is -1, the default texcoord or the computed normal is used for it.
+            vertex_indices[:, i] = np.where(0 < indices, indices - 1,
+                                            np.where(indices < 0, record_counts[face_vertex_lines] + indices, -1))
+
+        # triangle and quad to two triangles, the other polygons are ignored.
+        triangle_counts = np.where(vertex_counts == 3, 1, np.where(vertex_counts == 4, 2, 0))
+        face_ids = np.repeat(np.arange(len(vertex_counts)), triangle_counts)
+        second_triangles = np.arange(len(face_ids)) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts)
+        corner_offsets = np.where(second_triangles[:, np.newaxis] == 1, [2, 3, 0], [0, 1, 2])
+        corners = (np.cumsum(vertex_counts) - vertex_counts)[face_ids][:, np.newaxis] + corner_offsets
+        # (position, normal, texcoord)
+        triangles = vertex_indices[corners][..., [0, 2, 1]]
+
+        if 0 == len(triangles):
+            return
+        triangle_mesh_ids = line_mesh_ids[face_lines][face_ids]
+        boundaries = np.flatnonzero(np.diff(triangle_mesh_ids)) + 1
+        for mesh_id, mesh_triangles in zip(triangle_mesh_ids[np.concatenate([[0], boundaries])], np.split(triangles, boundaries)):
+            if 0 < len(mesh_triangles):
+                self.meshes[mesh_id].indices.append(mesh_triangles)
 
     def get_geometry_data(self):
         geometry_datas = []
         for mesh in self.meshes:
-            positions = []
-            normals = []
-            texcoords = []
-            indices = []
-
-            indexMap = {}
-
-            bound_min = Float3(FLOAT32_MAX, FLOAT32_MAX, FLOAT32_MAX)
-            bound_max = Float3(FLOAT32_MIN, FLOAT32_MIN, FLOAT32_MIN)
-            for n, mesh_indices in enumerate(mesh.indices):
-                # exclude material
-                postionIndicies, normalIndicies, texcoordIndicies = mesh_indices
-                for i in range(len(postionIndicies)):
-                    index_key = (postionIndicies[i], normalIndicies[i], texcoordIndicies[i])
-                    if index_key in indexMap:
-                        indices.append(indexMap[index_key])
-                    else:
-                        indices.append(len(indexMap))
-                        indexMap[index_key] = len(indexMap)
-                        positions.append(self.positions[postionIndicies[i]])
-                        normals.append(self.normals[normalIndicies[i]])
-                        texcoords.append(self.texcoords[texcoordIndicies[i]])
-                        # bounding box
-                        position = positions[-1]
-                        for j in range(3):
-                            if bound_min[j] > position[j]:
-                                bound_min[j] = position[j]
-                            if bound_max[j] < position[j]:
-                                bound_max[j] = position[j]
-
-            if len(positions) == 0:
+            if 0 == len(mesh.indices):
                 logger.info('%s has a empty mesh. %s' % (self.filename, mesh.name))
                 continue
 
+            # deduplicate the vertices, the new indices are in order of the first appearance.
+            vertex_keys, indices = get_unique_vertices(np.concatenate(mesh.indices).reshape(-1, 3))
+
+            positions = self.positions[vertex_keys[:, 0]].astype(np.float32)
+            normals, has_normals = get_vertex_attributes(self.normals, vertex_keys[:, 1], defaultNormal)
+            texcoords = get_vertex_attributes(self.texcoords, vertex_keys[:, 2], defaultTexCoord)[0]
+            no_normals = np.logical_not(has_normals)
+            if np.any(no_normals):
+                vertex_normals = compute_vertex_normals(positions, vertex_keys[:, 0], indices)
+                normals[no_normals] = vertex_normals[no_normals]
+            bound_min = np.min(positions, axis=0)
+            bound_max = np.max(positions, axis=0)
+
             geometry_data = dict(name=mesh.name,
-                                 positions=copy.deepcopy(positions),
-                                 normals=copy.deepcopy(normals),
-                                 texcoords=copy.deepcopy(texcoords),
-                                 indices=copy.deepcopy(indices),
-                                 bound_min=copy.deepcopy(bound_min),
-                                 bound_max=copy.deepcopy(bound_max),
+                                 positions=positions,
+                                 normals=normals,
+                                 texcoords=texcoords,
+                                 indices=indices,
+                                 bound_min=bound_min,
+                                 bound_max=bound_max,
                                  radius=length(bound_max - bound_min))
             geometry_datas.append(geometry_data)
         return geometry_datas
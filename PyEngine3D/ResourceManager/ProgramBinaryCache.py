@@ -0,0 +1,89 @@
+import hashlib
+import os
+import struct
+import traceback
+
+from PyEngine3D.Common import logger
+from PyEngine3D.Utilities import check_directory_and_mkdir, get_modify_time_of_file
+
+
+# Content addressed cache of the linked program binaries.
+# The key is the hash of the preprocessed shader codes, the macros and the GL vendor, renderer and version,
+# so a program binary is shared by the materials which have same codes, and it is never used on the other driver.
+#   file : binary format(uint32) | binary data
+class ProgramBinaryCache:
+    def __init__(self):
+        self.cache_path = ''
+        self.driver_string = ''
+        self.file_hashes = {}  # { filepath : (modify time, hash) }
+
+    def initialize(self, cache_path, driver_string):
+        self.cache_path = cache_path
+        self.driver_string = driver_string
+        check_directory_and_mkdir(self.cache_path)
+
+    def get_file_hash(self, filepath):
+        # the hash is computed once per modify time, the same include files are shared by the most materials.
+        modify_time = get_modify_time_of_file(filepath)
+        file_hash = self.file_hashes.get(filepath)
+        if file_hash is not None and file_hash[0] == modify_time:
+            return file_hash[1]
+
+        if not os.path.exists(filepath):
+            return ''
+
+        with open(filepath, 'rb') as f:
+            file_hash = hashlib.sha1(f.read()).hexdigest()
+        self.file_hashes[filepath] = (modify_time, file_hash)
+        return file_hash
+
+    def get_file_hashes(self, filepaths):
+        return {filepath: self.get_file_hash(filepath) for filepath in filepaths}
+
+    def is_file_changed(self, file_hashes):
+        for filepath in file_hashes:
+            if file_hashes[filepath] != self.get_file_hash(filepath):
+                return True
+        return False
+
+    @staticmethod
+    def get_source_hash(shader_codes, macros):
+        source_hash = hashlib.sha1()
+        for macro in sorted(macros):
+            source_hash.update(("%s=%s;" % (macro, macros[macro])).encode('utf-8'))
+        for shader_type in sorted(shader_codes, key=int):
+            source_hash.update(("%d:" % int(shader_type)).encode('utf-8'))
+            source_hash.update(shader_codes[shader_type].encode('utf-8'))
+        return source_hash.hexdigest()
+
+    def get_cache_filepath(self, source_hash):
+        key = hashlib.sha1((self.driver_string + source_hash).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_path, key + '.bin')
+
+    def load_program_binary(self, source_hash):
+        filepath = self.get_cache_filepath(source_hash)
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, 'rb') as f:
+                    binary_format = struct.unpack('<I', f.read(4))[0]
+                    binary_data = f.read()
+                return binary_format, binary_data
+            except:
+                logger.error(traceback.format_exc())
+        return None, None
+
+    def save_program_binary(self, source_hash, binary_format, binary_data):
+        if binary_format is None or binary_data is None:
+            return
+        filepath = self.get_cache_filepath(source_hash)
+        try:
+            with open(filepath, 'wb') as f:
+                f.write(struct.pack('<I', getattr(binary_format, 'value', binary_format)))
+                f.write(binary_data)
+        except:
+            logger.error(traceback.format_exc())
+
+    def delete_program_binary(self, source_hash):
+        filepath = self.get_cache_filepath(source_hash)
+        if os.path.exists(filepath):
+            os.remove(filepath)
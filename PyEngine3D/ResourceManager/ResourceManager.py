@@ -2,6 +2,7 @@ import codecs
 import configparser
 import copy
 import datetime
+import functools
 import glob
 import gzip
 import importlib
@@ -9,7 +10,6 @@ import math
 import os
 import pickle
 import pprint
-import queue
 import re
 import shutil
 import sys
@@ -22,7 +22,6 @@ from collections import OrderedDict
 from ctypes import *
 from distutils.dir_util import copy_tree
 from importlib.machinery import SourceFileLoader
-from threading import Thread
 
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import numpy as np
@@ -30,47 +29,25 @@ from numpy import array, float32, uint8
 from OpenGL.GL import *
 
 from PyEngine3D.Common import *
+from PyEngine3D.Render import RenderInfoCache
 from PyEngine3D.Render import MaterialInstance, Triangle, Quad, Cube, Plane, Mesh, Model, Font
 from PyEngine3D.Render import CreateProceduralTexture, NoiseTexture3D, CloudTexture3D, VectorFieldTexture3D
 from PyEngine3D.Render import EffectInfo, ParticleInfo
 from PyEngine3D.Render import FontData
 from PyEngine3D.Render import SplinePoint, SplineData
 from PyEngine3D.Render.Ocean.Constants import GRID_VERTEX_COUNT
-from PyEngine3D.OpenGLContext import CreateTexture, Material, Texture2D, Texture2DArray, Texture3D, TextureCube
+from PyEngine3D.OpenGLContext import OpenGLContext, CreateTexture, Material, Texture2D, Texture2DArray, Texture3D, TextureCube
+from PyEngine3D.OpenGLContext import TextureStreamingManager
 from PyEngine3D.OpenGLContext import Shader, ShaderCompileOption, ShaderCompileMessage, default_compile_option
 from PyEngine3D.OpenGLContext import parsing_macros, parsing_uniforms, parsing_material_components
 from PyEngine3D.Utilities import Attributes, Singleton, Config, Logger, Profiler, Float3
 from PyEngine3D.Utilities import GetClassName, is_gz_compressed_file, check_directory_and_mkdir, get_modify_time_of_file
+from PyEngine3D.Utilities import TANGENT_MODE_AREA_WEIGHTED
+from PyEngine3D.Utilities import cook_texture, is_cooked_texture_file, save_cooked_texture, load_cooked_texture
 from . import Collada, OBJ, loadDDS, generate_font_data, TextureGenerator
-
-
-class LoadingThread(Thread):
-    def __init__(self, resource_manager):
-        Thread.__init__(self)
-        self.resource_manager = resource_manager
-        self.running = True
-        self.loading_queue = queue.Queue()
-        self.complete_queue = queue.Queue()
-
-    def push_loading(self, resource_name):
-        self.loading_queue.put(resource_name)
-
-    def run(self):
-        while self.running:
-            time.sleep(0.001)
-
-            if not self.loading_queue.empty():
-                resource_name = self.loading_queue.get()
-                resource = self.resource_manager.mesh_loader.get_resource(resource_name)
-                data = self.resource_manager.mesh_loader.load_resource_data(resource)
-                if data is not None:
-                    self.complete_queue.put((resource_name, data))
-
-    def set_data(self):
-        while not self.complete_queue.empty():
-            resource_name, data = self.complete_queue.get()
-            resource = self.resource_manager.mesh_loader.get_resource(resource_name)
-            resource.set_data(data)
+from . import is_binary_mesh_file, save_binary_mesh, load_binary_mesh
+from .LoadingService import ResourceLoadingService
+from .ProgramBinaryCache import ProgramBinaryCache
 
 
 # -----------------------#
@@ -202,6 +179,8 @@ class Resource:
                 self.data = data
             else:
                 self.data.__dict__ = data.__dict__
+                # the retained render infos which refer to the reloaded mesh, model or material are recreated.
+                RenderInfoCache.invalidate(self.data)
 
         # Notify that data has been loaded.
         ResourceManager.instance().core_manager.send_resource_info(self.get_resource_info())
@@ -487,6 +466,23 @@ class ResourceLoader(object):
     def load_resource(self, resource_name):
         logger.warn("load_resource is not implemented in %s." % self.name)
 
+    # The asynchronous loading steps, see ResourceLoadingService.
+    # read_resource runs on the loading threads, so it must not call GL or touch the other resources.
+    # None means that the resource is loaded by load_resource on the main thread.
+    def read_resource(self, resource):
+        return None
+
+    def get_decode_function(self, resource, resource_data):
+        # a picklable function which decodes the read data on the loading processes.
+        return None
+
+    def get_resource_dependencies(self, resource, resource_data):
+        # [(resource type name, resource name), ] to upload before this resource.
+        return []
+
+    def upload_resource(self, resource, resource_data):
+        return self.load_resource(resource.name)
+
     def unload_resource(self, resource_name):
         logger.warn("unload_resource is not implemented in %s." % self.name)
 
@@ -651,14 +647,20 @@ class MaterialLoader(ResourceLoader):
     resource_dir_name = 'Materials'
     resource_type_name = 'Material'
     fileExt = '.mat'
-    resource_version = 0.6
+    resource_version = 0.7
     USE_FILE_COMPRESS_TO_SAVE = False
     enable_basic_mode = False
 
     def __init__(self, resource_manager):
         ResourceLoader.__init__(self, resource_manager)
+        self.program_binary_cache = ProgramBinaryCache()
         # self.linked_material_map = {}
 
+    def initialize(self):
+        cache_path = os.path.join(self.resource_manager.project_path, 'Caches', 'ProgramBinaries')
+        self.program_binary_cache.initialize(cache_path, OpenGLContext.get_driver_string())
+        ResourceLoader.initialize(self)
+
     def action_resource(self, resource_name):
         material = self.get_resource_data(resource_name)
         if material:
@@ -695,28 +697,52 @@ class MaterialLoader(ResourceLoader):
             material_datas = self.load_resource_data(resource)
             if material_datas:
                 meta_data = resource.meta_data
-                generate_new_material = False
-                if self.is_new_external_data(meta_data, meta_data.source_filepath):
-                    generate_new_material = True
+                generate_new_material = meta_data.resource_version != self.resource_version
 
                 # set include files meta datas
                 meta_data.include_files = material_datas.get('include_files', {})
-                for include_file in meta_data.include_files:
-                    if get_modify_time_of_file(include_file) != meta_data.include_files[include_file]:
-                        generate_new_material = True
-                        break
+
+                source_file_hashes = material_datas.get('source_file_hashes')
+                if source_file_hashes is not None:
+                    # compare the contents of the shader and the include files, the modify times are not reliable.
+                    generate_new_material |= self.program_binary_cache.is_file_changed(source_file_hashes)
+                else:
+                    generate_new_material |= self.is_new_external_data(meta_data, meta_data.source_filepath)
+                    for include_file in meta_data.include_files:
+                        if get_modify_time_of_file(include_file) != meta_data.include_files[include_file]:
+                            generate_new_material = True
+                            break
 
                 if generate_new_material:
                     shader_name = material_datas.get('shader_name')
                     macros = material_datas.get('macros', {})
                     self.generate_new_material(resource.name, shader_name, default_compile_option, macros)
                 else:
-                    material = Material(resource.name, material_datas)
+                    material = self.create_material(resource.name, material_datas)
                     resource.set_data(material)
                 return True
         logger.error('%s failed to load %s' % (self.name, resource_name))
         return False
 
+    def create_material(self, material_name, material_datas):
+        # link the program from the program binary cache if the same codes were compiled on this driver.
+        source_hash = material_datas.get('source_hash')
+        if not source_hash:
+            source_hash = ProgramBinaryCache.get_source_hash(material_datas.get('shader_codes', {}),
+                                                             material_datas.get('macros', {}))
+            material_datas['source_hash'] = source_hash
+
+        binary_format, binary_data = self.program_binary_cache.load_program_binary(source_hash)
+        if binary_format is not None and binary_data is not None:
+            material_datas['binary_format'] = binary_format
+            material_datas['binary_data'] = binary_data
+
+        material = Material(material_name, material_datas)
+        if material.valid and not material.is_loaded_from_binary and 0 < material.program:
+            binary_format, binary_data = material.save_to_binary()
+            self.program_binary_cache.save_program_binary(source_hash, binary_format, binary_data)
+        return material
+
     @staticmethod
     def generate_material_name(shader_name, macros=None):
         if macros is not None and 0 < len(macros):
@@ -756,14 +782,17 @@ class MaterialLoader(ResourceLoader):
                 for include_file in shader.include_files:
                     include_files[include_file] = get_modify_time_of_file(include_file)
 
+                source_file_hashes = self.program_binary_cache.get_file_hashes(
+                    [shader_meta_data.resource_filepath, ] + list(include_files.keys()))
+
                 material_datas = dict(
                     shader_name=shader_name,
                     shader_codes=shader_codes,
                     include_files=include_files,
+                    source_file_hashes=source_file_hashes,
+                    source_hash=ProgramBinaryCache.get_source_hash(shader_codes, final_macros),
                     uniforms=uniforms,
                     material_components=material_components,
-                    binary_data=None,
-                    binary_format=None,
                     macros=final_macros
                 )
 
@@ -773,7 +802,7 @@ class MaterialLoader(ResourceLoader):
                     material_datas['uniform_datas'] = copy.deepcopy(root_material.get_save_data()['uniform_datas'])
 
                 # create material
-                material = Material(final_material_name, material_datas)
+                material = self.create_material(final_material_name, material_datas)
 
                 if material:
                     if material.valid:
@@ -791,12 +820,6 @@ class MaterialLoader(ResourceLoader):
                         else:
                             source_filepath = ""
 
-                        # save binary data of shader.
-                        binary_format, binary_data = material.save_to_binary()
-                        if binary_format is not None and binary_data is not None:
-                            material_datas['binary_format'] = binary_format
-                            material_datas['binary_data'] = binary_data
-
                         # Done : save material data
                         self.save_resource_data(resource, material_datas, source_filepath)
                         resource.set_data(material)
@@ -837,23 +860,37 @@ class MaterialInstanceLoader(ResourceLoader):
     USE_FILE_COMPRESS_TO_SAVE = False
     enable_basic_mode = False
 
+    def read_resource(self, resource):
+        return self.load_resource_data(resource)
+
+    def get_resource_dependencies(self, resource, material_instance_data):
+        texture_loader = self.resource_manager.texture_loader
+        dependencies = []
+        for data_value in material_instance_data.get('uniform_datas', {}).values():
+            if type(data_value) is str and texture_loader.hasResource(data_value):
+                dependencies.append((texture_loader.resource_type_name, data_value))
+        return dependencies
+
+    def upload_resource(self, resource, material_instance_data):
+        shader_name = material_instance_data.get('shader_name', 'default')
+        macros = material_instance_data.get('macros', {})
+        material = self.resource_manager.get_material(shader_name, macros)
+        material_instance_data['material'] = material
+
+        material_instance = MaterialInstance(resource.name, **material_instance_data)
+        if material_instance.valid:
+            resource.set_data(material_instance)
+            if material_instance.isNeedToSave:
+                self.save_resource(resource.name)
+                material_instance.isNeedToSave = False
+        return material_instance.valid
+
     def load_resource(self, resource_name):
         resource = self.get_resource(resource_name)
         if resource:
-            material_instance_data = self.load_resource_data(resource)
+            material_instance_data = self.read_resource(resource)
             if material_instance_data:
-                shader_name = material_instance_data.get('shader_name', 'default')
-                macros = material_instance_data.get('macros', {})
-                material = self.resource_manager.get_material(shader_name, macros)
-                material_instance_data['material'] = material
-
-                material_instance = MaterialInstance(resource.name, **material_instance_data)
-                if material_instance.valid:
-                    resource.set_data(material_instance)
-                    if material_instance.isNeedToSave:
-                        self.save_resource(resource_name)
-                        material_instance.isNeedToSave = False
-                return material_instance.valid
+                return self.upload_resource(resource, material_instance_data)
         logger.error('%s failed to load %s' % (self.name, resource_name))
         return False
 
@@ -913,16 +950,23 @@ class TextureLoader(ResourceLoader):
     name = "TextureLoader"
     resource_dir_name = 'Textures'
     resource_type_name = 'Texture'
-    resource_version = 2
+    resource_version = 3
     USE_FILE_COMPRESS_TO_SAVE = True
+    # BC1/BC3/BC4/BC5 block compression of the imported images, the textures are reimported to apply the change.
+    USE_TEXTURE_COMPRESSION = False
+    # the cooked 2d textures are loaded with the low mip levels, see TextureStreamingManager.
+    USE_TEXTURE_STREAMING = True
     enable_basic_mode = False
     fileExt = '.texture'
     externalFileExt = dict(GIF=".gif", JPG=".jpg", JPEG=".jpeg", PNG=".png", BMP=".bmp", TGA=".tga", TIF=".tif",
                            TIFF=".tiff", DXT=".dds", KTX=".ktx", PGM=".pgm")
+    cube_texture_faces = ('texture_positive_x', 'texture_negative_x', 'texture_positive_y', 'texture_negative_y',
+                          'texture_positive_z', 'texture_negative_z')
 
     def __init__(self, resource_manager):
         ResourceLoader.__init__(self, resource_manager)
         self.new_texture_list = []
+        self.texture_streaming_manager = TextureStreamingManager.instance()
 
     def initialize(self):
         ResourceLoader.initialize(self)
@@ -935,6 +979,79 @@ class TextureLoader(ResourceLoader):
     def action_resource(self, resource_name):
         self.core_manager.request(COMMAND.VIEW_TEXTURE, resource_name)
 
+    def read_resource(self, resource):
+        meta_data = resource.meta_data
+        if self.is_new_external_data(meta_data, meta_data.source_filepath):
+            # the source image is cooked by get_decode_function
+            return meta_data.source_filepath
+        return self.load_resource_data(resource)
+
+    def get_decode_function(self, resource, resource_data):
+        if type(resource_data) is str:
+            return functools.partial(cook_texture, compress=self.USE_TEXTURE_COMPRESSION)
+        return None
+
+    @staticmethod
+    def load_resource_data(resource):
+        if resource is not None:
+            filePath = resource.meta_data.resource_filepath
+            try:
+                if os.path.exists(filePath) and is_cooked_texture_file(filePath):
+                    return load_cooked_texture(filePath)
+            except:
+                logger.error(traceback.format_exc())
+                return None
+        # the gzip pickle of the texture which is read back from the gpu
+        return ResourceLoader.load_resource_data(resource)
+
+    def save_data_to_file(self, save_filepath, save_data):
+        if 'mipmap_datas' in save_data:
+            logger.info("Save : %s" % save_filepath)
+            try:
+                save_cooked_texture(save_filepath, save_data)
+                return True
+            except:
+                logger.error(traceback.format_exc())
+            return False
+        return ResourceLoader.save_data_to_file(self, save_filepath, save_data)
+
+    def get_resource_dependencies(self, resource, texture_datas):
+        texture_type = texture_datas.get('texture_type')
+        if TextureCube == texture_type or TextureCube.__name__ == texture_type:
+            return [(self.resource_type_name, texture_datas[face]) for face in self.cube_texture_faces
+                    if self.hasResource(texture_datas[face])]
+        return []
+
+    def upload_resource(self, resource, texture_datas):
+        if 'texture_type' not in texture_datas:
+            # cooked from the source image, it is saved as it is without reading back from the gpu.
+            if resource not in self.new_texture_list:
+                self.new_texture_list.append(resource)
+            self.save_resource_data(resource, texture_datas, resource.meta_data.source_filepath)
+            if self.USE_TEXTURE_STREAMING:
+                # the saved file is memory mapped, so the levels which are not resident are not kept in memory.
+                texture_datas = self.load_resource_data(resource) or texture_datas
+            texture_datas = dict(texture_datas, texture_type=Texture2D)
+
+        texture_type = texture_datas.get('texture_type')
+        if TextureCube == texture_type or TextureCube.__name__ == texture_type:
+            default_texture = self.resource_manager.get_default_texture()
+            for face in self.cube_texture_faces:
+                texture_datas[face] = self.get_resource_data(texture_datas[face]) or default_texture
+
+        # the old streaming texture is released, Resource.set_data keeps the texture object of the material instances.
+        if getattr(resource.data, 'streaming', None) is not None:
+            resource.data.delete()
+
+        if self.USE_TEXTURE_STREAMING and self.texture_streaming_manager.is_streamable(texture_datas):
+            texture = self.texture_streaming_manager.create_texture(resource.name, texture_datas)
+            resource.set_data(texture)
+            resource.data.streaming.texture = resource.data
+        else:
+            texture = CreateTexture(name=resource.name, **texture_datas)
+            resource.set_data(texture)
+        return True
+
     def load_resource(self, resource_name):
         resource = self.get_resource(resource_name)
         if resource:
@@ -944,28 +1061,29 @@ class TextureLoader(ResourceLoader):
 
             texture_datas = self.load_resource_data(resource)
             if texture_datas:
-                texture_type = texture_datas.get('texture_type')
-                if TextureCube == texture_type or TextureCube.__name__ == texture_type:
-                    default_texture = self.resource_manager.get_default_texture()
-                    texture_datas['texture_positive_x'] = self.get_resource_data(
-                        texture_datas['texture_positive_x']) or default_texture
-                    texture_datas['texture_negative_x'] = self.get_resource_data(
-                        texture_datas['texture_negative_x']) or default_texture
-                    texture_datas['texture_positive_y'] = self.get_resource_data(
-                        texture_datas['texture_positive_y']) or default_texture
-                    texture_datas['texture_negative_y'] = self.get_resource_data(
-                        texture_datas['texture_negative_y']) or default_texture
-                    texture_datas['texture_positive_z'] = self.get_resource_data(
-                        texture_datas['texture_positive_z']) or default_texture
-                    texture_datas['texture_negative_z'] = self.get_resource_data(
-                        texture_datas['texture_negative_z']) or default_texture
-
-                texture = CreateTexture(name=resource.name, **texture_datas)
-                resource.set_data(texture)
-                return True
+                return self.upload_resource(resource, texture_datas)
         logger.error('%s failed to load %s' % (self.name, resource_name))
         return False
 
+    def save_resource_async(self, resource_name):
+        # The gpu generated texture is read back without waiting for the gpu, the file is saved a frame or two later.
+        # returns the future of the readback.
+        resource = self.get_resource(resource_name)
+        texture = self.get_resource_data(resource_name)
+        if resource is None or texture is None:
+            logger.warn("%s failed to save %s." % (self.name, resource_name))
+            return None
+
+        save_data = texture.get_texture_info()
+
+        def save_texture_data(future):
+            data = future.result()
+            if data is not None:
+                save_data['data'] = data
+                self.save_resource_data(resource, save_data)
+
+        return texture.get_image_data_async(callback=save_texture_data)
+
     def generate_cube_textures(self):
         cube_faces = ('right', 'left', 'top', 'bottom', 'back', 'front')
         cube_texutre_map = dict()  # { cube_name : { face : source_filepath } }
@@ -991,6 +1109,10 @@ class TextureLoader(ResourceLoader):
                     isCreateCube = True
 
                 if isCreateCube:
+                    # the faces are read back with all levels
+                    for cube_face in cube_faces.values():
+                        self.texture_streaming_manager.make_resident(cube_face.get_data())
+
                     default_texture = self.get_resource_data('common.flat_gray')
                     texture_right = cube_faces['right'].get_data() or default_texture
                     texture_left = cube_faces['left'].get_data() or default_texture
@@ -1017,49 +1139,22 @@ class TextureLoader(ResourceLoader):
 
     @staticmethod
     def create_texture_from_file(texture_name, source_filepath):
-        if os.path.exists(source_filepath):
-            image = Image.open(source_filepath)
-            width, height = image.size
-
-            # check size is power of two.
-            use_power_of_2 = False
-            if use_power_of_2:
-                width2 = (2 ** math.ceil(math.log2(width))) if 4 < width else 4
-                height2 = (2 ** math.ceil(math.log2(height))) if 4 < width else 4
-                if width != width2 or height != height2:
-                    logger.info('Image Resized (%s) -> (%s) : %s' % ((width, height), (width2, height2), source_filepath))
-                    image = image.resize((width2, height2), Image.ANTIALIAS)
-                    width, height = width2, height2
-
-            if image.mode == 'L' or image.mode == 'LA' or image.mode == 'P' or image.mode == 'R':
-                rgbimg = Image.new("RGBA", image.size)
-                rgbimg.paste(image)
-                image = rgbimg
-                logger.info('Convert Grayscale image to RGB : %s' % source_filepath)
-
-            data = image.tobytes("raw", image.mode, 0, -1)
-
-            texture_datas = dict(
-                texture_type=Texture2D,
-                image_mode=image.mode,
-                width=width,
-                height=height,
-                data=data
-            )
-            return CreateTexture(name=texture_name, **texture_datas)
+        texture_datas = cook_texture(source_filepath)
+        if texture_datas is not None:
+            return CreateTexture(name=texture_name, texture_type=Texture2D, **texture_datas)
         return None
 
     def convert_resource(self, resource, source_filepath):
+        # the texture is cooked on the cpu, load_resource uploads the saved file.
         try:
             logger.info("Convert Resource : %s" % source_filepath)
             if resource not in self.new_texture_list:
                 self.new_texture_list.append(resource)
 
-            texture = self.create_texture_from_file(resource.name, source_filepath)
-            if texture:
-                resource.set_data(texture)
-                texture_datas = texture.get_save_data()
+            texture_datas = cook_texture(source_filepath, compress=self.USE_TEXTURE_COMPRESSION)
+            if texture_datas is not None:
                 self.save_resource_data(resource, texture_datas, source_filepath)
+                return
         except:
             logger.error(traceback.format_exc())
         logger.info("Failed to convert resource : %s" % source_filepath)
@@ -1112,12 +1207,16 @@ class ProceduralTextureLoader(ResourceLoader):
 # -----------------------#
 class MeshLoader(ResourceLoader):
     name = "MeshLoader"
-    resource_version = 0
+    resource_version = 1
     resource_dir_name = 'Meshes'
     resource_type_name = 'Mesh'
     fileExt = '.mesh'
     externalFileExt = dict(WaveFront='.obj', Collada='.dae')
     USE_FILE_COMPRESS_TO_SAVE = True
+    # save the vertex streams as raw blocks which are memory mapped on load, see BinaryMeshLoader.
+    USE_BINARY_MESH_TO_SAVE = True
+    # the tangents of the imported meshes are computed once and saved in the mesh resource, see compute_tangent_space.
+    TANGENT_MODE = TANGENT_MODE_AREA_WEIGHTED
 
     def initialize(self):
         # load and regist resource
@@ -1129,14 +1228,44 @@ class MeshLoader(ResourceLoader):
         self.create_resource("Cube", Cube("Cube"))
         self.create_resource("Plane", Plane("Plane", width=4, height=4, xz_plane=True))
 
+    @staticmethod
+    def load_resource_data(resource):
+        if resource is not None:
+            filePath = resource.meta_data.resource_filepath
+            try:
+                if os.path.exists(filePath) and is_binary_mesh_file(filePath):
+                    return load_binary_mesh(filePath)
+            except:
+                logger.error(traceback.format_exc())
+                return None
+        # the gzip pickle or the human readable mesh file
+        return ResourceLoader.load_resource_data(resource)
+
+    def save_data_to_file(self, save_filepath, save_data):
+        if self.USE_BINARY_MESH_TO_SAVE:
+            logger.info("Save : %s" % save_filepath)
+            try:
+                save_binary_mesh(save_filepath, save_data)
+                return True
+            except:
+                logger.error(traceback.format_exc())
+            return False
+        return ResourceLoader.save_data_to_file(self, save_filepath, save_data)
+
+    def read_resource(self, resource):
+        return self.load_resource_data(resource)
+
+    def upload_resource(self, resource, mesh_data):
+        mesh = Mesh(resource.name, **mesh_data)
+        resource.set_data(mesh)
+        return True
+
     def load_resource(self, resource_name):
         resource = self.get_resource(resource_name)
         if resource:
-            mesh_data = self.load_resource_data(resource)
+            mesh_data = self.read_resource(resource)
             if mesh_data:
-                mesh = Mesh(resource.name, **mesh_data)
-                resource.set_data(mesh)
-                return True
+                return self.upload_resource(resource, mesh_data)
         logger.error('%s failed to load %s' % (self.name, resource_name))
         return False
 
@@ -1153,6 +1282,9 @@ class MeshLoader(ResourceLoader):
             return
 
         if mesh_data:
+            for geometry_data in mesh_data.get('geometry_datas', []):
+                geometry_data.setdefault('tangent_mode', self.TANGENT_MODE)
+
             # create mesh
             mesh = Mesh(resoure.name, **mesh_data)
             resoure.set_data(mesh)
@@ -1189,17 +1321,33 @@ class ModelLoader(ResourceLoader):
         resource.set_data(model)
         self.save_resource(resource.name)
 
+    def read_resource(self, resource):
+        return self.load_resource_data(resource)
+
+    def get_resource_dependencies(self, resource, object_data):
+        dependencies = []
+        mesh_name = object_data.get('mesh')
+        if mesh_name:
+            dependencies.append((MeshLoader.resource_type_name, mesh_name))
+        for material_instance_name in object_data.get('material_instances', []):
+            if self.resource_manager.material_instance_loader.hasResource(material_instance_name):
+                dependencies.append((MaterialInstanceLoader.resource_type_name, material_instance_name))
+        return dependencies
+
+    def upload_resource(self, resource, object_data):
+        mesh = self.resource_manager.get_mesh(object_data.get('mesh'))
+        material_instances = [self.resource_manager.get_material_instance(material_instance_name)
+                              for material_instance_name in object_data.get('material_instances', [])]
+        obj = Model(resource.name, mesh=mesh, material_instances=material_instances)
+        resource.set_data(obj)
+        return True
+
     def load_resource(self, resource_name):
         resource = self.get_resource(resource_name)
         if resource:
-            object_data = self.load_resource_data(resource)
+            object_data = self.read_resource(resource)
             if object_data:
-                mesh = self.resource_manager.get_mesh(object_data.get('mesh'))
-                material_instances = [self.resource_manager.get_material_instance(material_instance_name)
-                                      for material_instance_name in object_data.get('material_instances', [])]
-                obj = Model(resource.name, mesh=mesh, material_instances=material_instances)
-                resource.set_data(obj)
-                return True
+                return self.upload_resource(resource, object_data)
         logger.error('%s failed to load %s' % (self.name, resource_name))
         return False
 
@@ -1268,31 +1416,48 @@ class SceneLoader(ResourceLoader):
             scene_data = self.scene_manager.get_save_data()
             self.save_resource_data(resource, scene_data)
 
+    def read_resource(self, resource):
+        if os.path.exists(resource.meta_data.resource_filepath):
+            return self.load_resource_data(resource)
+        return None
+
+    def get_resource_dependencies(self, resource, scene_datas):
+        model_names = set()
+        for object_data in scene_datas.get('static_actors', []) + scene_datas.get('skeleton_actors', []):
+            model_name = object_data.get('model')
+            if type(model_name) is str:
+                model_names.add(model_name)
+        return [(ModelLoader.resource_type_name, model_name) for model_name in model_names
+                if self.resource_manager.model_loader.hasResource(model_name)]
+
+    def upload_resource(self, resource, scene_datas):
+        for object_data in scene_datas.get('static_actors', []):
+            object_data['model'] = self.resource_manager.get_model(object_data.get('model'))
+
+        for object_data in scene_datas.get('skeleton_actors', []):
+            object_data['model'] = self.resource_manager.get_model(object_data.get('model'))
+
+        self.scene_manager.open_scene(resource.name, scene_datas)
+        resource.set_data(scene_datas)
+        return True
+
     def load_resource(self, resource_name):
         resource = self.get_resource(resource_name)
         if resource:
             meta_data = self.get_meta_data(resource_name)
             if resource and meta_data:
                 if os.path.exists(meta_data.resource_filepath):
-                    scene_datas = self.load_resource_data(resource)
+                    scene_datas = self.read_resource(resource)
                 else:
                     scene_datas = resource.get_data()
 
                 if scene_datas:
-                    for object_data in scene_datas.get('static_actors', []):
-                        object_data['model'] = self.resource_manager.get_model(object_data.get('model'))
-
-                    for object_data in scene_datas.get('skeleton_actors', []):
-                        object_data['model'] = self.resource_manager.get_model(object_data.get('model'))
-
-                    self.scene_manager.open_scene(resource_name, scene_datas)
-                    resource.set_data(scene_datas)
-                    return True
+                    return self.upload_resource(resource, scene_datas)
         logger.error('%s failed to load %s' % (self.name, resource_name))
         return False
 
     def action_resource(self, resource_name):
-        self.load_resource(resource_name)
+        self.resource_manager.load_resource_async(resource_name, self.resource_type_name)
 
 
 # -----------------------#
@@ -1350,11 +1515,18 @@ class FontLoader(ResourceLoader):
         font_datas = {}
         self.check_font_data(font_datas, resoure, source_filepath)
 
-    def load_resource(self, resource_name):
+    def read_resource(self, resource):
+        return self.load_resource_data(resource)
+
+    def upload_resource(self, resource, font_datas):
+        return self.load_resource(resource.name, font_datas)
+
+    def load_resource(self, resource_name, font_datas=None):
         resource = self.get_resource(resource_name)
         if resource:
             meta_data = resource.meta_data
-            font_datas = self.load_resource_data(resource)
+            if font_datas is None:
+                font_datas = self.read_resource(resource)
             if font_datas is not None:
                 font_datas = self.check_font_data(font_datas, resource, meta_data.source_filepath)
 
@@ -1580,7 +1752,7 @@ class ResourceManager(Singleton):
         self.script_loader = None
         self.model_loader = None
         self.procedural_texture_loader = None
-        # self.loading_thread = LoadingThread(self)
+        self.loading_service = ResourceLoadingService(self)
 
     def regist_loader(self, resource_loader_class):
         resource_loader = resource_loader_class(self)
@@ -1617,8 +1789,8 @@ class ResourceManager(Singleton):
         self.model_loader = self.regist_loader(ModelLoader)
         self.procedural_texture_loader = self.regist_loader(ProceduralTextureLoader)
 
-        # start loading thread
-        # self.loading_thread.start()
+        # start loading threads
+        self.loading_service.initialize()
 
         # initialize
         for resource_loader in self.resource_loaders:
@@ -1628,10 +1800,10 @@ class ResourceManager(Singleton):
         logger.info("Resource register done.")
 
     def update(self):
-        pass
-        # self.loading_thread.set_data()
+        self.loading_service.update()
 
     def close(self):
+        self.loading_service.close()
         for resource_loader in self.resource_loaders:
             if not self.core_manager.is_basic_mode or resource_loader.enable_basic_mode:
                 resource_loader.close()
@@ -1696,6 +1868,10 @@ class ResourceManager(Singleton):
         if resource_loader:
             resource_loader.load_resource(resource_name)
 
+    def load_resource_async(self, resource_name, resource_type_name, priority=0, callback=None, force=True):
+        # the resource and its dependencies are loaded on the loading threads, then uploaded in the update.
+        return self.loading_service.request(resource_type_name, resource_name, priority, callback, force)
+
     def action_resource(self, resource_name, resource_type_name):
         resource_loader = self.find_resource_loader(resource_type_name)
         if resource_loader:
@@ -1,3 +1,4 @@
+from .BinaryMeshLoader import is_binary_mesh_file, save_binary_mesh, load_binary_mesh
 from .ColladaLoader import Collada
 from .DDSLoader import loadDDS
 from .ObjLoader import OBJ
@@ -0,0 +1,316 @@
+import math
+
+import numpy as np
+
+
+# The loose bound of a node is its core bound scaled by LOOSENESS, so an object is placed by its center
+# and never has to straddle node borders. It keeps incremental updates cheap for moving objects.
+LOOSENESS = 2.0
+SQRT_3 = math.sqrt(3.0)
+
+# results of the node tests
+OUTSIDE = 0
+INTERSECT = 1
+INSIDE = 2
+
+
+class LooseOctreeNode:
+    def __init__(self, parent, center, half_size):
+        self.parent = parent
+        self.center = center
+        self.half_size = half_size
+        self.loose_half_size = half_size * LOOSENESS
+        self.children = None
+        self.slots = set()
+        # item count of the subtree, empty branches are skipped while querying.
+        self.item_count = 0
+
+    def get_loose_bound(self):
+        x, y, z = self.center
+        h = self.loose_half_size
+        return (x - h, y - h, z - h), (x + h, y + h, z + h)
+
+    def get_child(self, octant):
+        if self.children is None:
+            self.children = [None] * 8
+        child = self.children[octant]
+        if child is None:
+            h = self.half_size * 0.5
+            x, y, z = self.center
+            center = (x + (h if octant & 1 else -h), y + (h if octant & 2 else -h), z + (h if octant & 4 else -h))
+            child = LooseOctreeNode(self, center, h)
+            self.children[octant] = child
+        return child
+
+    def get_octant(self, pos):
+        x, y, z = self.center
+        return (1 if x <= pos[0] else 0) | (2 if y <= pos[1] else 0) | (4 if z <= pos[2] else 0)
+
+    def is_fit(self, center, half_extent):
+        x, y, z = self.center
+        h = self.half_size
+        return abs(center[0] - x) <= h and abs(center[1] - y) <= h and abs(center[2] - z) <= h and \
+            half_extent <= h * (LOOSENESS - 1.0)
+
+
+class LooseOctree:
+    def __init__(self, size=1024.0, min_size=4.0):
+        self.size = size
+        self.min_size = min_size
+        self.root = None
+        self.slot_map = {}
+        self.objects = []
+        self.nodes = []
+        self.free_slots = []
+        self.bound_mins = np.zeros((0, 3), dtype=np.float32)
+        self.bound_maxs = np.zeros((0, 3), dtype=np.float32)
+        self.clear()
+
+    def clear(self):
+        self.root = LooseOctreeNode(None, (0.0, 0.0, 0.0), self.size * 0.5)
+        self.slot_map = {}
+        self.objects = []
+        self.nodes = []
+        self.free_slots = []
+        self.bound_mins = np.zeros((0, 3), dtype=np.float32)
+        self.bound_maxs = np.zeros((0, 3), dtype=np.float32)
+
+    def get_count(self):
+        return len(self.slot_map)
+
+    def contains(self, obj):
+        return obj in self.slot_map
+
+    def insert(self, obj, bound_min, bound_max):
+        if obj in self.slot_map:
+            self.update(obj, bound_min, bound_max)
+            return
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.objects[slot] = obj
+        else:
+            slot = len(self.objects)
+            self.objects.append(obj)
+            self.nodes.append(None)
+            if len(self.bound_mins) <= slot:
+                capacity = max(64, slot * 2)
+                self.bound_mins = np.resize(self.bound_mins, (capacity, 3))
+                self.bound_maxs = np.resize(self.bound_maxs, (capacity, 3))
+        self.slot_map[obj] = slot
+        self.bound_mins[slot] = bound_min
+        self.bound_maxs[slot] = bound_max
+        self.insert_slot(slot)
+
+    def remove(self, obj):
+        slot = self.slot_map.pop(obj, None)
+        if slot is not None:
+            self.remove_slot(slot)
+            self.objects[slot] = None
+            self.free_slots.append(slot)
+
+    def update(self, obj, bound_min, bound_max):
+        slot = self.slot_map.get(obj)
+        if slot is None:
+            self.insert(obj, bound_min, bound_max)
+            return
+
+        self.bound_mins[slot] = bound_min
+        self.bound_maxs[slot] = bound_max
+        center, half_extent = self.get_center_and_half_extent(slot)
+        node = self.nodes[slot]
+        # stays in the current node while it still fits, otherwise moves to the deepest fitting node.
+        if not node.is_fit(center, half_extent) or self.is_fit_to_child(node, half_extent):
+            self.remove_slot(slot)
+            self.insert_slot(slot)
+
+    def get_center_and_half_extent(self, slot):
+        min_x, min_y, min_z = self.bound_mins[slot].tolist()
+        max_x, max_y, max_z = self.bound_maxs[slot].tolist()
+        center = ((min_x + max_x) * 0.5, (min_y + max_y) * 0.5, (min_z + max_z) * 0.5)
+        return center, max(max_x - min_x, max_y - min_y, max_z - min_z) * 0.5
+
+    def is_fit_to_child(self, node, half_extent):
+        child_half_size = node.half_size * 0.5
+        return self.min_size <= node.half_size and half_extent <= child_half_size * (LOOSENESS - 1.0)
+
+    def grow_root(self, center):
+        old_root = self.root
+        x, y, z = old_root.center
+        h = old_root.half_size
+        new_center = (x + (h if x <= center[0] else -h), y + (h if y <= center[1] else -h), z + (h if z <= center[2] else -h))
+        new_root = LooseOctreeNode(None, new_center, h * 2.0)
+        new_root.children = [None] * 8
+        new_root.children[new_root.get_octant(old_root.center)] = old_root
+        new_root.item_count = old_root.item_count
+        old_root.parent = new_root
+        self.root = new_root
+
+    def insert_slot(self, slot):
+        center, half_extent = self.get_center_and_half_extent(slot)
+        if not all(math.isfinite(x) for x in (half_extent, ) + center):
+            # invalid bound, just keep it in the root.
+            node = self.root
+        else:
+            while not self.root.is_fit(center, half_extent):
+                self.grow_root(center)
+
+            node = self.root
+            while self.is_fit_to_child(node, half_extent):
+                node.item_count += 1
+                node = node.get_child(node.get_octant(center))
+        node.item_count += 1
+        node.slots.add(slot)
+        self.nodes[slot] = node
+
+    def remove_slot(self, slot):
+        node = self.nodes[slot]
+        node.slots.discard(slot)
+        self.nodes[slot] = None
+        while node is not None:
+            node.item_count -= 1
+            parent = node.parent
+            # release empty branches
+            if 0 == node.item_count and parent is not None:
+                parent.children[parent.children.index(node)] = None
+            node = parent
+
+    def gather_slots(self, node_test):
+        slots = []
+        stack = [(self.root, False)]
+        while stack:
+            node, inside = stack.pop()
+            if 0 == node.item_count:
+                continue
+
+            if not inside:
+                result = node_test(node)
+                if OUTSIDE == result:
+                    continue
+                # the whole subtree is inside, so the children don't need to be tested.
+                inside = INSIDE == result
+
+            slots.extend(node.slots)
+            if node.children is not None:
+                stack.extend([(child, inside) for child in node.children if child is not None])
+        return np.array(slots, dtype=np.int32)
+
+    def query_aabb(self, bound_min, bound_max):
+        min_x, min_y, min_z = [float(x) for x in bound_min]
+        max_x, max_y, max_z = [float(x) for x in bound_max]
+
+        def node_test(node):
+            (node_min_x, node_min_y, node_min_z), (node_max_x, node_max_y, node_max_z) = node.get_loose_bound()
+            if max_x < node_min_x or max_y < node_min_y or max_z < node_min_z or \
+                    node_max_x < min_x or node_max_y < min_y or node_max_z < min_z:
+                return OUTSIDE
+            if min_x <= node_min_x and min_y <= node_min_y and min_z <= node_min_z and \
+                    node_max_x <= max_x and node_max_y <= max_y and node_max_z <= max_z:
+                return INSIDE
+            return INTERSECT
+
+        slots = self.gather_slots(node_test)
+        mask = np.all(self.bound_mins[slots] <= bound_max, axis=1) & np.all(bound_min <= self.bound_maxs[slots], axis=1)
+        return [self.objects[slot] for slot in slots[mask]]
+
+    def query_sphere(self, center, radius):
+        center_x, center_y, center_z = [float(x) for x in center]
+        radius = float(radius)
+
+        def node_test(node):
+            x, y, z = node.center
+            h = node.loose_half_size
+            dx = max(abs(center_x - x) - h, 0.0)
+            dy = max(abs(center_y - y) - h, 0.0)
+            dz = max(abs(center_z - z) - h, 0.0)
+            if radius * radius < dx * dx + dy * dy + dz * dz:
+                return OUTSIDE
+            # the farthest corner of the node is inside of the sphere
+            fx = abs(center_x - x) + h
+            fy = abs(center_y - y) + h
+            fz = abs(center_z - z) + h
+            return INSIDE if fx * fx + fy * fy + fz * fz <= radius * radius else INTERSECT
+
+        slots = self.gather_slots(node_test)
+        closest = np.minimum(np.maximum(center, self.bound_mins[slots]), self.bound_maxs[slots])
+        mask = np.sum((closest - center) ** 2, axis=1) <= radius * radius
+        return [self.objects[slot] for slot in slots[mask]]
+
+    def query_frustum(self, origin, frustum_vectors):
+        # frustum_vectors are the outward side plane normals passing through the origin, same as Camera.frustum_vectors.
+        origin_x, origin_y, origin_z = [float(x) for x in origin]
+        planes = [tuple(float(x) for x in frustum_vector) for frustum_vector in frustum_vectors]
+
+        def node_test(node):
+            x, y, z = node.center
+            x -= origin_x
+            y -= origin_y
+            z -= origin_z
+            radius = node.loose_half_size * SQRT_3
+            result = INSIDE
+            for plane_x, plane_y, plane_z in planes:
+                d = plane_x * x + plane_y * y + plane_z * z
+                if radius < d:
+                    return OUTSIDE
+                elif -radius < d:
+                    result = INTERSECT
+            return result
+
+        slots = self.gather_slots(node_test)
+        bound_mins = self.bound_mins[slots]
+        bound_maxs = self.bound_maxs[slots]
+        radiuses = np.sqrt(np.sum((bound_maxs - bound_mins) ** 2, axis=1)) * 0.5
+        distances = np.dot((bound_mins + bound_maxs) * 0.5 - origin, np.transpose(frustum_vectors))
+        mask = np.all(distances <= radiuses[:, np.newaxis], axis=1)
+        return [self.objects[slot] for slot in slots[mask]]
+
+    def query_ray(self, origin, direction, max_distance=np.inf):
+        # returns the list of (distance, object) sorted by the entry distance of the ray.
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        origin_list = origin.tolist()
+        inv_direction_list = [(1.0 / x) if 0.0 != x else math.inf for x in direction.tolist()]
+
+        def node_test(node):
+            t_near = 0.0
+            t_far = max_distance
+            h = node.loose_half_size
+            for axis in range(3):
+                o = origin_list[axis]
+                c = node.center[axis]
+                if math.isinf(inv_direction_list[axis]):
+                    # parallel to the slab
+                    if o < c - h or c + h < o:
+                        return OUTSIDE
+                    continue
+                t0 = (c - h - o) * inv_direction_list[axis]
+                t1 = (c + h - o) * inv_direction_list[axis]
+                if t1 < t0:
+                    t0, t1 = t1, t0
+                t_near = max(t_near, t0)
+                t_far = min(t_far, t1)
+                if t_far < t_near:
+                    return OUTSIDE
+            return INTERSECT
+
+        slots = self.gather_slots(node_test)
+        if len(slots) < 1:
+            return []
+
+        bound_mins = self.bound_mins[slots]
+        bound_maxs = self.bound_maxs[slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_direction = 1.0 / direction
+            t0 = (bound_mins - origin) * inv_direction
+            t1 = (bound_maxs - origin) * inv_direction
+        parallel = (0.0 == direction)
+        # parallel axes never limit the distance, but the origin has to be between the slab planes.
+        t_near = np.max(np.where(parallel, -np.inf, np.minimum(t0, t1)), axis=1)
+        t_far = np.min(np.where(parallel, np.inf, np.maximum(t0, t1)), axis=1)
+        inside_slab = np.all(~parallel | ((bound_mins <= origin) & (origin <= bound_maxs)), axis=1)
+        t_near = np.maximum(t_near, 0.0)
+        mask = inside_slab & (t_near <= t_far) & (t_near <= max_distance)
+        slots = slots[mask]
+        distances = t_near[mask]
+        order = np.argsort(distances)
+        return [(float(distances[i]), self.objects[slots[i]]) for i in order]
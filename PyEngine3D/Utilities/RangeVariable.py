@@ -32,6 +32,15 @@ class RangeVariable:
     def get_uniform(self):
         return np.random.uniform(self.value[0], self.value[1])
 
+    def get_uniforms(self, count, random_generator=None):
+        # the shape is (count,) or (count, n) for the vector range.
+        random_generator = random_generator or np.random
+        return self.get_values(random_generator.random((count, ) + self.value[0].shape))
+
+    def get_values(self, random_factor):
+        # map the uniform random factors in [0, 1) to the range.
+        return self.value[0] + (self.value[1] - self.value[0]) * random_factor
+
     def get_save_data(self):
         save_data = dict(
             min_value=self.value[0].tolist(),
@@ -0,0 +1,224 @@
+import numpy as np
+
+
+# Block compression encoders, all blocks of a mip level are encoded at once.
+# The input is the uint8 array of (height, width, channels) and the output is the flat uint8 array of the blocks,
+# the blocks are in the row order of the input same as glCompressedTexImage2D.
+TEXTURE_COMPRESSION_BC1 = 'BC1'  # rgb, 8 bytes per block
+TEXTURE_COMPRESSION_BC3 = 'BC3'  # rgba, 16 bytes per block
+TEXTURE_COMPRESSION_BC4 = 'BC4'  # r, 8 bytes per block
+TEXTURE_COMPRESSION_BC5 = 'BC5'  # rg, 16 bytes per block
+
+# GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT, GL_COMPRESSED_RED_RGTC1, GL_COMPRESSED_RG_RGTC2
+COMPRESSED_INTERNAL_FORMATS = dict(BC1=0x83F0, BC3=0x83F3, BC4=0x8DBB, BC5=0x8DBD)
+COMPRESSED_BLOCK_SIZES = dict(BC1=8, BC3=16, BC4=8, BC5=16)
+
+
+def get_compressed_size(compression, width, height):
+    return ((width + 3) // 4) * ((height + 3) // 4) * COMPRESSED_BLOCK_SIZES[compression]
+
+
+def get_texture_compression(pixels, is_normal_map=False):
+    # BC5 for the normal maps, BC4 for the grayscale images, BC3 for the translucent images, otherwise BC1.
+    channel_count = pixels.shape[2]
+    opaque = channel_count < 4 or np.all(255 == pixels[..., 3])
+    if is_normal_map:
+        return TEXTURE_COMPRESSION_BC5
+    elif opaque and 3 <= channel_count and np.array_equal(pixels[..., 0], pixels[..., 1]) and \
+            np.array_equal(pixels[..., 0], pixels[..., 2]):
+        return TEXTURE_COMPRESSION_BC4
+    elif opaque:
+        return TEXTURE_COMPRESSION_BC1
+    return TEXTURE_COMPRESSION_BC3
+
+
+def get_blocks(pixels):
+    # (block rows, block columns, 16 texels, channels), the edges are repeated to the multiple of 4.
+    height, width, channel_count = pixels.shape
+    pad_height = (4 - height % 4) % 4
+    pad_width = (4 - width % 4) % 4
+    if pad_height or pad_width:
+        pixels = np.pad(pixels, ((0, pad_height), (0, pad_width), (0, 0)), mode='edge')
+    block_rows = pixels.shape[0] // 4
+    block_cols = pixels.shape[1] // 4
+    blocks = pixels.reshape(block_rows, 4, block_cols, 4, channel_count).transpose(0, 2, 1, 3, 4)
+    return blocks.reshape(block_rows * block_cols, 16, channel_count)
+
+
+def pack_indices(indices, bits):
+    # the index of texel i is at the bit (i * bits) of the little endian integer
+    shifts = np.arange(16, dtype=np.uint64) * np.uint64(bits)
+    return np.bitwise_or.reduce(indices.astype(np.uint64) << shifts, axis=1)
+
+
+def to_rgb565(colors):
+    colors = np.clip(np.rint(colors), 0, 255).astype(np.uint32)
+    return ((colors[..., 0] * 31 + 127) // 255 << 11) | ((colors[..., 1] * 63 + 127) // 255 << 5) | \
+           ((colors[..., 2] * 31 + 127) // 255)
+
+
+def from_rgb565(values):
+    values = values.astype(np.uint32)
+    r = (values >> 11) & 31
+    g = (values >> 5) & 63
+    b = values & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float32)
+
+
+def encode_color_blocks(blocks):
+    # BC1 color blocks of (block count, 16, 3), returns (block count, 8) uint8 in the 4 color mode.
+    colors = blocks.astype(np.float32)
+    mean = np.mean(colors, axis=1, keepdims=True)
+    centered = colors - mean
+
+    # principal axis by the power iteration of the covariance
+    covariance = np.einsum('nki,nkj->nij', centered, centered)
+    axis = np.max(colors, axis=1) - np.min(colors, axis=1)
+    for i in range(8):
+        axis = np.einsum('nij,nj->ni', covariance, axis)
+        axis /= np.maximum(np.max(np.abs(axis), axis=1, keepdims=True), 1e-12)
+    projection = np.einsum('nki,ni->nk', centered, axis)
+    block_indices = np.arange(len(colors))
+    color0 = colors[block_indices, np.argmax(projection, axis=1)]
+    color1 = colors[block_indices, np.argmin(projection, axis=1)]
+
+    value0 = to_rgb565(color0)
+    value1 = to_rgb565(color1)
+    # color0 > color1 is the 4 color mode
+    swap = value0 < value1
+    value0, value1 = np.where(swap, value1, value0), np.where(swap, value0, value1)
+
+    endpoint0 = from_rgb565(value0)
+    endpoint1 = from_rgb565(value1)
+    palette = np.stack([endpoint0, endpoint1, (endpoint0 * 2.0 + endpoint1) / 3.0,
+                        (endpoint0 + endpoint1 * 2.0) / 3.0], axis=1)
+    distances = np.sum((colors[:, :, np.newaxis, :] - palette[:, np.newaxis, :, :]) ** 2, axis=-1)
+    indices = np.argmin(distances, axis=2)
+    # same endpoints, all texels are the color0
+    indices[value0 == value1] = 0
+
+    result = np.zeros((len(colors), 8), dtype=np.uint8)
+    result[:, 0:2] = value0.astype('<u2').view(np.uint8).reshape(-1, 2)
+    result[:, 2:4] = value1.astype('<u2').view(np.uint8).reshape(-1, 2)
+    result[:, 4:8] = pack_indices(indices, 2).astype('<u4').view(np.uint8).reshape(-1, 4)
+    return result
+
+
+def encode_single_channel_blocks(blocks):
+    # BC4 blocks of (block count, 16), returns (block count, 8) uint8 in the 8 value mode.
+    values = blocks.astype(np.float32)
+    value0 = np.max(values, axis=1)
+    value1 = np.min(values, axis=1)
+    weights = np.array([0.0, 7.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0], dtype=np.float32) / 7.0
+    palette = np.rint(value0[:, np.newaxis] * (1.0 - weights) + value1[:, np.newaxis] * weights)
+    indices = np.argmin(np.abs(values[:, :, np.newaxis] - palette[:, np.newaxis, :]), axis=2)
+    # same endpoints, all texels are the value0
+    indices[value0 == value1] = 0
+
+    result = np.zeros((len(values), 8), dtype=np.uint8)
+    result[:, 0] = value0.astype(np.uint8)
+    result[:, 1] = value1.astype(np.uint8)
+    result[:, 2:8] = pack_indices(indices, 3).astype('<u8').view(np.uint8).reshape(-1, 8)[:, :6]
+    return result
+
+
+def compress_bc1(pixels):
+    return encode_color_blocks(get_blocks(pixels)[..., :3]).reshape(-1)
+
+
+def compress_bc3(pixels):
+    blocks = get_blocks(pixels)
+    if blocks.shape[2] < 4:
+        alphas = np.full(blocks.shape[:2], 255, dtype=np.uint8)
+    else:
+        alphas = blocks[..., 3]
+    return np.concatenate([encode_single_channel_blocks(alphas), encode_color_blocks(blocks[..., :3])], axis=1).reshape(-1)
+
+
+def compress_bc4(pixels):
+    return encode_single_channel_blocks(get_blocks(pixels)[..., 0]).reshape(-1)
+
+
+def compress_bc5(pixels):
+    blocks = get_blocks(pixels)
+    return np.concatenate([encode_single_channel_blocks(blocks[..., 0]),
+                           encode_single_channel_blocks(blocks[..., 1])], axis=1).reshape(-1)
+
+
+def unpack_indices(values, bits):
+    shifts = np.arange(16, dtype=np.uint64) * np.uint64(bits)
+    return ((values[:, np.newaxis] >> shifts) & np.uint64((1 << bits) - 1)).astype(np.int64)
+
+
+def decode_color_blocks(blocks):
+    # BC1 color blocks of (block count, 8) uint8, returns (block count, 16, 3) uint8
+    value0 = blocks[:, 0:2].copy().view('<u2').reshape(-1)
+    value1 = blocks[:, 2:4].copy().view('<u2').reshape(-1)
+    indices = unpack_indices(blocks[:, 4:8].copy().view('<u4').reshape(-1).astype(np.uint64), 2)
+    endpoint0 = from_rgb565(value0)
+    endpoint1 = from_rgb565(value1)
+    four_colors = (value1 < value0)[:, np.newaxis]
+    palette = np.stack([endpoint0, endpoint1,
+                        np.where(four_colors, (endpoint0 * 2.0 + endpoint1) / 3.0, (endpoint0 + endpoint1) * 0.5),
+                        np.where(four_colors, (endpoint0 + endpoint1 * 2.0) / 3.0, 0.0)], axis=1)
+    colors = palette[np.arange(len(blocks))[:, np.newaxis], indices]
+    return np.clip(np.rint(colors), 0, 255).astype(np.uint8)
+
+
+def decode_single_channel_blocks(blocks):
+    # BC4 blocks of (block count, 8) uint8, returns (block count, 16) uint8
+    value0 = blocks[:, 0].astype(np.float32)
+    value1 = blocks[:, 1].astype(np.float32)
+    bits = np.zeros((len(blocks), 8), dtype=np.uint8)
+    bits[:, :6] = blocks[:, 2:8]
+    indices = unpack_indices(bits.view('<u8').reshape(-1), 3)
+    eight_values = (value1 < value0)[:, np.newaxis]
+    weights8 = np.array([0.0, 7.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0], dtype=np.float32) / 7.0
+    weights6 = np.array([0.0, 5.0, 1.0, 2.0, 3.0, 4.0, 0.0, 0.0], dtype=np.float32) / 5.0
+    palette = np.where(eight_values,
+                       value0[:, np.newaxis] * (1.0 - weights8) + value1[:, np.newaxis] * weights8,
+                       value0[:, np.newaxis] * (1.0 - weights6) + value1[:, np.newaxis] * weights6)
+    # the 6 value mode has 0 and 255 at the end
+    palette[:, 6] = np.where(eight_values[:, 0], palette[:, 6], 0.0)
+    palette[:, 7] = np.where(eight_values[:, 0], palette[:, 7], 255.0)
+    values = palette[np.arange(len(blocks))[:, np.newaxis], indices]
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+def get_pixels(blocks, width, height):
+    # the inverse of get_blocks, blocks is (block count, 16, channels)
+    block_rows = (height + 3) // 4
+    block_cols = (width + 3) // 4
+    channel_count = blocks.shape[2]
+    pixels = blocks.reshape(block_rows, block_cols, 4, 4, channel_count).transpose(0, 2, 1, 3, 4)
+    return np.ascontiguousarray(pixels.reshape(block_rows * 4, block_cols * 4, channel_count)[:height, :width])
+
+
+def decompress_texture(data, compression, width, height):
+    # returns the uint8 array of (height, width, channels) from the blocks, e.g. to read a compressed texture on the cpu.
+    blocks = np.asarray(data, dtype=np.uint8).reshape(-1, COMPRESSED_BLOCK_SIZES[compression])
+    if TEXTURE_COMPRESSION_BC1 == compression:
+        blocks = decode_color_blocks(blocks)
+    elif TEXTURE_COMPRESSION_BC3 == compression:
+        blocks = np.concatenate([decode_color_blocks(blocks[:, 8:16]),
+                                 decode_single_channel_blocks(blocks[:, 0:8])[..., np.newaxis]], axis=2)
+    elif TEXTURE_COMPRESSION_BC4 == compression:
+        blocks = decode_single_channel_blocks(blocks)[..., np.newaxis]
+    elif TEXTURE_COMPRESSION_BC5 == compression:
+        blocks = np.stack([decode_single_channel_blocks(blocks[:, 0:8]),
+                           decode_single_channel_blocks(blocks[:, 8:16])], axis=2)
+    else:
+        raise ValueError("unknown texture compression %s" % compression)
+    return get_pixels(blocks, width, height)
+
+
+def compress_texture(pixels, compression):
+    if TEXTURE_COMPRESSION_BC1 == compression:
+        return compress_bc1(pixels)
+    elif TEXTURE_COMPRESSION_BC3 == compression:
+        return compress_bc3(pixels)
+    elif TEXTURE_COMPRESSION_BC4 == compression:
+        return compress_bc4(pixels)
+    elif TEXTURE_COMPRESSION_BC5 == compression:
+        return compress_bc5(pixels)
+    raise ValueError("unknown texture compression %s" % compression)
@@ -0,0 +1,293 @@
+import argparse
+import json
+import multiprocessing
+import os
+import struct
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .TextureCompressor import get_texture_compression, compress_texture, get_compressed_size
+from .TextureCompressor import COMPRESSED_INTERNAL_FORMATS
+
+
+# Cooked texture container
+#   magic(8) | version(uint32) | header size(uint32) | header(json) | aligned mip blocks
+# The header keeps the texture info and the block table of the mip levels [offset, width, height],
+# the mip level 0 is the first block. The blocks are read by np.memmap and uploaded as they are.
+# The block compressed texture has 'compression' in the texture info and its blocks are the flat uint8 arrays.
+COOKED_TEXTURE_MAGIC = b'PYE3DTEX'
+COOKED_TEXTURE_VERSION = 1
+COOKED_TEXTURE_ALIGNMENT = 64
+COOKED_TEXTURE_PREFIX_SIZE = 16
+
+IMAGE_FILE_EXTS = ('.gif', '.jpg', '.jpeg', '.png', '.bmp', '.tga', '.tif', '.tiff', '.dds', '.ktx', '.pgm')
+
+# The mip filter is chosen by the file name.
+# color : averaged in the linear space and encoded to sRGB again
+# normal : the decoded normals are averaged and renormalized
+# linear : the data maps are averaged as they are
+TEXTURE_USAGE_COLOR = 'color'
+TEXTURE_USAGE_NORMAL = 'normal'
+TEXTURE_USAGE_LINEAR = 'linear'
+NORMAL_MAP_SUFFIXES = ('_n', '_nrm', '_norm', '_normal', '_ddn', '_bump')
+LINEAR_MAP_SUFFIXES = ('_spec', '_mask', '_gloss', '_rough', '_roughness', '_metal', '_metallic', '_ao', '_height',
+                       '_disp', '_noise')
+LINEAR_MAP_NAMES = ('heightmap', 'noise')
+
+
+def is_cooked_texture_file(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read(len(COOKED_TEXTURE_MAGIC)) == COOKED_TEXTURE_MAGIC
+    return False
+
+
+def align_offset(offset):
+    return (offset + COOKED_TEXTURE_ALIGNMENT - 1) // COOKED_TEXTURE_ALIGNMENT * COOKED_TEXTURE_ALIGNMENT
+
+
+def get_texture_usage(filepath):
+    name = os.path.splitext(os.path.basename(filepath))[0].lower()
+    if name.endswith(NORMAL_MAP_SUFFIXES):
+        return TEXTURE_USAGE_NORMAL
+    elif name.endswith(LINEAR_MAP_SUFFIXES) or name.startswith(LINEAR_MAP_NAMES):
+        return TEXTURE_USAGE_LINEAR
+    return TEXTURE_USAGE_COLOR
+
+
+def decode_image(source_filepath):
+    # returns (image mode, the image array of (height, width, channels) in uint8), the rows are bottom-up same as GL.
+    image = Image.open(source_filepath)
+    if image.mode in ('I;16', 'I;16B', 'I;16L', 'I', 'F'):
+        # high precision grayscale to 8 bit
+        pixels = np.asarray(image, dtype=np.float64)
+        max_value = 65535.0 if image.mode.startswith('I;16') else max(1.0, float(np.max(pixels)))
+        if 'F' == image.mode:
+            max_value = 1.0
+        pixels = np.clip(pixels / max_value * 255.0 + 0.5, 0.0, 255.0).astype(np.uint8)
+        image = Image.fromarray(pixels, 'L')
+
+    # the grayscale and the palette images are converted to RGBA
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    pixels = np.asarray(image, dtype=np.uint8)
+    return image.mode, np.ascontiguousarray(pixels[::-1])
+
+
+def srgb_to_linear(color):
+    return np.where(color <= 0.04045, color / 12.92, ((color + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(color):
+    color = np.maximum(color, 0.0)
+    return np.where(color <= 0.0031308, color * 12.92, 1.055 * (color ** (1.0 / 2.4)) - 0.055)
+
+
+def downsample_axis(pixels, axis):
+    # Box filter to the next mip size max(1, size // 2), every output texel is the area weighted average
+    # of the source texels under it, so the odd sizes are filtered without any shift.
+    size = pixels.shape[axis]
+    mip_size = max(1, size // 2)
+    if size == mip_size * 2:
+        shape = pixels.shape[:axis] + (mip_size, 2) + pixels.shape[axis + 1:]
+        return np.mean(pixels.reshape(shape), axis=axis + 1)
+    elif size == mip_size:
+        return pixels
+
+    scale = size / mip_size
+    starts = np.arange(mip_size) * scale
+    ends = starts + scale
+    first = np.floor(starts).astype(np.int64)
+    weight_shape = [1] * pixels.ndim
+    weight_shape[axis] = mip_size
+    result = np.zeros(pixels.shape[:axis] + (mip_size,) + pixels.shape[axis + 1:], dtype=pixels.dtype)
+    for tap in range(int(np.ceil(scale)) + 1):
+        index = first + tap
+        weight = np.clip(np.minimum(index + 1, ends) - np.maximum(index, starts), 0.0, None) / scale
+        index = np.minimum(index, size - 1)
+        result += np.take(pixels, index, axis=axis) * weight.reshape(weight_shape).astype(pixels.dtype)
+    return result
+
+
+def downsample(pixels):
+    return downsample_axis(downsample_axis(pixels, 0), 1)
+
+
+def generate_mipmaps(pixels, usage=TEXTURE_USAGE_COLOR):
+    # pixels is the uint8 array of (height, width, channels), returns the uint8 arrays of all mip levels.
+    # The chain is filtered in float from the previous level, it is quantized only to store each level.
+    channel_count = pixels.shape[2]
+    color_count = min(3, channel_count)
+    texels = pixels.astype(np.float32) / 255.0
+    if TEXTURE_USAGE_COLOR == usage:
+        texels[..., :color_count] = srgb_to_linear(texels[..., :color_count])
+    elif TEXTURE_USAGE_NORMAL == usage:
+        texels[..., :color_count] = texels[..., :color_count] * 2.0 - 1.0
+
+    mipmaps = [np.ascontiguousarray(pixels, dtype=np.uint8)]
+    while 1 < texels.shape[0] or 1 < texels.shape[1]:
+        texels = downsample(texels)
+        mip = texels.copy()
+        if TEXTURE_USAGE_COLOR == usage:
+            mip[..., :color_count] = linear_to_srgb(mip[..., :color_count])
+        elif TEXTURE_USAGE_NORMAL == usage and 3 <= channel_count:
+            normals = mip[..., :3]
+            length = np.linalg.norm(normals, axis=-1, keepdims=True)
+            normals = np.where(1e-6 < length, normals / np.maximum(length, 1e-6), (0.0, 0.0, 1.0))
+            mip[..., :3] = normals * 0.5 + 0.5
+        elif TEXTURE_USAGE_NORMAL == usage:
+            mip[..., :color_count] = mip[..., :color_count] * 0.5 + 0.5
+        mipmaps.append(np.clip(mip * 255.0 + 0.5, 0.0, 255.0).astype(np.uint8))
+    return mipmaps
+
+
+def cook_texture(source_filepath, usage=None, compress=False):
+    # Decode and generate the mip chain of an image file without any GL call, so it can run on a loading process.
+    # returns the texture datas, 'data' is the mip level 0 and 'mipmap_datas' is the others.
+    if not os.path.exists(source_filepath):
+        return None
+
+    usage = usage or get_texture_usage(source_filepath)
+    image_mode, pixels = decode_image(source_filepath)
+    mipmaps = generate_mipmaps(pixels, usage)
+    height, width = pixels.shape[:2]
+    texture_datas = dict(image_mode=image_mode, width=width, height=height)
+    # the linear data maps, e.g. the height maps, are read on the cpu and the block compression breaks the values.
+    if compress and TEXTURE_USAGE_LINEAR != usage:
+        compression = get_texture_compression(pixels, TEXTURE_USAGE_NORMAL == usage)
+        mipmaps = [compress_texture(mip, compression) for mip in mipmaps]
+        texture_datas['compression'] = compression
+        texture_datas['internal_format'] = COMPRESSED_INTERNAL_FORMATS[compression]
+    texture_datas['data'] = mipmaps[0]
+    texture_datas['mipmap_datas'] = mipmaps[1:]
+    return texture_datas
+
+
+def save_cooked_texture(filepath, texture_datas):
+    mipmaps = [texture_datas['data']] + list(texture_datas.get('mipmap_datas', []))
+    mipmaps = [np.ascontiguousarray(mip) for mip in mipmaps]
+    dtype = mipmaps[0].dtype
+    channel_count = mipmaps[0].size // max(1, texture_datas['width'] * texture_datas['height'])
+
+    texture_info = {key: value for key, value in texture_datas.items() if key not in ('data', 'mipmap_datas')}
+    texture_info.setdefault('texture_type', 'Texture2D')
+    if not isinstance(texture_info['texture_type'], str):
+        texture_info['texture_type'] = texture_info['texture_type'].__name__
+
+    # block table, offsets are relative to the data section
+    blocks = []
+    offset = 0
+    width = texture_datas['width']
+    height = texture_datas['height']
+    for mip in mipmaps:
+        offset = align_offset(offset)
+        blocks.append([offset, width, height])
+        offset += mip.nbytes
+        width = max(1, width // 2)
+        height = max(1, height // 2)
+
+    header = dict(texture=texture_info, dtype=dtype.str, channel_count=channel_count, blocks=blocks)
+    header = json.dumps(header).encode('utf-8')
+    data_offset = align_offset(COOKED_TEXTURE_PREFIX_SIZE + len(header))
+
+    # the file is replaced at once, the memory maps of the old file are still valid for the streaming textures.
+    temp_filepath = filepath + '.tmp'
+    with open(temp_filepath, 'wb') as f:
+        f.write(COOKED_TEXTURE_MAGIC)
+        f.write(struct.pack('<II', COOKED_TEXTURE_VERSION, len(header)))
+        f.write(header)
+        for (block_offset, width, height), mip in zip(blocks, mipmaps):
+            f.seek(data_offset + block_offset)
+            f.write(mip.tobytes())
+    os.replace(temp_filepath, filepath)
+
+
+def load_cooked_texture(filepath):
+    with open(filepath, 'rb') as f:
+        prefix = f.read(COOKED_TEXTURE_PREFIX_SIZE)
+        if prefix[:len(COOKED_TEXTURE_MAGIC)] != COOKED_TEXTURE_MAGIC:
+            raise ValueError("%s is not a cooked texture file." % filepath)
+        version, header_size = struct.unpack('<II', prefix[len(COOKED_TEXTURE_MAGIC):])
+        if version != COOKED_TEXTURE_VERSION:
+            raise ValueError("%s has unsupported cooked texture version %d." % (filepath, version))
+        header = json.loads(f.read(header_size).decode('utf-8'))
+
+    data_offset = align_offset(COOKED_TEXTURE_PREFIX_SIZE + header_size)
+    dtype = np.dtype(header['dtype'])
+    channel_count = header['channel_count']
+    texture_datas = header['texture']
+    compression = texture_datas.get('compression')
+
+    def get_shape(width, height):
+        if compression:
+            return get_compressed_size(compression, width, height),
+        return height, width, channel_count
+
+    mipmaps = [np.memmap(filepath, dtype=dtype, mode='c', offset=data_offset + offset, shape=get_shape(width, height))
+               for offset, width, height in header['blocks']]
+
+    texture_datas['data'] = mipmaps[0]
+    texture_datas['mipmap_datas'] = mipmaps[1:]
+    return texture_datas
+
+
+def cook_texture_file(source_filepath, output_filepath, compress=False):
+    texture_datas = cook_texture(source_filepath, compress=compress)
+    if texture_datas is None:
+        raise ValueError("%s is not exists." % source_filepath)
+    output_dir = os.path.dirname(output_filepath)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+    save_cooked_texture(output_filepath, texture_datas)
+    return output_filepath
+
+
+def cook_textures(source_dir, output_dir, file_ext='.texture', process_count=None, force=False, compress=False):
+    # Cook all images of the source directory to the output directory on the processes, the sub directories are kept.
+    # The cooked file newer than the source is skipped unless force. returns the list of the cooked files.
+    jobs = []
+    for dirname, dirnames, filenames in os.walk(source_dir):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() not in IMAGE_FILE_EXTS:
+                continue
+            source_filepath = os.path.join(dirname, filename)
+            relative_path = os.path.relpath(source_filepath, source_dir)
+            output_filepath = os.path.join(output_dir, os.path.splitext(relative_path)[0] + file_ext)
+            if not force and os.path.exists(output_filepath) and \
+                    os.path.getmtime(source_filepath) <= os.path.getmtime(output_filepath):
+                continue
+            jobs.append((source_filepath, output_filepath))
+
+    cooked_files = []
+    if not jobs:
+        return cooked_files
+
+    process_count = process_count or os.cpu_count() or 1
+    # spawn same as the loading processes, the workers don't inherit anything of the parent.
+    with ProcessPoolExecutor(max_workers=min(process_count, len(jobs)),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [(source_filepath, executor.submit(cook_texture_file, source_filepath, output_filepath, compress))
+                   for source_filepath, output_filepath in jobs]
+        for source_filepath, future in futures:
+            try:
+                cooked_files.append(future.result())
+                print("Cooked : %s" % source_filepath)
+            except:
+                print("Failed to cook : %s" % source_filepath)
+                print(traceback.format_exc())
+    return cooked_files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cook the images to the texture files without GPU.')
+    parser.add_argument('source_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--ext', default='.texture')
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--compress', action='store_true', help='BC1/BC3/BC4/BC5 block compression')
+    args = parser.parse_args()
+    cook_textures(args.source_dir, args.output_dir, args.ext, args.jobs, args.force, args.compress)
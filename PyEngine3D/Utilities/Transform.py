@@ -36,6 +36,8 @@ MATRIX4_IDENTITY = np.eye(4, dtype=np.float32)
 WORLD_LEFT = np.array([1.0, 0.0, 0.0], dtype=np.float32)
 WORLD_UP = np.array([0.0, 1.0, 0.0], dtype=np.float32)
 WORLD_FRONT = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+TANGENT_MODE_AREA_WEIGHTED = 'area_weighted'
+TANGENT_MODE_MIKKTSPACE = 'mikktspace'
 
 
 def Float(x=0.0):
@@ -77,6 +79,12 @@ def normalize(v):
     return v / m
 
 
+def normalize_vectors(vectors):
+    # the batch version of normalize, the zero vectors are kept.
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(0.0 == lengths, 1.0, lengths)
+
+
 def dot_arrays(*array_list):
     return reduce(np.dot, array_list)
 
@@ -131,6 +139,29 @@ def matrix_rotation(rotation_matrix, rx, ry, rz):
     rotation_matrix[:, 2] = [-sh*ca, sh*sa*cb + ch*sb, -sh*sa*sb + ch*cb, 0.0]
 
 
+def eulers_to_matrices(rotations):
+    # the batch version of matrix_rotation, rotations is (n, 3)
+    rotations = rotations.astype(np.float64)
+    ch = np.cos(rotations[:, 1])
+    sh = np.sin(rotations[:, 1])
+    ca = np.cos(rotations[:, 2])
+    sa = np.sin(rotations[:, 2])
+    cb = np.cos(rotations[:, 0])
+    sb = np.sin(rotations[:, 0])
+    matrices = np.zeros((len(rotations), 4, 4), dtype=np.float32)
+    matrices[:, 0, 0] = ch * ca
+    matrices[:, 1, 0] = sh * sb - ch * sa * cb
+    matrices[:, 2, 0] = ch * sa * sb + sh * cb
+    matrices[:, 0, 1] = sa
+    matrices[:, 1, 1] = ca * cb
+    matrices[:, 2, 1] = -ca * sb
+    matrices[:, 0, 2] = -sh * ca
+    matrices[:, 1, 2] = sh * sa * cb + ch * sb
+    matrices[:, 2, 2] = -sh * sa * sb + ch * cb
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
 def matrix_to_vectors(rotation_matrix, axis_x, axis_y, axis_z, do_normalize=False):
     if do_normalize:
         rotation_matrix[0, 0:3] = normalize(rotation_matrix[0, 0:3])
@@ -273,6 +304,32 @@ def quaternion_to_matrix(quat, rotation_matrix):
     '''
 
 
+def quaternions_to_matrices(quats):
+    # the batch version of quaternion_to_matrix, quats is (n, 4)
+    qw, qx, qy, qz = [quats[:, i] for i in range(4)]
+    qxqx = qx * qx * 2.0
+    qxqy = qx * qy * 2.0
+    qxqz = qx * qz * 2.0
+    qxqw = qx * qw * 2.0
+    qyqy = qy * qy * 2.0
+    qyqz = qy * qz * 2.0
+    qyqw = qy * qw * 2.0
+    qzqw = qz * qw * 2.0
+    qzqz = qz * qz * 2.0
+    matrices = np.zeros((len(quats), 4, 4), dtype=np.float32)
+    matrices[:, 0, 0] = 1.0 - qyqy - qzqz
+    matrices[:, 0, 1] = qxqy + qzqw
+    matrices[:, 0, 2] = qxqz - qyqw
+    matrices[:, 1, 0] = qxqy - qzqw
+    matrices[:, 1, 1] = 1.0 - qxqx - qzqz
+    matrices[:, 1, 2] = qyqz + qxqw
+    matrices[:, 2, 0] = qxqz + qyqw
+    matrices[:, 2, 1] = qyqz - qxqw
+    matrices[:, 2, 2] = 1.0 - qxqx - qyqy
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
 def quaternion_to_euler(q):
     sqw = w * w
     sqx = x * x
@@ -320,6 +377,21 @@ def slerp(quaternion1, quaternion2, amount):
     return (num3 * quaternion1) + (num2 * quaternion2)
 
 
+def slerp_quaternions(quaternions1, quaternions2, amount):
+    # the batch version of slerp, amount is a scalar or (n, ) array
+    amount = np.broadcast_to(np.asarray(amount, dtype=np.float64), quaternions1.shape[:-1])
+    num4 = np.sum(quaternions1 * quaternions2, axis=-1, dtype=np.float64)
+    flag = num4 < 0.0
+    num4 = np.abs(num4)
+    linear = num4 > 0.999999
+    num5 = np.arccos(np.minimum(num4, 1.0))
+    num6 = 1.0 / np.sin(np.where(linear, 1.0, num5))
+    num3 = np.where(linear, 1.0 - amount, np.sin((1.0 - amount) * num5) * num6)
+    num2 = np.where(linear, amount, np.sin(amount * num5) * num6)
+    num2 = np.where(flag, -num2, num2)
+    return num3[..., np.newaxis] * quaternions1 + num2[..., np.newaxis] * quaternions2
+
+
 def set_identity_matrix(M):
     M[...] = [[1.0, 0.0, 0.0, 0.0],
             [0.0, 1.0, 0.0, 0.0],
@@ -574,21 +646,50 @@ def perspective(fovy, aspect, znear, zfar):
 def convert_triangulate(polygon, vcount, stride=1):
     indices_list = [polygon[i * stride:i * stride + stride] for i in range(int(len(polygon) / stride))]
     triangulated_list = []
-    # first triangle
-    triangulated_list += indices_list[0]
-    triangulated_list += indices_list[1]
-    triangulated_list += indices_list[2]
-    t1 = indices_list[1]  # center of poylgon
-    t2 = indices_list[2]
-    for i in range(3, vcount):
-        triangulated_list += t2
-        triangulated_list += t1
+    # triangle fan around the first vertex
+    for i in range(2, vcount):
+        triangulated_list += indices_list[0]
+        triangulated_list += indices_list[i - 1]
         triangulated_list += indices_list[i]
-        t2 = indices_list[i]
+    return triangulated_list
+
+
+def triangulate_polygons(vcount_list):
+    # the batch version of convert_triangulate, returns the vertex indices of the triangles, shape is (n, 3).
+    # the polygons which have less than 3 vertices are skipped.
+    vcount_list = np.asarray(vcount_list, dtype=np.int64)
+    triangle_counts = np.maximum(vcount_list - 2, 0)
+    polygon_offsets = np.cumsum(vcount_list) - vcount_list
+    polygon_ids = np.repeat(np.arange(len(vcount_list)), triangle_counts)
+    fan_indices = np.arange(len(polygon_ids)) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts)
+    triangles = np.stack([np.zeros(len(polygon_ids), dtype=np.int64), fan_indices + 1, fan_indices + 2], axis=-1)
+    return triangles + polygon_offsets[polygon_ids][:, np.newaxis]
+
+
+def get_unique_vertices(vertex_keys):
+    """
+    deduplicate the rows of vertex_keys, the new vertices are in order of the first appearance.
+    :param vertex_keys: the index tuples of the vertices, shape is (n, key size)
+    :return: the unique rows, the indices of the rows in the unique rows
+    """
+    vertex_keys = np.reshape(vertex_keys, (len(vertex_keys), -1))
+    if 0 == len(vertex_keys):
+        return vertex_keys, np.zeros(0, dtype=np.uint32)
+    order = np.lexsort(vertex_keys.T[::-1])
+    sorted_keys = vertex_keys[order]
+    is_first = np.ones(len(order), dtype=np.bool_)
+    is_first[1:] = np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+    first_appearances = order[is_first]
+    vertex_order = np.argsort(first_appearances, kind='stable')
+    vertex_ranks = np.empty(len(vertex_order), dtype=np.int64)
+    vertex_ranks[vertex_order] = np.arange(len(vertex_order))
+    indices = np.empty(len(order), dtype=np.uint32)
+    indices[order] = vertex_ranks[np.cumsum(is_first) - 1]
+    return vertex_keys[np.sort(first_appearances)], indices
 
 
 # http://jerome.jouvie.free.fr/opengl-tutorials/Lesson8.php
-def compute_tangent(is_triangle_mode, positions, texcoords, normals, indices):
+def compute_tangent_space(is_triangle_mode, positions, texcoords, normals, indices, tangent_mode=TANGENT_MODE_AREA_WEIGHTED):
     """
     Note: This point can also be considered as the vector starting from the origin to pi.
     Writting this equation for the points p1, p2 and p3 give :
@@ -617,59 +718,98 @@ def compute_tangent(is_triangle_mode, positions, texcoords, normals, indices):
 
     Equation of N:
         N = cross(T, B)
-    """
 
-    tangents = np.array([[1.0, 0.0, 0.0], ] * len(normals), dtype=np.float32)
-    # binormals = np.array([[0.0, 0.0, 1.0], ] * len(normals), dtype=np.float32)
+    All of the faces are computed at once, the quads are two triangles (0, 1, 2), (0, 2, 3).
+        TANGENT_MODE_AREA_WEIGHTED : the normalized T, B of the faces are weighted by the area of the faces.
+        TANGENT_MODE_MIKKTSPACE : same as MikkTSpace, T of the faces are projected onto the tangent plane of the vertex
+            normal and weighted by the angle of the corners, the faces are grouped by the handedness.
+            The vertices are not split, so a vertex on a mirrored uv seam takes the group which has the larger weight.
+    The tangents are orthogonalized to the normals, and bitangent = handedness * cross(N, T).
+    returns tangents, bitangents, handedness
+    """
+    positions = np.reshape(np.asarray(positions, dtype=np.float64), (-1, 3))
+    texcoords = np.reshape(np.asarray(texcoords, dtype=np.float64), (-1, 2))
+    normals = np.reshape(np.asarray(normals, dtype=np.float64), (-1, 3))
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    vertex_count = len(positions)
 
     if is_triangle_mode:
-        for i in range(0, len(indices), 3):
-            i0, i1, i2 = indices[i:i + 3]
-            deltaPos_0_1 = positions[i1] - positions[i0]
-            deltaPos_0_2 = positions[i2] - positions[i0]
-            deltaUV_0_1 = texcoords[i1] - texcoords[i0]
-            deltaUV_0_2 = texcoords[i2] - texcoords[i0]
-            r = deltaUV_0_1[0] * deltaUV_0_2[1] - deltaUV_0_1[1] * deltaUV_0_2[0]
-            r = (1.0 / r) if r != 0.0 else 0.0
-
-            tangent = (deltaPos_0_1 * deltaUV_0_2[1] - deltaPos_0_2 * deltaUV_0_1[1]) * r
-            tangent = normalize(tangent)
-            # binormal = (deltaPos_0_2 * deltaUV_0_1[0]   - deltaPos_0_1 * deltaUV_0_2[0]) * r
-            # binormal = normalize(binormal)
-
-            # invalid tangent
-            if 0.0 == np.dot(tangent, tangent):
-                avg_normal = normalize(normals[i0] + normals[i1] + normals[i2])
-                tangent = np.cross(avg_normal, WORLD_UP)
-
-            tangents[indices[i]] = tangent
-            tangents[indices[i + 1]] = tangent
-            tangents[indices[i + 2]] = tangent
-
-            # binormals[indices[i]] = binormal
-            # binormals[indices[i+1]] = binormal
-            # binormals[indices[i+2]] = binormal
+        triangles = indices[:len(indices) // 3 * 3].reshape(-1, 3)
+    else:
+        quads = indices[:len(indices) // 4 * 4].reshape(-1, 4)
+        triangles = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+
+    p0, p1, p2 = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+    uv0, uv1, uv2 = texcoords[triangles[:, 0]], texcoords[triangles[:, 1]], texcoords[triangles[:, 2]]
+    deltaPos_0_1 = p1 - p0
+    deltaPos_0_2 = p2 - p0
+    deltaUV_0_1 = uv1 - uv0
+    deltaUV_0_2 = uv2 - uv0
+    r = deltaUV_0_1[:, 0] * deltaUV_0_2[:, 1] - deltaUV_0_1[:, 1] * deltaUV_0_2[:, 0]
+    face_handedness = np.where(r < 0.0, -1.0, 1.0)
+    face_tangents = normalize_vectors((deltaPos_0_1 * deltaUV_0_2[:, 1:2] - deltaPos_0_2 * deltaUV_0_1[:, 1:2]) * face_handedness[:, np.newaxis])
+    face_bitangents = normalize_vectors((deltaPos_0_2 * deltaUV_0_1[:, 0:1] - deltaPos_0_1 * deltaUV_0_2[:, 0:1]) * face_handedness[:, np.newaxis])
+    valid_faces = r != 0.0
+
+    corner_vertices = triangles.reshape(-1)
+    vertex_normals = normalize_vectors(normals)
+
+    def accumulate(vectors, weights):
+        result = np.zeros((vertex_count, 3), dtype=np.float64)
+        for i in range(3):
+            result[:, i] = np.bincount(corner_vertices, weights=vectors[:, i] * weights, minlength=vertex_count)
+        return result
+
+    if TANGENT_MODE_MIKKTSPACE == tangent_mode:
+        # angle of the corners
+        corner_positions = np.stack([p0, p1, p2], axis=1)
+        edges_prev = normalize_vectors(np.roll(corner_positions, 1, axis=1) - corner_positions)
+        edges_next = normalize_vectors(np.roll(corner_positions, -1, axis=1) - corner_positions)
+        angles = np.arccos(np.clip(np.sum(edges_prev * edges_next, axis=-1), -1.0, 1.0)).reshape(-1)
+        angles = np.where(np.repeat(valid_faces, 3), angles, 0.0)
+
+        corner_normals = vertex_normals[corner_vertices]
+        corner_tangents = np.repeat(face_tangents, 3, axis=0)
+        corner_tangents = normalize_vectors(corner_tangents - corner_normals * np.sum(corner_normals * corner_tangents, axis=-1, keepdims=True))
+        # the handedness of the frame, it does not depend on the winding order of the triangle.
+        corner_bitangents = np.repeat(face_bitangents, 3, axis=0)
+        corner_handedness = np.where(np.sum(np.cross(corner_normals, corner_tangents) * corner_bitangents, axis=-1) < 0.0, -1.0, 1.0)
+
+        positive_weights = np.where(0.0 < corner_handedness, angles, 0.0)
+        negative_weights = np.where(corner_handedness < 0.0, angles, 0.0)
+        positive_tangents = accumulate(corner_tangents, positive_weights)
+        negative_tangents = accumulate(corner_tangents, negative_weights)
+        is_positive = np.bincount(corner_vertices, weights=negative_weights, minlength=vertex_count) <= \
+            np.bincount(corner_vertices, weights=positive_weights, minlength=vertex_count)
+        tangents = np.where(is_positive[:, np.newaxis], positive_tangents, negative_tangents)
+        handedness = np.where(is_positive, 1.0, -1.0)
     else:
-        for i in range(0, len(indices), 4):
-            i0, i1, i2, i3 = indices[i:i + 4]
-            deltaPos_0_1 = positions[i1] - positions[i0]
-            deltaPos_0_2 = positions[i2] - positions[i0]
-            deltaUV_0_1 = texcoords[i1] - texcoords[i0]
-            deltaUV_0_2 = texcoords[i2] - texcoords[i0]
-            r = deltaUV_0_1[0] * deltaUV_0_2[1] - deltaUV_0_1[1] * deltaUV_0_2[0]
-            r = (1.0 / r) if r != 0.0 else 0.0
-
-            tangent = (deltaPos_0_1 * deltaUV_0_2[1] - deltaPos_0_2 * deltaUV_0_1[1]) * r
-            tangent = normalize(tangent)
-
-            # invalid tangent
-            if 0.0 == np.dot(tangent, tangent):
-                avg_normal = normalize(normals[i0] + normals[i1] + normals[i2])
-                tangent = np.cross(avg_normal, WORLD_UP)
-
-            tangents[indices[i]] = tangent
-            tangents[indices[i + 1]] = tangent
-            tangents[indices[i + 2]] = tangent
-            tangents[indices[i + 3]] = tangent
-    # return tangents, binormals
-    return tangents
+        areas = np.linalg.norm(np.cross(deltaPos_0_1, deltaPos_0_2), axis=-1) * 0.5
+        areas = np.repeat(np.where(valid_faces, areas, 0.0), 3)
+        tangents = accumulate(np.repeat(face_tangents, 3, axis=0), areas)
+        bitangents = accumulate(np.repeat(face_bitangents, 3, axis=0), areas)
+        handedness = None
+
+    # Gram-Schmidt orthogonalize
+    tangents = tangents - vertex_normals * np.sum(vertex_normals * tangents, axis=-1, keepdims=True)
+    tangents = normalize_vectors(tangents)
+
+    # invalid tangent
+    invalid = np.sum(tangents * tangents, axis=-1) < 1e-12
+    if np.any(invalid):
+        fallback_tangents = np.cross(vertex_normals[invalid], WORLD_UP)
+        parallel = np.sum(fallback_tangents * fallback_tangents, axis=-1) < 1e-12
+        fallback_tangents[parallel] = np.cross(vertex_normals[invalid][parallel], WORLD_FRONT)
+        fallback_tangents = normalize_vectors(fallback_tangents)
+        fallback_tangents[np.sum(fallback_tangents * fallback_tangents, axis=-1) < 1e-12] = WORLD_LEFT
+        tangents[invalid] = fallback_tangents
+
+    bitangents_of_normals = np.cross(vertex_normals, tangents)
+    if handedness is None:
+        handedness = np.where(np.sum(bitangents_of_normals * bitangents, axis=-1) < 0.0, -1.0, 1.0)
+    bitangents = bitangents_of_normals * handedness[:, np.newaxis]
+    return tangents.astype(np.float32), bitangents.astype(np.float32), handedness.astype(np.float32)
+
+
+def compute_tangent(is_triangle_mode, positions, texcoords, normals, indices, tangent_mode=TANGENT_MODE_AREA_WEIGHTED):
+    return compute_tangent_space(is_triangle_mode, positions, texcoords, normals, indices, tangent_mode)[0]
@@ -7,6 +7,10 @@ class TransformObject:
     def __init__(self, local=None):
         self.local = local if local is not None else Matrix4()
 
+        # the arrays are the views of TransformPool rows while attached
+        self.pool = None
+        self.pool_index = -1
+
         self.updated = True
 
         self.left = WORLD_LEFT.copy()
@@ -232,6 +236,14 @@ class TransformObject:
 
     # update Transform
     def update_transform(self, update_inverse_matrix=False, force_update=False):
+        if self.pool is not None:
+            if self.pool.pending[self.pool_index] and not force_update:
+                # already updated by TransformPool.update_transforms
+                self.pool.pending[self.pool_index] = False
+                self.updated = bool(self.pool.updated[self.pool_index])
+                return self.updated
+            self.updated = bool(self.pool.updated[self.pool_index])
+
         prev_updated = self.updated
         self.updated = False
         rotation_update = False
@@ -277,6 +289,8 @@ class TransformObject:
                 self.inverse_matrix[...] = self.local
                 inverse_transform_matrix(self.inverse_matrix, self.pos, self.rotationMatrix, self.scale)
 
+        if self.pool is not None:
+            self.pool.updated[self.pool_index] = self.updated
         return self.updated
 
     def get_transform_infos(self):
@@ -0,0 +1,206 @@
+import numpy as np
+
+from .Transform import *
+
+
+# name and shape of the arrays shared with TransformObject, the attached TransformObject holds views of its rows.
+VECTOR_ARRAYS = (('left', WORLD_LEFT), ('up', WORLD_UP), ('front', WORLD_FRONT),
+                 ('pos', (0.0, 0.0, 0.0)), ('rot', (0.0, 0.0, 0.0)), ('scale', (1.0, 1.0, 1.0)),
+                 ('quat', QUATERNION_IDENTITY), ('final_rotation', QUATERNION_IDENTITY),
+                 ('prev_pos', (0.0, 0.0, 0.0)), ('prev_Rot', (0.0, 0.0, 0.0)), ('prev_Scale', (1.0, 1.0, 1.0)),
+                 ('prev_quat', QUATERNION_IDENTITY), ('prev_pos_store', (0.0, 0.0, 0.0)))
+
+MATRIX_ARRAYS = ('local', 'quaternionMatrix', 'eulerMatrix', 'rotationMatrix',
+                 'matrix', 'inverse_matrix', 'prev_matrix', 'prev_inverse_matrix')
+
+
+# Structure of arrays storage of TransformObjects.
+# update_transforms does the dirty check and the matrix composition of all the attached transforms at once,
+# then TransformObject.update_transform of an attached transform just takes the result.
+# The arrays are reallocated when the pool grows, so do not keep references of the attached transform arrays.
+class TransformPool:
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.count = 0
+        self.transforms = []
+        self.owners = []
+        self.free_slots = []
+        self.alive = np.zeros(0, dtype=np.bool_)
+        self.updated = np.zeros(0, dtype=np.bool_)
+        self.pending = np.zeros(0, dtype=np.bool_)
+        for name, default_value in VECTOR_ARRAYS:
+            setattr(self, name, np.zeros((0, len(default_value)), dtype=np.float32))
+        for name in MATRIX_ARRAYS:
+            setattr(self, name, np.zeros((0, 4, 4), dtype=np.float32))
+        self.resize(capacity)
+
+    def get_count(self):
+        return self.count - len(self.free_slots)
+
+    def resize(self, capacity):
+        def resize_array(array, default_value):
+            new_array = np.empty((capacity, ) + array.shape[1:], dtype=array.dtype)
+            new_array[:self.capacity] = array
+            new_array[self.capacity:] = default_value
+            return new_array
+
+        self.alive = resize_array(self.alive, False)
+        self.updated = resize_array(self.updated, False)
+        self.pending = resize_array(self.pending, False)
+        for name, default_value in VECTOR_ARRAYS:
+            setattr(self, name, resize_array(getattr(self, name), default_value))
+        for name in MATRIX_ARRAYS:
+            setattr(self, name, resize_array(getattr(self, name), MATRIX4_IDENTITY))
+        self.capacity = capacity
+
+        # the views of the attached transforms refer to the old arrays.
+        for index, transform in enumerate(self.transforms):
+            if transform is not None:
+                self.bind_views(transform, index)
+
+    def bind_views(self, transform, index):
+        transform.pool = self
+        transform.pool_index = index
+        for name, default_value in VECTOR_ARRAYS:
+            setattr(transform, name, getattr(self, name)[index])
+        for name in MATRIX_ARRAYS:
+            setattr(transform, name, getattr(self, name)[index])
+
+    def attach(self, transform, owner=None):
+        # owner is the object of the transform, e.g. the actor, which is returned by get_updated_owners.
+        if transform.pool is self:
+            return
+        elif transform.pool is not None:
+            transform.pool.detach(transform)
+
+        if self.free_slots:
+            index = self.free_slots.pop()
+            self.transforms[index] = transform
+            self.owners[index] = owner
+        else:
+            index = self.count
+            self.count += 1
+            self.transforms.append(transform)
+            self.owners.append(owner)
+            if self.capacity <= index:
+                self.resize(max(64, self.capacity * 2))
+
+        for name, default_value in VECTOR_ARRAYS:
+            getattr(self, name)[index] = getattr(transform, name)
+        for name in MATRIX_ARRAYS:
+            getattr(self, name)[index] = getattr(transform, name)
+        self.alive[index] = True
+        self.updated[index] = transform.updated
+        self.pending[index] = False
+        self.bind_views(transform, index)
+
+    def detach(self, transform):
+        if transform.pool is not self:
+            return
+
+        index = transform.pool_index
+        for name, default_value in VECTOR_ARRAYS:
+            setattr(transform, name, getattr(self, name)[index].copy())
+        for name in MATRIX_ARRAYS:
+            setattr(transform, name, getattr(self, name)[index].copy())
+        transform.updated = bool(self.updated[index])
+        transform.pool = None
+        transform.pool_index = -1
+
+        self.transforms[index] = None
+        self.owners[index] = None
+        self.alive[index] = False
+        self.updated[index] = False
+        self.pending[index] = False
+        self.free_slots.append(index)
+
+    def clear(self):
+        for transform in self.transforms:
+            if transform is not None:
+                self.detach(transform)
+        self.count = 0
+        self.transforms = []
+        self.owners = []
+        self.free_slots = []
+
+    def get_updated_owners(self):
+        # the owners of the transforms which are changed by the last update_transforms
+        owners = self.owners
+        return [owners[index] for index in np.flatnonzero(self.updated[:self.count]) if owners[index] is not None]
+
+    def clear_pending(self):
+        self.pending[...] = False
+
+    def update_transforms(self):
+        # the batch version of TransformObject.update_transform with update_inverse_matrix=True
+        count = self.count
+        if count < 1:
+            return
+
+        alive = self.alive[:count]
+        pos_changed = np.any(self.prev_pos[:count] != self.pos[:count], axis=1) & alive
+        quat_changed = np.any(self.prev_quat[:count] != self.quat[:count], axis=1) & alive
+        rot_changed = np.any(self.prev_Rot[:count] != self.rot[:count], axis=1) & alive
+        scale_changed = np.any(self.prev_Scale[:count] != self.scale[:count], axis=1) & alive
+        rotation_changed = quat_changed | rot_changed
+        updated = pos_changed | rotation_changed | scale_changed
+
+        indices = np.flatnonzero(pos_changed)
+        if 0 < len(indices):
+            self.prev_pos_store[indices] = self.prev_pos[indices]
+            self.prev_pos[indices] = self.pos[indices]
+
+        indices = np.flatnonzero(quat_changed)
+        if 0 < len(indices):
+            self.prev_quat[indices] = self.quat[indices]
+            self.quaternionMatrix[indices] = quaternions_to_matrices(self.quat[indices])
+
+        indices = np.flatnonzero(rot_changed)
+        if 0 < len(indices):
+            self.prev_Rot[indices] = self.rot[indices]
+            self.eulerMatrix[indices] = eulers_to_matrices(self.rot[indices])
+
+        indices = np.flatnonzero(rotation_changed)
+        if 0 < len(indices):
+            rotation_matrices = np.matmul(self.eulerMatrix[indices], self.quaternionMatrix[indices])
+            # same as matrix_to_vectors with do_normalize
+            axis = rotation_matrices[:, 0:3, 0:3]
+            lengths = np.linalg.norm(axis, axis=2, keepdims=True)
+            axis[...] = np.where(0.0 == lengths, axis, axis / np.where(0.0 == lengths, 1.0, lengths))
+            self.rotationMatrix[indices] = rotation_matrices
+            self.left[indices] = axis[:, 0]
+            self.up[indices] = axis[:, 1]
+            self.front[indices] = axis[:, 2]
+
+        indices = np.flatnonzero(scale_changed)
+        if 0 < len(indices):
+            self.prev_Scale[indices] = self.scale[indices]
+
+        indices = np.flatnonzero(self.updated[:count] | updated)
+        if 0 < len(indices):
+            self.prev_matrix[indices] = self.matrix[indices]
+            self.prev_inverse_matrix[indices] = self.inverse_matrix[indices]
+
+        indices = np.flatnonzero(updated)
+        if 0 < len(indices):
+            pos = self.pos[indices]
+            scale = self.scale[indices]
+            rotation_matrices = self.rotationMatrix[indices]
+
+            # same as transform_matrix
+            matrices = self.local[indices]
+            matrices[:, 0:3] *= scale[:, :, np.newaxis]
+            matrices = np.matmul(matrices, rotation_matrices)
+            matrices[:, 3, 0:3] += pos
+            self.matrix[indices] = matrices
+
+            # same as inverse_transform_matrix
+            matrices = self.local[indices]
+            matrices[:, 3, 0:3] -= pos
+            matrices = np.matmul(matrices, np.transpose(rotation_matrices, (0, 2, 1)))
+            valid_scale = np.all(0.0 != scale, axis=1)
+            matrices[valid_scale, 0:3] *= 1.0 / scale[valid_scale][:, :, np.newaxis]
+            self.inverse_matrix[indices] = matrices
+
+        self.updated[:count] = updated
+        self.pending[:count] = alive
@@ -0,0 +1,143 @@
+import numpy as np
+
+
+# Bounding volume hierarchy of the triangles of a mesh for the ray queries on the cpu.
+# The nodes are kept in flat arrays, the children of an inner node are (child, child + 1),
+# and a leaf node is the range [start, start + count) of the sorted triangles.
+class TriangleBVH:
+    def __init__(self, positions, indices, leaf_size=8):
+        positions = np.reshape(np.asarray(positions, dtype=np.float32), (-1, 3))
+        indices = np.reshape(np.asarray(indices, dtype=np.int64), (-1, 3))
+        self.leaf_size = max(1, int(leaf_size))
+        self.triangle_count = len(indices)
+
+        self.bound_mins = np.zeros((0, 3), dtype=np.float32)
+        self.bound_maxs = np.zeros((0, 3), dtype=np.float32)
+        self.children = np.zeros(0, dtype=np.int64)
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.triangle_indices = np.zeros(0, dtype=np.int64)
+        # (vertex0, edge1, edge2) of the sorted triangles
+        self.triangles = np.zeros((0, 3, 3), dtype=np.float32)
+
+        if 0 < self.triangle_count:
+            self.build(positions[indices])
+
+    def build(self, triangles):
+        triangle_mins = np.min(triangles, axis=1)
+        triangle_maxs = np.max(triangles, axis=1)
+        centroids = np.mean(triangles, axis=1)
+        order = np.arange(len(triangles))
+
+        bound_mins = []
+        bound_maxs = []
+        children = []
+        starts = []
+        counts = []
+
+        def add_node(start, count):
+            bound_mins.append(None)
+            bound_maxs.append(None)
+            children.append(-1)
+            starts.append(start)
+            counts.append(count)
+            return len(starts) - 1
+
+        stack = [add_node(0, len(triangles))]
+        while stack:
+            node = stack.pop()
+            start = starts[node]
+            count = counts[node]
+            node_triangles = order[start:start + count]
+            bound_mins[node] = np.min(triangle_mins[node_triangles], axis=0)
+            bound_maxs[node] = np.max(triangle_maxs[node_triangles], axis=0)
+            if count <= self.leaf_size:
+                continue
+
+            # median split on the longest axis of the centroids
+            node_centroids = centroids[node_triangles]
+            extent = np.max(node_centroids, axis=0) - np.min(node_centroids, axis=0)
+            axis = int(np.argmax(extent))
+            if extent[axis] <= 0.0:
+                continue
+            half = count // 2
+            order[start:start + count] = node_triangles[np.argpartition(node_centroids[:, axis], half)]
+
+            child = add_node(start, half)
+            add_node(start + half, count - half)
+            children[node] = child
+            stack.extend([child, child + 1])
+
+        self.bound_mins = np.array(bound_mins, dtype=np.float32)
+        self.bound_maxs = np.array(bound_maxs, dtype=np.float32)
+        self.children = np.array(children, dtype=np.int64)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.triangle_indices = order
+
+        triangles = triangles[order]
+        self.triangles = np.stack([triangles[:, 0], triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]], axis=1)
+
+    def gather_triangles(self, origin, direction, max_distance):
+        # breadth first traversal, the nodes of a depth are tested at once.
+        leaves = []
+        parallel = (0.0 == direction)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_direction = 1.0 / direction
+        nodes = np.zeros(1, dtype=np.int64)
+        while 0 < len(nodes):
+            bound_mins = self.bound_mins[nodes]
+            bound_maxs = self.bound_maxs[nodes]
+            with np.errstate(invalid='ignore'):
+                t0 = (bound_mins - origin) * inv_direction
+                t1 = (bound_maxs - origin) * inv_direction
+            t_near = np.max(np.where(parallel, -np.inf, np.minimum(t0, t1)), axis=1)
+            t_far = np.min(np.where(parallel, np.inf, np.maximum(t0, t1)), axis=1)
+            inside_slab = np.all(~parallel | ((bound_mins <= origin) & (origin <= bound_maxs)), axis=1)
+            nodes = nodes[inside_slab & (np.maximum(t_near, 0.0) <= t_far) & (t_near <= max_distance)]
+
+            children = self.children[nodes]
+            is_leaf = children < 0
+            leaves.append(nodes[is_leaf])
+            children = children[~is_leaf]
+            nodes = np.concatenate([children, children + 1])
+
+        leaves = np.concatenate(leaves)
+        counts = self.counts[leaves]
+        # concatenated ranges of the leaves
+        offsets = np.repeat(self.starts[leaves] - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(np.sum(counts))
+
+    def intersect(self, origin, direction, max_distance=np.inf):
+        # returns (distance, triangle index) of the closest hit, the triangles are two sided.
+        # No hit is (inf, -1). The distance is in the unit of the direction.
+        if 0 == self.triangle_count:
+            return np.inf, -1
+
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        candidates = self.gather_triangles(origin, direction, max_distance)
+        if 0 == len(candidates):
+            return np.inf, -1
+
+        # Moller-Trumbore
+        triangles = self.triangles[candidates].astype(np.float64)
+        vertex0 = triangles[:, 0]
+        edge1 = triangles[:, 1]
+        edge2 = triangles[:, 2]
+        p = np.cross(direction, edge2)
+        det = np.sum(edge1 * p, axis=1)
+        valid = 1e-12 < np.abs(det)
+        inv_det = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+        s = origin - vertex0
+        u = np.sum(s * p, axis=1) * inv_det
+        q = np.cross(s, edge1)
+        v = np.dot(q, direction) * inv_det
+        t = np.sum(edge2 * q, axis=1) * inv_det
+        valid &= (0.0 <= u) & (0.0 <= v) & (u + v <= 1.0) & (0.0 <= t) & (t <= max_distance)
+        if not np.any(valid):
+            return np.inf, -1
+
+        t = np.where(valid, t, np.inf)
+        closest = int(np.argmin(t))
+        return float(t[closest]), int(self.triangle_indices[candidates[closest]])
@@ -4,11 +4,16 @@ from .Config import Config
 from .ExportTexture import export_texture
 from .ImageProcessing import *
 from .Logger import *
+from .LooseOctree import LooseOctree
 from .RangeVariable import RangeVariable
 from .Singleton import Singleton
 from .StateMachine import StateMachine, StateItem
+from .TextureCompressor import compress_texture, decompress_texture, get_texture_compression, COMPRESSED_INTERNAL_FORMATS
+from .TextureCooker import cook_texture, cook_textures, is_cooked_texture_file, save_cooked_texture, load_cooked_texture
 from .Transform import *
 from .TransformObject import TransformObject
+from .TransformPool import TransformPool
+from .TriangleBVH import TriangleBVH
 from .Spline import *
 from .Utility import GetClassName, is_gz_compressed_file, check_directory_and_mkdir, get_modify_time_of_file
 from .Utility import delete_from_referrer, object_copy, Profiler
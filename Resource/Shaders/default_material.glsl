@@ -1,6 +1,7 @@
 //----------- MATERIAL_COMPONENTS ------------//
 
 #define TRANSPARENT_MATERIAL 0
+#define NORMAL_MAP_BC5 0
 
 #ifdef MATERIAL_COMPONENTS
     uniform float brightness;
@@ -56,7 +57,13 @@ float get_sss_scale()
 vec3 get_normal(vec2 tex_coord)
 {
     // Y-Up
+#if NORMAL_MAP_BC5 == 1
+    // the BC5 compressed normal map has only two channels, so the up is reconstructed from xy.
+    vec2 normal_xy = texture2D(texture_normal, tex_coord).xy * 2.0 - 1.0;
+    vec3 normal = vec3(normal_xy.x, sqrt(clamp(1.0 - dot(normal_xy, normal_xy), 0.0, 1.0)), normal_xy.y);
+#else
     vec3 normal = texture2D(texture_normal, tex_coord).xzy * 2.0 - 1.0;
+#endif
     normal.xz *= normal_intensity;
     return normalize(normal);
 }
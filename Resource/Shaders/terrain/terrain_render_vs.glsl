@@ -29,16 +29,18 @@ layout (location = 0) out VERTEX_OUTPUT vs_output;
 
 void main()
 {
+    // xy : offset of the chunk, z : size of the chunk for the lod, w : lod level
+    float chunk_size = max(1.0, vs_in_isntance_offset.z);
     vec4 position = vec4(vs_in_position, 1.0);
-    position.xz = position.xz * 0.5 + 0.5;
+    position.xz = (position.xz * 0.5 + 0.5) * chunk_size;
     position.xz += vs_in_isntance_offset.xy;
 
     vec2 tex_coord = position.xz / height_map_size;
     float height = texture2DLod(texture_height_map, tex_coord, 0.0).x;
     position.y += height;
 
-    vec2 tex_coord_delta = 1.0 / (height_map_size * subdivide_level);
-    vec3 size_of_grid = vec3(scale.x / subdivide_level, scale.y, scale.z / subdivide_level);
+    vec2 tex_coord_delta = chunk_size / (height_map_size * subdivide_level);
+    vec3 size_of_grid = vec3(scale.x * chunk_size / subdivide_level, scale.y, scale.z * chunk_size / subdivide_level);
 
     float height_w = texture2DLod(texture_height_map, tex_coord + vec2(tex_coord_delta.x, 0.0), 0.0).x;
     float height_h = texture2DLod(texture_height_map, tex_coord + vec2(0.0, tex_coord_delta.y), 0.0).x;